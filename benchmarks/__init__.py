@@ -0,0 +1,6 @@
+"""
+Performance benchmarks of labelord hot paths.
+
+Run ``python -m benchmarks run`` to measure and ``python -m benchmarks
+compare`` to compare results (e.g. against tracked ``baseline.json``).
+"""
@@ -0,0 +1,125 @@
+"""
+Command-line interface of benchmark suite.
+"""
+import json
+import sys
+
+import click
+
+from .runner import BENCHMARKS, run_benchmarks, compare
+
+
+@click.group()
+def main():
+    """
+    Labelord benchmarks.
+    """
+
+
+@main.command()
+@click.argument('names', nargs=-1)
+@click.option('--output', '-o', type=click.File('w'), default='-',
+              help='Where to write JSON results.')
+@click.option('--quick', is_flag=True,
+              help='Tiny parameters, single run (smoke test).')
+@click.option('--latency', type=float, default=None,
+              help='Latency (seconds) of fake GitHub API.')
+def run(names, output, quick, latency):
+    """
+    Run benchmarks whose names start with NAMES (all by default).
+    """
+    if latency is not None:
+        from . import suite  # noqa: F401
+        for name, (func, repeat, params, quick_params) in BENCHMARKS.items():
+            if 'latency' in params:
+                params['latency'] = quick_params['latency'] = latency
+    results = run_benchmarks(names, quick)
+    for name, result in results['benchmarks'].items():
+        click.echo('{:<28} median {:>10.4f}s  min {:>10.4f}s'.format(
+            name, result['median'], result['min']
+        ), err=True)
+    json.dump(results, output, indent=2)
+    output.write('\n')
+
+
+@main.command(name='compare')
+@click.argument('baseline', type=click.File('r'))
+@click.argument('current', type=click.File('r'))
+@click.option('--threshold', '-t', type=float, default=0.25,
+              help='Allowed relative slowdown of median.')
+def compare_cmd(baseline, current, threshold):
+    """
+    Compare CURRENT results against BASELINE, fail on regressions.
+    """
+    rows = compare(json.load(baseline), json.load(current), threshold)
+    for name, base, new, ratio, regressed in rows:
+        click.echo('{:<28} {:>10.4f}s -> {:>10.4f}s  x{:.2f}{}'.format(
+            name, base, new, ratio, '  REGRESSION' if regressed else ''
+        ))
+    sys.exit(1 if any(row[-1] for row in rows) else 0)
+
+
+@main.command()
+@click.option('--events', '-n', type=int, default=300,
+              help='Number of generated deliveries.')
+@click.option('--payloads', type=click.File('r'), default=None,
+              help='Recorded deliveries (JSON lines) instead of generated.')
+@click.option('--ping-ratio', type=float, default=0.0,
+              help='Fraction of generated ping deliveries.')
+@click.option('--rate', type=float, default=None,
+              help='Deliveries per second (unlimited by default).')
+@click.option('--concurrency', '-c', type=int, default=4,
+              help='Number of concurrent senders.')
+@click.option('--repos', type=int, default=10,
+              help='Number of allowed repositories.')
+@click.option('--latency', type=float, default=0.0,
+              help='Latency (seconds) of fake GitHub API.')
+@click.option('--http', is_flag=True,
+              help='Serve application over local HTTP server.')
+@click.option('--url', default=None,
+              help='URL of running application (no fake GitHub).')
+@click.option('--webhook-workers', type=int, default=None,
+              help='Option webhook_workers of [server] section.')
+@click.option('--fanout-workers', type=int, default=None,
+              help='Option fanout_workers of [server] section.')
+@click.option('--coalesce-window', type=float, default=None,
+              help='Option coalesce_window of [server] section.')
+@click.option('--output', '-o', type=click.File('w'), default='-',
+              help='Where to write JSON results.')
+def loadtest(events, payloads, ping_ratio, rate, concurrency, repos, latency,
+             http, url, webhook_workers, fanout_workers, coalesce_window,
+             output):
+    """
+    Send signed webhooks to web application and measure it.
+    """
+    from .loadtest import generate_events, load_events, load_test
+    slugs = ['user/repo{}'.format(i) for i in range(repos)]
+    if payloads is not None:
+        deliveries = load_events(payloads)
+    else:
+        deliveries = generate_events(events, slugs, ping_ratio)
+    options = {'webhook_workers': webhook_workers,
+               'fanout_workers': fanout_workers,
+               'coalesce_window': coalesce_window}
+    results = load_test(deliveries, repos, rate, concurrency, latency, http,
+                        url, {k: str(v) for k, v in options.items()
+                              if v is not None})
+    latencies = results['latency']
+    click.echo('{} deliveries in {:.3f}s ({:.1f}/s), drained in {:.3f}s'.format(
+        results['deliveries'], results['duration'], results['throughput'],
+        results['drain']
+    ), err=True)
+    if latencies['p50'] is not None:
+        click.echo('latency p50 {:.4f}s  p90 {:.4f}s  p99 {:.4f}s  '
+                   'max {:.4f}s'.format(latencies['p50'], latencies['p90'],
+                                        latencies['p99'], latencies['max']),
+                   err=True)
+    click.echo('statuses {}  max queue depth {}  GitHub writes {}'.format(
+        results['statuses'], results['queue_depth']['max'],
+        results.get('github_writes')
+    ), err=True)
+    json.dump(results, output, indent=2)
+    output.write('\n')
+
+
+main()
@@ -0,0 +1,41 @@
+"""
+Cost of webhook ingress: signature verification and refusal of junk.
+"""
+import hashlib
+import hmac
+
+from .bench_webhook import SECRET, make_app, make_config, headers
+from .runner import benchmark
+
+
+@benchmark('ingress.verify', deliveries=20000, size=8192,
+           quick={'deliveries': 100})
+def verify(deliveries, size):
+    from labelord.github import WebhookVerifier
+    body = b'x' * size
+    signature = 'sha256=' + hmac.new(SECRET.encode(), body,
+                                     hashlib.sha256).hexdigest()
+    verifier = WebhookVerifier(SECRET)
+
+    def target():
+        for _ in range(deliveries):
+            assert verifier.verify(body, signature)
+    yield target
+
+
+@benchmark('ingress.junk', deliveries=1000, size=65536,
+           quick={'deliveries': 10})
+def junk(deliveries, size):
+    app = make_app(make_config(['user/repo']))
+    client = app.test_client()
+    body = b'{"junk": "' + b'x' * size + b'"}'
+    unsigned = dict(headers(body), **{'X-Hub-Signature': 'sha1=0'})
+    unsupported = headers(body, 'push')
+
+    def target():
+        for _ in range(deliveries):
+            assert client.post('/', data=body,
+                               headers=unsigned).status_code == 401
+            assert client.post('/', data=body,
+                               headers=unsupported).status_code == 400
+    yield target
@@ -0,0 +1,61 @@
+"""
+Memory needed to hold labels of many repositories.
+"""
+import gc
+import json
+import tracemalloc
+
+from labelord.labels import Label
+
+from .runner import benchmark
+
+
+def _payload(labels):
+    return json.dumps([{
+        'id': 1000 + i, 'name': 'label-{}'.format(i),
+        'color': '{:06x}'.format(i * 2654435 % 0xFFFFFF),
+        'description': 'Description of label {}'.format(i),
+        'default': False,
+    } for i in range(labels)])
+
+
+def _retained(build, payload, repos):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        data = [build(json.loads(payload)) for _ in range(repos)]
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del data
+    return size
+
+
+def _dicts(raw):
+    return {l['name']: str(l['color']) for l in raw}
+
+
+def _full_dicts(raw):
+    fields = ('id', 'name', 'color', 'description')
+    return {l['name']: {f: l[f] for f in fields} for l in raw}
+
+
+def _labels(raw):
+    labels = (Label.from_json(l) for l in raw)
+    return {l.name: l for l in labels}
+
+
+@benchmark('memory.labels', repos=10000, labels=100, repeat=1,
+           quick={'repos': 10, 'labels': 10})
+def labels_memory(repos, labels):
+    payload = _payload(labels)
+
+    def target():
+        # Colors only (former list_labels) and all kept fields as dicts
+        dicts = _retained(_dicts, payload, repos)
+        full = _retained(_full_dicts, payload, repos)
+        compact = _retained(_labels, payload, repos)
+        return {'bytes_str_dicts': dicts, 'bytes_full_dicts': full,
+                'bytes_labels': compact, 'ratio_str_dicts': compact / dicts,
+                'ratio_full_dicts': compact / full}
+    yield target
@@ -0,0 +1,44 @@
+"""
+Throughput of printers used by ``labelord run``.
+"""
+import contextlib
+import io
+
+from labelord.cli import (Printer, VerbosePrinter, JsonLinesPrinter,
+                          ThreadedJsonLinesPrinter)
+
+from .runner import benchmark
+
+
+def _events(printer_cls, events, binary):
+    def target():
+        stream = io.BytesIO()
+        printer = printer_cls(stream) if binary else printer_cls()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(events):
+                result = 'ERR' if i % 10 == 0 else 'SUC'
+                printer.add_repo('user/repo{}'.format(i % 100))
+                printer.event('ADD', result, 'user/repo{}'.format(i % 100),
+                              'label', 'ff0000', latency=0.1)
+            printer.summary()
+    yield target
+
+
+@benchmark('printers.printer', events=100000, quick={'events': 100})
+def printer(events):
+    yield from _events(Printer, events, False)
+
+
+@benchmark('printers.verbose', events=100000, quick={'events': 100})
+def verbose(events):
+    yield from _events(VerbosePrinter, events, False)
+
+
+@benchmark('printers.jsonl', events=100000, quick={'events': 100})
+def jsonl(events):
+    yield from _events(JsonLinesPrinter, events, True)
+
+
+@benchmark('printers.jsonl_threaded', events=100000, quick={'events': 100})
+def jsonl_threaded(events):
+    yield from _events(ThreadedJsonLinesPrinter, events, True)
@@ -0,0 +1,37 @@
+"""
+Diffing of repository labels against specification.
+"""
+from labelord.cli import RunModes
+from labelord.labels import as_labels
+
+from .runner import benchmark
+
+
+def make_labels(count, offset=0, color='ff0000'):
+    return {'label-{}'.format(i + offset): color for i in range(count)}
+
+
+def _diff(mode, repos, labels):
+    # Half of labels overlap, a quarter of overlapping ones changed case
+    current = as_labels(make_labels(labels))
+    spec = make_labels(labels, offset=labels // 2, color='00ff00')
+    for name in list(spec)[:labels // 4]:
+        spec[name.upper()] = spec.pop(name)
+    spec = as_labels(spec)
+
+    def target():
+        for _ in range(repos):
+            mode(current, spec)
+    yield target
+
+
+@benchmark('runmodes.update', repos=200, labels=1000,
+           quick={'repos': 2, 'labels': 50})
+def update_mode(repos, labels):
+    yield from _diff(RunModes.update_mode, repos, labels)
+
+
+@benchmark('runmodes.replace', repos=200, labels=1000,
+           quick={'repos': 2, 'labels': 50})
+def replace_mode(repos, labels):
+    yield from _diff(RunModes.replace_mode, repos, labels)
@@ -0,0 +1,37 @@
+"""
+Start-up time of command-line application.
+"""
+import subprocess
+import sys
+
+from .runner import benchmark
+
+
+def import_times(module):
+    """
+    Cumulative import times (microseconds) reported by ``-X importtime``.
+
+    :param: ``module``: Module imported in new interpreter.
+    :return: Dictionary with module names as keys.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                             'import ' + module],
+                            stderr=subprocess.PIPE, check=True)
+    times = {}
+    for line in result.stderr.decode().splitlines():
+        if line.startswith('import time:') and 'cumulative' not in line:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+@benchmark('startup.cli', runs=10, quick={'runs': 1})
+def cli_startup(runs):
+    def target():
+        for _ in range(runs):
+            subprocess.run([sys.executable, '-m', 'labelord', '--help'],
+                           stdout=subprocess.DEVNULL, check=True)
+        times = import_times('labelord.cli')
+        return {'import_us': times['labelord'],
+                'web_imported': 'labelord.web' in times}
+    yield target
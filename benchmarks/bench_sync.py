@@ -0,0 +1,33 @@
+"""
+End-to-end ``RunProcessor.run`` against local fake GitHub.
+"""
+from labelord.cli import RunProcessor, QuietPrinter
+from labelord.concurrency import AIMDController
+
+from tests.fakegithub import FakeGitHubServer
+from .runner import benchmark
+
+
+@benchmark('sync.replace', repos=20, labels=30, latency=0.01,
+           concurrency=16, repeat=3,
+           quick={'repos': 2, 'labels': 5, 'latency': 0.0})
+def sync_replace(repos, labels, latency, concurrency):
+    slugs = ['user/repo{}'.format(i) for i in range(repos)]
+    current = {'label-{}'.format(i): 'ff0000' for i in range(labels)}
+    spec = {'label-{}'.format(i): '00ff00'
+            for i in range(labels // 2, labels + labels // 2)}
+    with FakeGitHubServer(latency=latency) as server:
+        github = server.client()
+        github.set_pool_size(concurrency)
+
+        def target():
+            for slug in slugs:
+                server.state.set_labels(slug, current)
+            server.state.reset_counters()
+            controller = AIMDController(initial=min(4, concurrency),
+                                        maximum=concurrency)
+            processor = RunProcessor(github, QuietPrinter(), controller)
+            processor.run(slugs, spec, processor.MODES['replace'])
+            return {'github_reads': server.state.reads,
+                    'github_writes': server.state.writes}
+        yield target
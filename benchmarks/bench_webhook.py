@@ -0,0 +1,56 @@
+"""
+Handling of signed webhook deliveries by the web application.
+"""
+from tests.fakegithub import (FakeGitHubServer, SECRET, headers,
+                              label_payload, make_config)
+from .runner import benchmark
+
+
+def make_app(cfg, github=None):
+    """
+    Fresh web application, so benchmarks never touch the global one.
+    """
+    from labelord.web import LabelordWeb
+    from labelord.ignores import MemoryIgnoreStore
+    app = LabelordWeb.create_app(cfg, github)
+    app.ignores = MemoryIgnoreStore()
+    return app
+
+
+@benchmark('webhook.label', repos=10, deliveries=20, latency=0.0,
+           quick={'repos': 3, 'deliveries': 4})
+def label_webhook(repos, deliveries, latency):
+    slugs = ['user/repo{}'.format(i) for i in range(repos)]
+    with FakeGitHubServer({s: {} for s in slugs}, latency) as server:
+        app = make_app(make_config(slugs), server.client())
+        client = app.test_client()
+        runs = [0]
+
+        def target():
+            runs[0] += 1
+            server.state.reset_counters()
+            for i in range(deliveries):
+                name = 'label-{}-{}'.format(runs[0], i)
+                for action in ('created', 'deleted'):
+                    body = label_payload(action, slugs[0], name)
+                    response = client.post('/', data=body,
+                                           headers=headers(body))
+                    assert response.status_code < 300, response.status_code
+            app.webhook_pool.join()
+            return {'github_writes': server.state.writes}
+        try:
+            yield target
+        finally:
+            app.shutdown()
+
+
+@benchmark('webhook.ping', deliveries=1000, quick={'deliveries': 10})
+def ping_webhook(deliveries):
+    app = make_app(make_config(['user/repo']))
+    client = app.test_client()
+    body = b'{"zen": "Keep it logically awesome."}'
+
+    def target():
+        for _ in range(deliveries):
+            client.post('/', data=body, headers=headers(body, 'ping'))
+    yield target
@@ -0,0 +1,304 @@
+"""
+Load test of webhook ingestion.
+
+Signed ``label`` and ``ping`` deliveries are sent to the web application
+at a fixed rate (open loop) or by a fixed number of concurrent senders
+(closed loop). The application runs in-process (Flask test client), behind
+local HTTP server, or anywhere else given by URL; in-process and local
+HTTP targets propagate changes to fake GitHub, so resulting GitHub writes
+are counted too.
+"""
+import json
+import logging
+import math
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+from .bench_webhook import make_app, make_config, label_payload, headers
+from tests.fakegithub import FakeGitHubServer
+
+
+PING_PAYLOAD = {'zen': 'Keep it logically awesome.', 'hook_id': 1}
+DEFAULT_SAMPLE_INTERVAL = 0.01
+
+
+def generate_events(count, repos, ping_ratio=0.0):
+    """
+    Generate label events, every label is created, edited and deleted.
+
+    :param: ``count``: Number of events.
+    :param: ``repos``: Repositories where the changes happen.
+    :param: ``ping_ratio``: Fraction of ``ping`` events.
+    :return: List of ``(event, body)`` tuples.
+    """
+    events = []
+    pings = 0.0
+    for i in range(count):
+        pings += ping_ratio
+        if pings >= 1:
+            pings -= 1
+            events.append(('ping', json.dumps(PING_PAYLOAD).encode()))
+            continue
+        label, step = divmod(i, 3)
+        repo = repos[label % len(repos)]
+        name = 'load-{}'.format(label)
+        if step == 0:
+            body = label_payload('created', repo, name)
+        elif step == 1:
+            body = label_payload('edited', repo, name, '00ff00',
+                                 {'color': {'from': 'ff0000'}})
+        else:
+            body = label_payload('deleted', repo, name, '00ff00')
+        events.append(('label', body))
+    return events
+
+
+def load_events(lines):
+    """
+    Read recorded deliveries, one JSON object per line, either plain
+    webhook payload or ``{"event": ..., "payload": ...}``.
+
+    :param: ``lines``: Iterable of lines.
+    :return: List of ``(event, body)`` tuples.
+    """
+    events = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        data = json.loads(line)
+        if 'payload' in data and 'event' in data:
+            event, data = data['event'], data['payload']
+        else:
+            event = 'label' if 'label' in data else 'ping'
+        events.append((event, json.dumps(data).encode()))
+    return events
+
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of sorted ``values``.
+    """
+    if not values:
+        return None
+    index = math.ceil(fraction * len(values)) - 1
+    return values[max(0, min(len(values) - 1, index))]
+
+
+class InProcessTarget:
+    """
+    Labelord web application called through Flask test client.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def send(self, event, body, delivery):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        hdrs = dict(headers(body, event), **{'X-GitHub-Delivery': delivery})
+        return client.post('/', data=body, headers=hdrs).status_code
+
+    def queue_depth(self):
+        return self.app.queue_depth
+
+    def drain(self):
+        self.app.webhook_pool.join()
+        coalescer = self.app.coalescer
+        if coalescer is not None:
+            coalescer.flush()
+
+    def close(self):
+        pass
+
+
+class HTTPTarget:
+    """
+    Labelord web application listening on ``url``.
+    """
+
+    def __init__(self, url, timeout=10):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def send(self, event, body, delivery):
+        hdrs = dict(headers(body, event), **{'X-GitHub-Delivery': delivery})
+        request = urllib.request.Request(self.url + '/', data=body,
+                                         headers=hdrs, method='POST')
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as r:
+                return r.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    def queue_depth(self):
+        try:
+            with urllib.request.urlopen(self.url + '/status',
+                                        timeout=self.timeout) as r:
+                return json.loads(r.read().decode())['queue_depth']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def drain(self):
+        while self.queue_depth():
+            time.sleep(DEFAULT_SAMPLE_INTERVAL)
+
+    def close(self):
+        pass
+
+
+class LocalHTTPTarget(HTTPTarget):
+    """
+    Labelord web application served by local HTTP server in background
+    thread.
+    """
+
+    def __init__(self, app):
+        from werkzeug.serving import make_server
+        self.app = app
+        self._server = make_server('127.0.0.1', 0, app, threaded=True)
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        super().__init__('http://127.0.0.1:{}'.format(self._server.port))
+
+    def queue_depth(self):
+        return self.app.queue_depth
+
+    drain = InProcessTarget.drain
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def run_load(target, events, rate=None, concurrency=1,
+             sample_interval=DEFAULT_SAMPLE_INTERVAL):
+    """
+    Send events to target and measure it.
+
+    With ``rate`` the deliveries are scheduled evenly (open loop) and
+    latency counts from the scheduled time, so a slow server is not hidden
+    by senders waiting for it. Without it every sender sends next delivery
+    as soon as previous one is answered.
+
+    :param: ``target``: Target application (see :class:`InProcessTarget`).
+    :param: ``events``: List of ``(event, body)`` tuples.
+    :param: ``rate``: Deliveries per second, unlimited if *None*.
+    :param: ``concurrency``: Number of concurrent senders.
+    :param: ``sample_interval``: Seconds between samples of queue depth.
+    :return: Dictionary with results.
+    """
+    latencies = [None] * len(events)
+    statuses = {}
+    depths = []
+    lock = threading.Lock()
+    position = iter(range(len(events)))
+    sending = threading.Event()
+    started = time.perf_counter()
+
+    def sender():
+        while True:
+            with lock:
+                index = next(position, None)
+            if index is None:
+                return
+            scheduled = time.perf_counter()
+            if rate:
+                scheduled = started + index / rate
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            status = target.send(events[index][0], events[index][1],
+                                 str(uuid.uuid4()))
+            latencies[index] = time.perf_counter() - scheduled
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+
+    def sampler():
+        while True:
+            depth = target.queue_depth()
+            if depth is not None:
+                depths.append(depth)
+            if sending.wait(sample_interval):
+                return
+
+    sampling = threading.Thread(target=sampler, daemon=True)
+    sampling.start()
+    senders = [threading.Thread(target=sender, daemon=True)
+               for _ in range(concurrency)]
+    for thread in senders:
+        thread.start()
+    for thread in senders:
+        thread.join()
+    sent = time.perf_counter()
+    target.drain()
+    drained = time.perf_counter()
+    sending.set()
+    sampling.join()
+
+    ordered = sorted(latencies)
+    duration = sent - started
+    return {
+        'deliveries': len(events),
+        'duration': duration,
+        'drain': drained - sent,
+        'throughput': len(events) / duration if duration else None,
+        'statuses': {str(k): v for k, v in sorted(statuses.items())},
+        'latency': {
+            'mean': statistics.mean(ordered) if ordered else None,
+            'p50': percentile(ordered, 0.5),
+            'p90': percentile(ordered, 0.9),
+            'p99': percentile(ordered, 0.99),
+            'max': ordered[-1] if ordered else None,
+        },
+        'queue_depth': {
+            'max': max(depths) if depths else None,
+            'mean': statistics.mean(depths) if depths else None,
+        },
+    }
+
+
+def load_test(events, repos=10, rate=None, concurrency=4, latency=0.0,
+              http=False, url=None, server_options=None):
+    """
+    Run load test against labelord web application.
+
+    :param: ``events``: List of ``(event, body)`` tuples.
+    :param: ``repos``: Number of allowed repositories (``user/repoN``).
+    :param: ``rate``: Deliveries per second, unlimited if *None*.
+    :param: ``concurrency``: Number of concurrent senders.
+    :param: ``latency``: Seconds of fake GitHub latency.
+    :param: ``http``: Serve application over local HTTP server.
+    :param: ``url``: URL of already running application (no fake GitHub,
+                     ``repos`` and ``server_options`` are ignored).
+    :param: ``server_options``: Options of ``[server]`` config section.
+    :return: Dictionary with results, including ``github_writes``.
+    """
+    if url is not None:
+        return run_load(HTTPTarget(url), events, rate, concurrency)
+    slugs = ['user/repo{}'.format(i) for i in range(repos)]
+    with FakeGitHubServer({s: {} for s in slugs}, latency) as server:
+        cfg = make_config(slugs)
+        cfg.read_dict({'server': server_options or {}})
+        app = make_app(cfg, server.client())
+        loggers = [app.logger, logging.getLogger('werkzeug')]
+        levels = [logger.level for logger in loggers]
+        for logger in loggers:
+            logger.setLevel(logging.ERROR)
+        target = LocalHTTPTarget(app) if http else InProcessTarget(app)
+        try:
+            results = run_load(target, events, rate, concurrency)
+        finally:
+            target.close()
+            app.shutdown()
+            for logger, level in zip(loggers, levels):
+                logger.setLevel(level)
+        results['github_writes'] = server.state.writes
+    return results
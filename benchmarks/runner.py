@@ -0,0 +1,111 @@
+"""
+Registry of benchmarks, timing and comparison of results.
+"""
+import collections
+import platform
+import statistics
+import subprocess
+import time
+
+
+BENCHMARKS = collections.OrderedDict()
+
+
+def benchmark(name, repeat=5, quick=None, **params):
+    """
+    Register benchmark function.
+
+    Benchmark is a generator function: code before ``yield`` prepares data,
+    the yielded callable is timed and code after ``yield`` cleans up.
+    The callable may return dict of additional metrics.
+
+    :param: ``name``: Benchmark name.
+    :param: ``repeat``: Number of timed runs.
+    :param: ``quick``: Parameters overriding ``params`` in quick mode.
+    :param: ``**params``: Parameters passed to benchmark function.
+    """
+    def decorator(func):
+        BENCHMARKS[name] = (func, repeat, params, quick or {})
+        return func
+    return decorator
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(func, repeat, params):
+    """
+    Run single benchmark.
+
+    :return: Dictionary with timings (seconds) and extra metrics.
+    """
+    runs = func(**params)
+    target = next(runs)
+    timings = []
+    extra = {}
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            extra = target() or {}
+            timings.append(time.perf_counter() - start)
+    finally:
+        runs.close()
+    return {
+        'params': params, 'repeat': repeat,
+        'min': min(timings), 'median': statistics.median(timings),
+        'mean': statistics.mean(timings), 'extra': extra,
+    }
+
+
+def run_benchmarks(names=None, quick=False):
+    """
+    Run registered benchmarks.
+
+    :param: ``names``: Prefixes of benchmarks to run (all if empty).
+    :param: ``quick``: Use small parameters and single run.
+    :return: Machine-readable results.
+    """
+    from . import suite  # noqa: F401, registers benchmarks
+    results = collections.OrderedDict()
+    for name, (func, repeat, params, quick_params) in BENCHMARKS.items():
+        if names and not any(name.startswith(n) for n in names):
+            continue
+        if quick:
+            params = dict(params, **quick_params)
+            repeat = 1
+        results[name] = measure(func, repeat, params)
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'quick': quick,
+            'timestamp': int(time.time()),
+        },
+        'benchmarks': results,
+    }
+
+
+def compare(baseline, current, threshold=0.25):
+    """
+    Compare medians of two results.
+
+    :param: ``threshold``: Allowed relative slowdown.
+    :return: List of ``(name, base, current, ratio, regressed)`` tuples.
+    """
+    rows = []
+    for name, result in current['benchmarks'].items():
+        base = baseline['benchmarks'].get(name)
+        if base is None:
+            continue
+        ratio = result['median'] / base['median'] if base['median'] else 1.0
+        rows.append((name, base['median'], result['median'], ratio,
+                     ratio > 1 + threshold))
+    return rows
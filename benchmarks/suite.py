@@ -0,0 +1,5 @@
+"""
+Imports all benchmark modules so they get registered.
+"""
+from . import (bench_runmodes, bench_printers, bench_webhook, bench_sync,  # noqa
+               bench_memory, bench_startup, bench_ingress)
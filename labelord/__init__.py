@@ -2,9 +2,19 @@
 Labelord's public interface
 
 Module defines **app** which is instance of class :class:`~labelord.web.LabelordWeb` and function **cli()** which is function :func:`~labelord.cli.cli`.
+
+Web application (and Flask with it) is imported lazily on first access to **app**, so command-line application starts fast.
 """
 
 from .cli import cli
-from .web import app 
 
 __all__ = ['cli', 'app']
+
+
+def __getattr__(name):
+    if name == 'app':
+        from .web import app
+        return app
+    raise AttributeError(
+        'module {!r} has no attribute {!r}'.format(__name__, name)
+    )
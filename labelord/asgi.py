@@ -0,0 +1,474 @@
+"""
+This module contains asynchronous (ASGI) variant of Web application.
+
+It serves the same routes and processes webhook events the same way as
+:mod:`labelord.web` (see :class:`~labelord.server.LabelordServer`), but
+requests are read and label changes are written by coroutines over
+asynchronous GitHub client, so one process handles many concurrent
+deliveries and writes. It needs optional packages ``httpx``
+and an ASGI server, e.g. ``uvicorn`` (``pip install labelord[asgi]``)::
+
+    uvicorn labelord.asgi:app
+"""
+import asyncio
+import collections
+import functools
+import json
+import logging
+import mimetypes
+import os
+import pkgutil
+import threading
+import time
+
+import jinja2
+
+from .github import GitHub, GitHubError
+from .helpers import create_config
+from .server import (HTTPError, LabelordServer, DEFAULT_FANOUT_QUEUE_SIZE,
+                     DEFAULT_FANOUT_WORKERS, SUPPORTED_EVENTS)
+from . import metrics
+
+###############################################################################
+# Asynchronous GitHub API communicator
+###############################################################################
+
+
+class AsyncGitHub:
+    """
+    Class **AsyncGitHub** writes labels through GitHub API asynchronously.
+
+    It has the same label methods as :class:`~labelord.github.GitHub`, but
+    they are coroutines.
+    """
+
+    GH_API_ENDPOINT = GitHub.GH_API_ENDPOINT
+    webhook_verify_signature = staticmethod(GitHub.webhook_verify_signature)
+
+    def __init__(self, token, client=None, pool_size=DEFAULT_FANOUT_WORKERS):
+        """
+        :param: ``token``: GitHub token.
+        :param: ``client``: *httpx.AsyncClient*, if not set -> create new.
+        :param: ``pool_size``: Number of pooled connections of new client.
+        """
+        self.token = token
+        self.pool_size = pool_size
+        self._client = client
+
+    @property
+    def client(self):
+        """
+        HTTP client, created on first use.
+        """
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(
+                headers={'User-Agent': 'Python/Labelord'},
+                limits=httpx.Limits(max_connections=self.pool_size,
+                                    max_keepalive_connections=self.pool_size)
+            )
+        return self._client
+
+    async def _request(self, method, resource, expected_code, data=None):
+        started = time.monotonic()
+        response = await self.client.request(
+            method, self.GH_API_ENDPOINT + resource, json=data,
+            headers={'Authorization': 'token ' + self.token}
+        )
+        metrics.observe_github_response(method, response.status_code,
+                                        time.monotonic() - started,
+                                        response.headers)
+        if response.status_code != expected_code:
+            raise GitHubError.from_response(response)
+        return response
+
+    async def create_label(self, repository, name, color, description=None,
+                           **kwargs):
+        """
+        Create new label in given repository.
+
+        :param: ``repository``: Given repository name.
+        :param: ``name``: Tag name.
+        :param: ``color``: Tag color.
+        :param: ``description``: Tag description (unchanged if *None*).
+        """
+        await self._request(
+            'POST', '/repos/{}/labels'.format(repository), 201,
+            GitHub._label_data(name, color, description)
+        )
+
+    async def update_label(self, repository, name, color, old_name=None,
+                           description=None, **kwargs):
+        """
+        Update existing label in given repository.
+
+        :param: ``repository``: Given repository name.
+        :param: ``name``: Tag name.
+        :param: ``color``: Tag color.
+        :param: ``old_name``: Old tag name.
+        :param: ``description``: Tag description (unchanged if *None*).
+        """
+        await self._request(
+            'PATCH',
+            '/repos/{}/labels/{}'.format(repository, old_name or name), 200,
+            GitHub._label_data(name, color, description)
+        )
+
+    async def delete_label(self, repository, name, **kwargs):
+        """
+        Delete existing label in given repository.
+
+        :param: ``repository``: Given repository name.
+        :param: ``name``: Tag name.
+        """
+        await self._request(
+            'DELETE', '/repos/{}/labels/{}'.format(repository, name), 204
+        )
+
+    async def aclose(self):
+        """
+        Close HTTP client.
+        """
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+###############################################################################
+# ASGI application
+###############################################################################
+
+
+class LabelordASGI(LabelordServer):
+    """
+    Class **LabelordASGI** represents ASGI web application.
+
+    Webhook events are accepted, queued and coalesced like by
+    :class:`~labelord.web.LabelordWeb`, so all options of ``[server]``
+    config section apply. Blocking work (delivery log, durable queue,
+    ignores) runs in executor, label changes are written by tasks on the
+    server's event loop: writes to one target repository in order, at
+    most ``fanout_workers`` of them at once. Worker threads only schedule
+    the fan-out, they do not wait for the writes.
+    """
+
+    def __init__(self, labelord_config, github):
+        """
+        :param: ``labelord_config``: Labelord configuration.
+        :param: ``github``: :class:`AsyncGitHub` object.
+        """
+        super().__init__(labelord_config, github)
+        self.logger = logging.getLogger(__name__)
+        self._loop = None
+        self._fanout_state = None
+        self._fanout_slots = None
+        self._fanouts = set()
+        self._fanouts_lock = threading.Lock()
+        self._templates = jinja2.Environment(
+            loader=jinja2.PackageLoader('labelord', 'templates'),
+            autoescape=True
+        )
+
+    @staticmethod
+    def create_app(config=None, github=None):
+        """
+        Create application.
+
+        :param: ``config``: Configuration.
+        :param: ``github``: :class:`AsyncGitHub` object.
+        """
+        cfg = config or create_config(
+            token=os.getenv('GITHUB_TOKEN', None),
+            config_filename=os.getenv('LABELORD_CONFIG', None)
+        )
+        gh = github or AsyncGitHub('')
+        gh.token = cfg.get('github', 'token', fallback='')
+        return LabelordASGI(cfg, gh)
+
+    def check_config(self):
+        """
+        Check configuration.
+
+        :return: Message of the first problem or *None*.
+        """
+        problem = self.config_problem()
+        return None if problem is None else problem[1]
+
+    @property
+    def fanout_slots(self):
+        """
+        Semaphore bounding fan-outs pending on the event loop by
+        ``fanout_queue_size`` (``[server]`` config section), when they are
+        all taken processing of further events waits.
+        """
+        with self._state_lock:
+            if self._fanout_slots is None:
+                self._fanout_slots = threading.BoundedSemaphore(
+                    self.labelord_config.getint(
+                        'server', 'fanout_queue_size',
+                        fallback=DEFAULT_FANOUT_QUEUE_SIZE
+                    )
+                )
+            return self._fanout_slots
+
+    def _fan_out(self, action, label, changes, repo, targets):
+        """
+        Schedule writes as task on the server's event loop.
+
+        :return: *None*, the writes are not done yet.
+        :raises: *RuntimeError* if the application is not running.
+        """
+        loop = self._loop
+        if loop is None or not loop.is_running():
+            raise RuntimeError('ASGI application is not running')
+        slots = self.fanout_slots
+        slots.acquire()
+        future = asyncio.run_coroutine_threadsafe(
+            self._fan_out_async(action, label, changes, repo, targets), loop
+        )
+        with self._fanouts_lock:
+            self._fanouts.add(future)
+        future.add_done_callback(self._fanned_out)
+
+    def _fanned_out(self, future):
+        with self._fanouts_lock:
+            self._fanouts.discard(future)
+        self.fanout_slots.release()
+        if not future.cancelled() and future.exception() is not None:
+            self.logger.error('Fan-out failed', exc_info=future.exception())
+
+    async def _fan_out_async(self, action, label, changes, repo, targets):
+        loop = asyncio.get_running_loop()
+        if self._fanout_state is None or self._fanout_state[0] is not loop:
+            self._fanout_state = (loop, asyncio.Semaphore(self.fanout_workers),
+                                  collections.defaultdict(asyncio.Lock))
+        _, semaphore, locks = self._fanout_state
+        started = time.monotonic()
+        results = {}
+
+        async def propagate(target):
+            async with locks[target], semaphore:
+                latency, error = await self._propagate(action, label,
+                                                       changes, target)
+            results[target] = error
+            self._propagated(action, label, repo, target, started, latency,
+                             error)
+
+        await asyncio.gather(*(propagate(target) for target in targets))
+        return results
+
+    async def _propagate(self, action, label, changes, target):
+        started = time.monotonic()
+        result = 'error'
+        error = None
+        try:
+            if action == 'created':
+                await self.github.create_label(target, label.name, label.hex)
+            elif action == 'deleted':
+                await self.github.delete_label(target, label.name)
+            elif action == 'edited':
+                old_name = changes.get('name', {}).get('from', label.name)
+                await self.github.update_label(target, label.name,
+                                               label.hex, old_name)
+            result = 'ok'
+        except GitHubError as e:
+            error = e
+        finally:
+            latency = time.monotonic() - started
+            metrics.PROPAGATION_LATENCY.observe(latency, action, result)
+        return latency, error
+
+    async def _blocking(self, function, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(function,
+                                                                  *args))
+
+    async def _join_fan_outs(self):
+        while True:
+            with self._fanouts_lock:
+                pending = list(self._fanouts)
+            if not pending:
+                return
+            await asyncio.gather(*(asyncio.wrap_future(f) for f in pending),
+                                 return_exceptions=True)
+
+    async def join(self):
+        """
+        Wait until accepted webhook events are processed and their changes
+        written.
+        """
+        self._loop = asyncio.get_running_loop()
+        if self._webhook_pool is not None:
+            await self._blocking(self._webhook_pool.join)
+        await self._join_fan_outs()
+
+    async def shutdown(self):
+        """
+        Finish processing of accepted webhook events.
+        """
+        self._loop = asyncio.get_running_loop()
+        await self._blocking(LabelordServer.shutdown, self)
+        await self._join_fan_outs()
+        await self.github.aclose()
+
+    async def hook_accept(self, headers, receive):
+        """
+        Accept hook.
+
+        Unsupported events, oversized bodies and wrong signatures are refused
+        before the body is parsed.
+
+        :param: ``headers``: Dictionary of request headers (lowercase names).
+        :param: ``receive``: ASGI receive callable.
+        :return: Status code and response body.
+        """
+        event = headers.get('x-github-event', '')
+        self.check_webhook_event(event)
+        body = await self._read_body(headers, receive, self.max_body_size)
+        status = await self._blocking(
+            self.accept_webhook, event, body, self._signature(headers),
+            headers.get('x-github-delivery')
+        )
+        return status, b''
+
+    async def batch_accept(self, headers, receive):
+        """
+        Accept batch of label events (see
+        :meth:`~labelord.server.LabelordServer.accept_batch`).
+
+        :param: ``headers``: Dictionary of request headers (lowercase names).
+        :param: ``receive``: ASGI receive callable.
+        :return: Status code and response body.
+        """
+        body = await self._read_body(headers, receive, self.max_batch_size)
+        result = await self._blocking(self.accept_batch, body,
+                                      self._signature(headers))
+        return 202, json.dumps(result).encode()
+
+    @staticmethod
+    def _headers(scope):
+        return {k.decode('latin-1').lower(): v.decode('latin-1')
+                for k, v in scope['headers']}
+
+    @staticmethod
+    def _signature(headers):
+        return (headers.get('x-hub-signature-256') or
+                headers.get('x-hub-signature', ''))
+
+    def _url_for(self, scope):
+        def url_for(endpoint, filename=None, _external=False):
+            path = '/static/' + filename if endpoint == 'static' else '/'
+            if not _external:
+                return path
+            host = dict(scope['headers']).get(b'host', b'localhost').decode()
+            return '{}://{}{}'.format(scope.get('scheme', 'http'), host, path)
+        return url_for
+
+    def _render(self, scope, template, **context):
+        return self._templates.get_template(template).render(
+            url_for=self._url_for(scope), **context
+        ).encode('utf-8')
+
+    @staticmethod
+    async def _read_body(headers, receive, limit):
+        if int(headers.get('content-length') or 0) > limit:
+            raise HTTPError(413, 'Request Entity Too Large')
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > limit:
+                raise HTTPError(413, 'Request Entity Too Large')
+            chunks.append(chunk)
+            if not message.get('more_body', False):
+                return b''.join(chunks)
+
+    @staticmethod
+    async def _respond(send, status, body,
+                       content_type=b'text/html; charset=utf-8'):
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', content_type),
+                                (b'content-length', str(len(body)).encode())]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _static(self, send, filename):
+        if '/' in filename or filename.startswith('.'):
+            raise HTTPError(404, 'Not Found')
+        try:
+            data = pkgutil.get_data('labelord', 'static/' + filename)
+        except OSError:
+            raise HTTPError(404, 'Not Found')
+        content_type = mimetypes.guess_type(filename)[0]
+        await self._respond(send, 200, data,
+                            (content_type or 'application/octet-stream').encode())
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                problem = self.check_config()
+                if problem is None:
+                    await send({'type': 'lifespan.startup.complete'})
+                else:
+                    await send({'type': 'lifespan.startup.failed',
+                                'message': problem})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def __call__(self, scope, receive, send):
+        self._loop = asyncio.get_running_loop()
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+        method, path = scope['method'], scope['path']
+        try:
+            if path == '/' and method == 'GET':
+                body = self._render(scope, 'index.html',
+                                    repos=sorted(self.repos))
+                return await self._respond(send, 200, body)
+            if path == '/' and method == 'POST':
+                headers = self._headers(scope)
+                event = headers.get('x-github-event', '')
+                if event not in SUPPORTED_EVENTS:
+                    event = 'other'
+                try:
+                    status, body = await self.hook_accept(headers, receive)
+                except HTTPError as e:
+                    metrics.WEBHOOKS.inc(event, e.code)
+                    raise
+                metrics.WEBHOOKS.inc(event, status)
+                return await self._respond(send, status, body)
+            if path == '/batch' and method == 'POST':
+                headers = self._headers(scope)
+                status, body = await self.batch_accept(headers, receive)
+                return await self._respond(send, status, body,
+                                           b'application/json')
+            if path == '/status' and method == 'GET':
+                depth = await self._blocking(lambda: self.queue_depth)
+                body = json.dumps({'queue_depth': depth}).encode()
+                return await self._respond(send, 200, body,
+                                           b'application/json')
+            if path == '/metrics' and method == 'GET':
+                metrics.IGNORES.set(
+                    await self._blocking(lambda: len(self.ignores))
+                )
+                metrics.QUEUE_DEPTH.set(
+                    await self._blocking(lambda: self.queue_depth)
+                )
+                body = metrics.REGISTRY.render().encode()
+                return await self._respond(send, 200, body,
+                                           b'text/plain; version=0.0.4')
+            if path.startswith('/static/') and method == 'GET':
+                return await self._static(send, path[len('/static/'):])
+            raise HTTPError(404, 'Not Found')
+        except HTTPError as e:
+            error = e
+        body = self._render(scope, 'error.html', error=error)
+        await self._respond(send, error.code, body)
+
+
+app = LabelordASGI.create_app()
@@ -3,21 +3,38 @@ This module contains classes and functions for command-line application.
 """
 
 import click
+import collections
 import configparser
 import hashlib
 import hmac
+import json
+import math
+import queue
 import requests
 import os
+import signal
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
-from .github import GitHub, GitHubError
-from .web import app
-from .helpers import create_config, extract_repos, extract_labels
+from .concurrency import AIMDController, bounded_map
+from .github import GitHub, GitHubError, WebhookVerifier
+from .helpers import (create_config, extract_repos, extract_label_profiles,
+                      profile_template_repos, ConfigError)
+from .labels import as_labels
+from .snapshot import Snapshot
 
 DEFAULT_SUCCESS_RETURN = 0
 DEFAULT_ERROR_RETURN = 10
+DEFAULT_MAX_CONCURRENCY = 16
+DEFAULT_WORKERS = 8
 NO_GH_TOKEN_RETURN = 3
+NO_LABELS_SPEC_RETURN = 6
+NO_WEBHOOK_SECRET_RETURN = 8
+NO_QUEUE_SPEC_RETURN = 11
+INVALID_IGNORE_BACKEND_RETURN = 12
+ESTIMATE_OVER_BUDGET_RETURN = 13
 GH_ERROR_RETURN = {
     401: 4,
     404: 5
@@ -52,6 +69,7 @@ class BasePrinter:
 
     SUCCESS_SUMMARY = '{} repo(s) updated successfully'
     ERROR_SUMMARY = '{} error(s) in total, please check log above'
+    SKIPPED_SUMMARY = ', {} no-op write(s) skipped'
 
     EVENT_CREATE = 'ADD'
     EVENT_DELETE = 'DEL'
@@ -65,6 +83,7 @@ class BasePrinter:
     def __init__(self):
         self.repos = set()
         self.errors = 0
+        self.noops = 0
 
     def add_repo(self, slug):
         """
@@ -72,7 +91,7 @@ class BasePrinter:
         """
         self.repos.add(slug)
 
-    def event(self, event, result, repo, *args):
+    def event(self, event, result, repo, *args, latency=None):
         """
         Log event.
         
@@ -80,27 +99,55 @@ class BasePrinter:
         :param: ``result``: Result of operation
         :param: ``repo``: Repository
         :param: ``*args``: Additional arguments 
+        :param: ``latency``: Duration of GitHub call in seconds (if any)
         """
         if result == self.RESULT_ERROR:
             self.errors += 1
 
+    def skipped(self, count):
+        """
+        Count labels which differ from specification only in raw form
+        (e.g. ``FF0000`` and ``ff0000``), so writing them was skipped.
+
+        :param: ``count``: Number of labels
+        """
+        self.noops += count
+
+    def concurrency(self, limit):
+        """
+        Log change of number of concurrent GitHub calls.
+
+        :param: ``limit``: New limit
+        """
+        pass
+
     def summary(self):
         """
         Print logs about events to terminal window.
         """
         pass
 
+    def close(self):
+        """
+        Write out everything printed so far, also when run was aborted.
+        """
+        pass
+
     def _create_summary(self):
         if self.errors > 0:
-            return self.ERROR_SUMMARY.format(self.errors)
-        return self.SUCCESS_SUMMARY.format(len(self.repos))
+            summary = self.ERROR_SUMMARY.format(self.errors)
+        else:
+            summary = self.SUCCESS_SUMMARY.format(len(self.repos))
+        if self.noops > 0:
+            summary += self.SKIPPED_SUMMARY.format(self.noops)
+        return summary
 
 
 class Printer(BasePrinter):
     """
     Class **Printer** prints only events which end with error. At the end summary is printed.
     """
-    def event(self, event, result, repo, *args):
+    def event(self, event, result, repo, *args, latency=None):
         """Refer to :func:`~labelord.cli.BasePrinter.event`"""
         super().event(event, result, repo, *args)
         if result == self.RESULT_ERROR:
@@ -125,16 +172,109 @@ class VerbosePrinter(BasePrinter):
     """
     LINE_START = '[{}][{}] {}'
 
-    def event(self, event, result, repo, *args):
+    def event(self, event, result, repo, *args, latency=None):
         """Refer to :func:`~labelord.cli.BasePrinter.event`"""
         super().event(event, result, repo, *args)
         line_parts = [self.LINE_START.format(event, result, repo), *args]
         click.echo('; '.join(line_parts))
 
+    def concurrency(self, limit):
+        """Refer to :func:`~labelord.cli.BasePrinter.concurrency`"""
+        click.echo('[CONCURRENCY] {}'.format(limit))
+
     def summary(self):
         """Refer to :func:`~labelord.cli.BasePrinter.summary`"""
         click.echo('[SUMMARY] ' + self._create_summary())
 
+
+class JsonLinesPrinter(BasePrinter):
+    """
+    Class **JsonLinesPrinter** writes every event as one JSON object per line.
+
+    Records are collected in memory and written in large chunks, summary
+    record is written at the end.
+    """
+    BUFFER_SIZE = 64 * 1024
+
+    def __init__(self, stream=None):
+        super().__init__()
+        self.stream = stream or click.get_binary_stream('stdout')
+        self._chunks = []
+        self._buffered = 0
+
+    @classmethod
+    def _record(cls, event, result, repo, args, latency):
+        args = list(args)
+        error = args.pop() if result == cls.RESULT_ERROR and args else None
+        name, color = (args + [None, None])[:2]
+        return {'event': event, 'result': result, 'repo': repo,
+                'name': name, 'color': color, 'error': error,
+                'latency': latency}
+
+    def _write(self, record):
+        line = json.dumps(record, separators=(',', ':')).encode() + b'\n'
+        self._chunks.append(line)
+        self._buffered += len(line)
+        if self._buffered >= self.BUFFER_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if self._chunks:
+            self.stream.write(b''.join(self._chunks))
+            self._chunks = []
+            self._buffered = 0
+        self.stream.flush()
+
+    def event(self, event, result, repo, *args, latency=None):
+        """Refer to :func:`~labelord.cli.BasePrinter.event`"""
+        super().event(event, result, repo, *args)
+        self._write(self._record(event, result, repo, args, latency))
+
+    def concurrency(self, limit):
+        """Refer to :func:`~labelord.cli.BasePrinter.concurrency`"""
+        self._write({'event': 'CONCURRENCY', 'limit': limit})
+
+    def summary(self):
+        """Refer to :func:`~labelord.cli.BasePrinter.summary`"""
+        self._write({'event': 'SUMMARY', 'repos': len(self.repos),
+                     'errors': self.errors,
+                     'summary': self._create_summary()})
+        self.close()
+
+    def close(self):
+        """Refer to :func:`~labelord.cli.BasePrinter.close`"""
+        self._flush()
+
+
+class ThreadedJsonLinesPrinter(JsonLinesPrinter):
+    """
+    Class **ThreadedJsonLinesPrinter** serializes and writes records
+    of :class:`~labelord.cli.JsonLinesPrinter` in background thread.
+    """
+
+    def __init__(self, stream=None):
+        super().__init__(stream)
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._consume, daemon=True)
+        self._thread.start()
+
+    def _consume(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                break
+            super()._write(record)
+        self._flush()
+
+    def _write(self, record):
+        self._queue.put(record)
+
+    def close(self):
+        """Refer to :func:`~labelord.cli.BasePrinter.close`"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
 ###############################################################################
 # Processing changes (RUN and MODES)
 ###############################################################################
@@ -146,7 +286,7 @@ class RunModes:
     """
     @staticmethod
     def _make_labels_dict(labels_spec):
-        return {k.lower(): (k, v) for k, v in labels_spec.items()}
+        return {k.lower(): k for k in labels_spec}
 
     @classmethod
     def update_mode(cls, labels, labels_specs):
@@ -158,20 +298,41 @@ class RunModes:
         
         :return: ``create``: dictionary of tags which should be created
         :return: ``update``: dictionary of tags which should be updated
+
+        Values of dictionaries are :class:`~labelord.labels.Label` objects,
+        plain colors are converted. Labels are compared canonically (see
+        :meth:`~labelord.labels.Label.differs`), so no write is planned for
+        a label which would not change.
         """    
         create = dict()
         update = dict()
+        labels = as_labels(labels)
         xlabels = cls._make_labels_dict(labels)
-        for name, color in labels_specs.items():
+        for name, label in as_labels(labels_specs).items():
             if name.lower() not in xlabels:
-                create[name] = (name, color)
+                create[name] = label
             elif name not in labels:  # changed case of name
-                old_name = xlabels[name.lower()][0]
-                update[old_name] = (name, color)
-            elif labels[name] != color:
-                update[name] = (name, color)
+                old_name = xlabels[name.lower()]
+                update[old_name] = label
+            elif label.differs(labels[name]):
+                update[name] = label
         return create, update, dict()
 
+    @staticmethod
+    def noop_writes(labels, labels_specs):
+        """
+        Count labels which differ from specification only in raw form (see
+        :meth:`~labelord.labels.Label.is_noop_write`), modes plan no write
+        for them.
+
+        :param: ``labels``: Dictionary of labels, which are in repository
+        :param: ``labels_specs``: Dictionary of labels specifications
+        :return: Number of skipped no-op writes.
+        """
+        labels = as_labels(labels)
+        return sum(1 for name, label in as_labels(labels_specs).items()
+                   if name in labels and label.is_noop_write(labels[name]))
+
     @classmethod
     def replace_mode(cls, labels, labels_specs):
         """
@@ -184,7 +345,7 @@ class RunModes:
         :return: ``delete``: dictionary of tags which should be deleted
         """    
         create, update, delete = cls.update_mode(labels, labels_specs)
-        delete = {n: (n, c) for n, c in labels.items()
+        delete = {n: l for n, l in as_labels(labels).items()
                   if n not in labels_specs}
         return create, update, delete
 
@@ -192,6 +353,11 @@ class RunModes:
 class RunProcessor:
     """
     Class **RunProcessor** realizes actual operations over Github.
+
+    Repositories are processed concurrently and all label reads and writes
+    pass through :class:`~labelord.concurrency.AIMDController` which adapts
+    the number of concurrent calls to GitHub's response, so at most its
+    ``maximum`` requests (the size of HTTP connection pool) are in flight.
     """
 
     MODES = {
@@ -199,20 +365,38 @@ class RunProcessor:
         'replace': RunModes.replace_mode
     }
 
-    def __init__(self, github, printer=None):
+    def __init__(self, github, printer=None, controller=None):
         self.github = github
         self.printer = printer or QuietPrinter()
-
-    def _process_generic(self, slug, key, data, event, method):
-        old_name, name, color = key, data[0], data[1]
+        self.controller = controller or AIMDController()
+        if self.controller.on_change is None:
+            self.controller.on_change = self._concurrency_changed
+        self._lock = threading.Lock()
+        self._writes = None
+
+    def _event(self, *args, **kwargs):
+        with self._lock:
+            self.printer.event(*args, **kwargs)
+
+    def _concurrency_changed(self, limit):
+        with self._lock:
+            self.printer.concurrency(limit)
+
+    def _process_generic(self, slug, key, label, event, method):
+        old_name, name, color = key, label.name, label.hex
+        started = time.monotonic()
         try:
-            method(slug, name=name, color=color, old_name=old_name)
+            self.controller.call(method, slug, name=name, color=color,
+                                 old_name=old_name,
+                                 description=label.description)
         except GitHubError as error:
-            self.printer.event(event, Printer.RESULT_ERROR,
-                               slug, name, color, error.code_message)
+            self._event(event, Printer.RESULT_ERROR,
+                        slug, name, color, error.code_message,
+                        latency=time.monotonic() - started)
         else:
-            self.printer.event(event, Printer.RESULT_SUCCESS,
-                               slug, name, color)
+            self._event(event, Printer.RESULT_SUCCESS,
+                        slug, name, color,
+                        latency=time.monotonic() - started)
 
     def _process_create(self, slug, key, data):
         self._process_generic(slug, key, data, Printer.EVENT_CREATE,
@@ -226,20 +410,26 @@ class RunProcessor:
         self._process_generic(slug, key, data, Printer.EVENT_DELETE,
                               self.github.delete_label)
 
-    @staticmethod
-    def _process(slug, changes, processor):
-        for key, data in changes.items():
-            processor(slug, key, data)
+    def _process(self, slug, changes, processor):
+        futures = [self._writes.submit(processor, slug, key, data)
+                   for key, data in changes.items()]
+        for future in futures:
+            future.result()
 
     def _run_one(self, slug, labels_specs, mode):
-        self.printer.add_repo(slug)
+        with self._lock:
+            self.printer.add_repo(slug)
         try:
-            labels = self.github.list_labels(slug)
+            labels = self.controller.call(self.github.list_labels, slug)
         except GitHubError as error:
-            self.printer.event(Printer.EVENT_LABELS, Printer.RESULT_ERROR,
-                               slug, error.code_message)
+            self._event(Printer.EVENT_LABELS, Printer.RESULT_ERROR,
+                        slug, error.code_message)
         else:
             create, update, delete = mode(labels, labels_specs)
+            skipped = RunModes.noop_writes(labels, labels_specs)
+            if skipped:
+                with self._lock:
+                    self.printer.skipped(skipped)
             self._process(slug, create, self._process_create)
             self._process(slug, update, self._process_update)
             self._process(slug, delete, self._process_delete)
@@ -250,8 +440,24 @@ class RunProcessor:
         
         :return: Return code
         """
-        for slug in slugs:
-            self._run_one(slug, labels_specs, mode)
+        return self.run_specs({slug: labels_specs for slug in slugs}, mode)
+
+    def run_specs(self, specs, mode):
+        """
+        Run processor for each repository with its own labels specification.
+
+        :param: ``specs``: Dictionary with repositories as keys and labels specifications as values (see :func:`~labelord.helpers.extract_label_profiles`).
+        :param: ``mode``: Function of :class:`RunModes`.
+        :return: Return code
+        """
+        workers = self.controller.maximum
+        with ThreadPoolExecutor(workers) as writes, \
+                ThreadPoolExecutor(workers) as repos:
+            self._writes = writes
+            futures = [repos.submit(self._run_one, slug, labels_specs, mode)
+                       for slug, labels_specs in specs.items()]
+            for future in futures:
+                future.result()
         self.printer.summary()
         return (DEFAULT_ERROR_RETURN if self.printer.errors > 0
                 else DEFAULT_SUCCESS_RETURN)
@@ -262,37 +468,177 @@ class DryRunProcessor(RunProcessor):
     Class **DryRunProcessor** runs operations in dry mode.
     """
 
-    def __init__(self, github, printer=None):
-        super().__init__(github, printer)
+    def __init__(self, github, printer=None, controller=None):
+        super().__init__(github, printer, controller)
+
+    def _process_create(self, slug, key, data):
+        self._event(Printer.EVENT_CREATE, Printer.RESULT_DRY,
+                    slug, data.name, data.hex)
+
+    def _process_update(self, slug, key, data):
+        self._event(Printer.EVENT_UPDATE, Printer.RESULT_DRY,
+                    slug, data.name, data.hex)
+
+    def _process_delete(self, slug, key, data):
+        self._event(Printer.EVENT_DELETE, Printer.RESULT_DRY,
+                    slug, data.name, data.hex)
+
+
+###############################################################################
+# Estimates
+###############################################################################
+
+
+class ReadCounter:
+    """
+    Class **ReadCounter** wraps GitHub client and counts pages it reads
+    for every repository, together with time spent reading them.
+
+    Other attributes are passed to the wrapped client.
+    """
+
+    def __init__(self, github, per_page=GitHub.PER_PAGE):
+        self.github = github
+        self.per_page = per_page
+        self.reads = collections.Counter()
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.github, name)
+
+    def _count(self, key, method, *args):
+        started = time.monotonic()
+        pages = 1
+        try:
+            items = method(*args)
+            pages = max(1, math.ceil(len(items) / self.per_page))
+            return items
+        finally:
+            with self._lock:
+                self.reads[key] += pages
+                self.elapsed += time.monotonic() - started
+
+    def list_repositories(self):
+        return self._count(None, self.github.list_repositories)
+
+    def list_labels(self, repository):
+        return self._count(repository, self.github.list_labels, repository)
+
+    @property
+    def latency(self):
+        """
+        Mean latency of one page read in seconds.
+        """
+        pages = sum(self.reads.values())
+        return self.elapsed / pages if pages else 0.0
+
+
+class EstimateProcessor(DryRunProcessor):
+    """
+    Class **EstimateProcessor** plans run like :class:`DryRunProcessor`
+    and counts label writes for every repository instead of reporting them.
+    """
+
+    def __init__(self, github, printer=None, controller=None):
+        super().__init__(github, printer, controller)
+        self.writes = collections.Counter()
+
+    def _count_write(self, slug):
+        with self._lock:
+            self.writes[slug] += 1
 
     def _process_create(self, slug, key, data):
-        self.printer.event(Printer.EVENT_CREATE, Printer.RESULT_DRY,
-                           slug, data[0], data[1])
+        self._count_write(slug)
 
     def _process_update(self, slug, key, data):
-        self.printer.event(Printer.EVENT_UPDATE, Printer.RESULT_DRY,
-                           slug, data[0], data[1])
+        self._count_write(slug)
 
     def _process_delete(self, slug, key, data):
-        self.printer.event(Printer.EVENT_DELETE, Printer.RESULT_DRY,
-                           slug, data[0], data[1])
+        self._count_write(slug)
+
+
+def report_estimate(counter, processor, concurrency, budget):
+    """
+    Print expected GitHub calls and duration of run.
+
+    :param: ``counter``: :class:`ReadCounter` used while planning.
+    :param: ``processor``: :class:`EstimateProcessor` which planned the run.
+    :param: ``concurrency``: Upper bound of concurrent GitHub requests.
+    :param: ``budget``: Core rate limit (see :meth:`~labelord.github.GitHub.rate_limit`), *None* if unknown.
+    :return: *True* if the run fits into remaining rate limit.
+    """
+    slugs = [s for s in counter.reads if s is not None]
+    slugs += [s for s in processor.writes if s not in counter.reads]
+    if None in counter.reads:
+        click.echo('ESTIMATE repository list: {} read(s)'.format(
+            counter.reads[None]))
+    for slug in sorted(slugs):
+        click.echo('ESTIMATE {}: {} read(s), {} write(s)'.format(
+            slug, counter.reads[slug], processor.writes[slug]))
+    reads = sum(counter.reads.values())
+    writes = sum(processor.writes.values())
+    calls = reads + writes
+    click.echo('ESTIMATE total: {} read(s), {} write(s), {} call(s)'.format(
+        reads, writes, calls))
+    seconds = calls * counter.latency / concurrency
+    click.echo('ESTIMATE time: {:.1f} s at concurrency {}'.format(
+        seconds, concurrency))
+    if budget is None:
+        click.echo('ESTIMATE budget: unknown')
+        return True
+    reset = time.strftime('%Y-%m-%d %H:%M:%S',
+                          time.localtime(budget['reset']))
+    click.echo('ESTIMATE budget: {} of {} remaining, resets at {}'.format(
+        budget['remaining'], budget['limit'], reset))
+    return calls <= budget['remaining']
+
+
+def run_estimate(counter, specs, mode, controller):
+    """
+    Plan run without writing and report its cost.
+
+    Labels are read as in real run, only writes are skipped.
+
+    :param: ``counter``: :class:`ReadCounter` wrapping GitHub client.
+    :param: ``specs``: Dictionary with repositories as keys and labels specifications as values.
+    :param: ``mode``: Name of run mode.
+    :param: ``controller``: :class:`~labelord.concurrency.AIMDController` of the run.
+    :return: Return code
+    """
+    processor = EstimateProcessor(counter, QuietPrinter(), controller)
+    return_code = processor.run_specs(specs, processor.MODES[mode])
+    try:
+        budget = counter.rate_limit()
+    except GitHubError as error:
+        click.echo(error, err=True)
+        budget = None
+    if not report_estimate(counter, processor, controller.maximum, budget):
+        click.echo('Run would exceed remaining GitHub rate limit.', err=True)
+        return ESTIMATE_OVER_BUDGET_RETURN
+    return return_code
 
 ###############################################################################
 # Simple helpers
 ###############################################################################
 
 
-def pick_printer(verbose, quiet):
+def pick_printer(verbose, quiet, output='text', threaded=False):
     """
     Pick right printer according to parameters.
     
     :param: ``verbose``: *True* if verbose mode is wanted
     :param: ``quiet``: *True* if quiet mode is wanted
+    :param: ``output``: Output format, *text* or *jsonl*
+    :param: ``threaded``: *True* if JSON Lines should be written in background
     
     :return: Printer
 
     If both parameters is set to True :class:`~labelord.cli.Printer` is chosen.
+    Format *jsonl* ignores ``verbose`` and ``quiet``.
     """
+    if output == 'jsonl':
+        return ThreadedJsonLinesPrinter if threaded else JsonLinesPrinter
     if verbose and not quiet:
         return VerbosePrinter
     if quiet and not verbose:
@@ -319,6 +665,21 @@ def gh_error_return(github_error):
     return GH_ERROR_RETURN.get(github_error.status_code, DEFAULT_ERROR_RETURN)
 
 
+def load_snapshot(filename):
+    """
+    Load snapshot file, exit with error if it cannot be read.
+
+    :param: ``filename``: Path to snapshot.
+    :return: :class:`~labelord.snapshot.Snapshot`
+    """
+    try:
+        return Snapshot.load(filename)
+    except (OSError, ValueError, KeyError, TypeError) as error:
+        click.echo('Cannot read snapshot {}: {}'.format(filename, error),
+                   err=True)
+        sys.exit(DEFAULT_ERROR_RETURN)
+
+
 def retrieve_github_client(ctx):
     """
     Extract Github client object from context.
@@ -332,6 +693,19 @@ def retrieve_github_client(ctx):
     return ctx.obj['GitHub']
 
 
+def check_repos(cfg):
+    """
+    Exit if configuration has no repositories specification.
+
+    :param: ``cfg``: Configuration.
+    """
+    try:
+        extract_repos(cfg)
+    except ConfigError as error:
+        click.echo(error, err=True)
+        sys.exit(error.code)
+
+
 ###############################################################################
 # Click commands
 ###############################################################################
@@ -354,6 +728,7 @@ def cli(ctx, config, token):
     :param: ``token``: Github API token.
     """
     ctx.obj['config'] = create_config(config, token)
+    ctx.obj['config_filename'] = config
     ctx.obj['config'].optionxform = str
     if token is not None:
         ctx.obj['config'].read_dict({'github': {'token': token}})
@@ -382,24 +757,64 @@ def list_repos(ctx):
         sys.exit(gh_error_return(error))
 
 
-@cli.command(help='Listing labels of desired repository.')
-@click.argument('repository')
+@cli.command(help='Listing labels of desired repositories.')
+@click.argument('repositories', nargs=-1)
+@click.option('--all-repos', '-a', is_flag=True,
+              help='List labels of all repositories available.')
+@click.option('--workers', '-w', type=click.IntRange(min=1),
+              default=DEFAULT_WORKERS,
+              help='Number of concurrent requests.')
+@click.option('--output', '-o', type=click.Choice(['text', 'jsonl']),
+              default='text', help='Output format.')
 @click.pass_context
-def list_labels(ctx, repository):
+def list_labels(ctx, repositories, all_repos, workers, output):
     """
-    List labels for specified repository.
+    List labels for specified repositories.
+
+    Repositories are fetched concurrently and printed as soon as they are
+    fetched. With more repositories each text line is prefixed with slug,
+    JSON Lines output contains one record per repository.
 
     :param: ``ctx``: Click context.
-    :param: ``repository``: Repository whose labels are printed.
+    :param: ``repositories``: Repositories whose labels are printed.
+    :param: ``all_repos``: If *True* list labels of all accessible repositories.
+    :param: ``workers``: Number of concurrent requests.
+    :param: ``output``: Output format, *text* or *jsonl*.
     """
     github = retrieve_github_client(ctx)
-    try:
-        labels = github.list_labels(repository)
-        for name, color in labels.items():
-            click.echo('#{} {}'.format(color, name))
-    except GitHubError as error:
-        click.echo(error, err=True)
-        sys.exit(gh_error_return(error))
+    if all_repos:
+        try:
+            repositories = github.list_repositories()
+        except GitHubError as error:
+            click.echo(error, err=True)
+            sys.exit(gh_error_return(error))
+    elif not repositories:
+        raise click.UsageError('Missing argument "repository".')
+    multi = len(repositories) > 1
+    first_error = None
+    github.set_pool_size(workers)
+    for slug, labels, error in bounded_map(github.list_labels,
+                                           repositories, workers):
+        if error is not None:
+            first_error = first_error or error
+            if output == 'jsonl':
+                click.echo(json.dumps({'repo': slug,
+                                       'error': error.code_message}))
+            else:
+                click.echo('{}: {}'.format(slug, error) if multi else error,
+                           err=True)
+        elif output == 'jsonl':
+            click.echo(json.dumps({'repo': slug, 'labels': [
+                {'name': l.name, 'color': l.hex,
+                 'description': l.description, 'id': l.id}
+                for l in labels.values()
+            ]}))
+        elif labels:
+            lead = slug + ' ' if multi else ''
+            click.echo('\n'.join('{}#{} {}'.format(lead, label.hex, name)
+                                  for name, label in labels.items()))
+    if first_error is not None:
+        sys.exit(gh_error_return(first_error))
 
 
 @cli.command(help='Run labels processing.')
@@ -415,8 +830,20 @@ def list_labels(ctx, repository):
               help='No output at all.')
 @click.option('--all-repos', '-a', is_flag=True,
               help='Run for all repositories available.')
+@click.option('--max-concurrency', '-m', type=click.IntRange(min=1),
+              default=DEFAULT_MAX_CONCURRENCY,
+              help='Upper bound of concurrent GitHub writes.')
+@click.option('--output', '-o', type=click.Choice(['text', 'jsonl']),
+              default='text', help='Output format.')
+@click.option('--threaded-output', is_flag=True,
+              help='Write JSON Lines output in background thread.')
+@click.option('--from-snapshot', '-s', type=click.Path(exists=True),
+              help='Dry run against labels snapshot file, no API calls.')
+@click.option('--estimate', '-e', is_flag=True,
+              help='Report expected GitHub calls and time, do not write.')
 @click.pass_context
-def run(ctx, mode, template_repo, dry_run, verbose, quiet, all_repos):
+def run(ctx, mode, template_repo, dry_run, verbose, quiet, all_repos,
+        max_concurrency, output, threaded_output, from_snapshot, estimate):
     """
     Update or replace labels.
 
@@ -427,24 +854,101 @@ def run(ctx, mode, template_repo, dry_run, verbose, quiet, all_repos):
     :param: ``verbose``: Turn on verbose mode.
     :param: ``quiet``: Turn on quiet mode.
     :param: `all_repos``:  If *True* update tags for all repositories.
+    :param: ``max_concurrency``: Upper bound of concurrent GitHub writes.
+    :param: ``output``: Output format, *text* or *jsonl*.
+    :param: ``threaded_output``: Write JSON Lines in background thread.
+    :param: ``from_snapshot``: Snapshot file used instead of GitHub (dry run only).
+    :param: ``estimate``: Only estimate GitHub calls and duration of run.
     """
-    github = retrieve_github_client(ctx)
-    labels = extract_labels(
-        github, template_repo,
-        ctx.obj['config']
-    )
-    if all_repos:
-        repos = github.list_repositories()
+    if from_snapshot is not None:
+        if not dry_run and not estimate:
+            raise click.UsageError('--from-snapshot requires --dry-run')
+        github = load_snapshot(from_snapshot)
     else:
-        repos = extract_repos(ctx.obj['config'])
-    printer = pick_printer(verbose, quiet)()
-    processor = pick_runner(dry_run)(github, printer)
+        github = retrieve_github_client(ctx)
+        github.set_pool_size(max_concurrency)
+    if estimate:
+        github = ReadCounter(github)
+    cfg = ctx.obj['config']
+    try:
+        if all_repos:
+            repos = github.list_repositories()
+        else:
+            repos = extract_repos(cfg)
+        specs = extract_label_profiles(github, template_repo, cfg, repos)
+    except GitHubError as error:
+        click.echo(error, err=True)
+        sys.exit(gh_error_return(error))
+    except ConfigError as error:
+        click.echo(error, err=True)
+        sys.exit(error.code)
+    controller = AIMDController(initial=min(4, max_concurrency),
+                                maximum=max_concurrency)
+    if estimate:
+        sys.exit(run_estimate(github, specs, mode, controller))
+    printer = pick_printer(verbose, quiet, output, threaded_output)()
+    processor = pick_runner(dry_run)(github, printer, controller)
     try:
-        return_code = processor.run(repos, labels, processor.MODES[mode])
+        return_code = processor.run_specs(specs, processor.MODES[mode])
         sys.exit(return_code)
     except GitHubError as error:
         click.echo(error, err=True)
         sys.exit(gh_error_return(error))
+    finally:
+        printer.close()
+
+
+@cli.command(help='Save labels of repositories to snapshot file.')
+@click.argument('filename', type=click.Path(dir_okay=False, writable=True))
+@click.option('--template-repo', '-r', type=click.STRING,
+              help='Repository which serves as labels template.')
+@click.option('--all-repos', '-a', is_flag=True,
+              help='Snapshot all repositories available.')
+@click.option('--workers', '-w', type=click.IntRange(min=1),
+              default=DEFAULT_WORKERS,
+              help='Number of concurrent requests.')
+@click.pass_context
+def snapshot(ctx, filename, template_repo, all_repos, workers):
+    """
+    Fetch labels of selected repositories into snapshot file.
+
+    Template repository (from option or config) is included as well so the
+    snapshot is sufficient for ``run --dry-run --from-snapshot``.
+
+    :param: ``ctx``: Click context.
+    :param: ``filename``: Path of snapshot file.
+    :param: ``template_repo``: Repository which is used as specification.
+    :param: ``all_repos``: If *True* snapshot all accessible repositories.
+    :param: ``workers``: Number of concurrent requests.
+    """
+    github = retrieve_github_client(ctx)
+    cfg = ctx.obj['config']
+    errors = []
+
+    def on_error(slug, error):
+        errors.append(error)
+        click.echo('{}: {}'.format(slug, error), err=True)
+
+    try:
+        if all_repos:
+            repos = github.list_repositories()
+        else:
+            repos = extract_repos(cfg)
+    except GitHubError as error:
+        click.echo(error, err=True)
+        sys.exit(gh_error_return(error))
+    except ConfigError as error:
+        click.echo(error, err=True)
+        sys.exit(error.code)
+    templates = {template_repo or cfg.get('others', 'template-repo',
+                                          fallback=None)}
+    if template_repo is None:
+        templates |= profile_template_repos(cfg)
+    templates.discard(None)
+    repos = list(repos) + sorted(templates - set(repos))
+    github.set_pool_size(workers)
+    Snapshot.fetch(github, repos, workers, on_error).save(filename)
+    sys.exit(DEFAULT_ERROR_RETURN if errors else DEFAULT_SUCCESS_RETURN)
 
 
 @cli.command(help='Run master-to-master replication server.')
@@ -454,18 +958,247 @@ def run(ctx, mode, template_repo, dry_run, verbose, quiet, all_repos):
               help='The port to bind to.')
 @click.option('--debug', '-d', is_flag=True,
               help='Turns on DEBUG mode.')
+@click.option('--watch-config', type=float, default=0, metavar='SECONDS',
+              help='Reload config file when it changes (0 = off).')
+@click.option('--asgi', is_flag=True,
+              help='Run asynchronous application in uvicorn.')
+@click.option('--reconcile-interval', type=float, default=0,
+              metavar='SECONDS',
+              help='Re-sync all repositories within this time (0 = off).')
+@click.option('--reconcile-mode', type=click.Choice(['update', 'replace']),
+              default='update', help='Mode of reconciliation.')
 @click.pass_context
-def run_server(ctx, host, port, debug):
+def run_server(ctx, host, port, debug, watch_config, asgi, reconcile_interval,
+               reconcile_mode):
     """
     Run Flask server.
 
+    Config file is reloaded on SIGHUP and, with ``watch_config``, whenever
+    it is modified. With ``asgi`` the asynchronous application
+    (:mod:`labelord.asgi`) runs in uvicorn instead, without reloading.
+    With ``reconcile_interval`` repositories are continuously synced with
+    labels specification (see :class:`~labelord.reconcile.Reconciler`).
+
     :param: ``host``: The interface to bind to.
     :param: ``port``: The port to bind to.
     :param: ``debug``: Turn on DEBUG mode.
+    :param: ``watch_config``: Seconds between checks of config file.
+    :param: ``asgi``: Run ASGI application.
+    :param: ``reconcile_interval``: Seconds in which all repositories are synced.
+    :param: ``reconcile_mode``: ``update`` or ``replace``.
     """
+    if asgi:
+        return run_asgi_server(ctx, host, port, debug)
+    from .web import app  # Flask is imported only when server is started
     app.labelord_config = ctx.obj['config']
+    app.config_filename = ctx.obj.get('config_filename')
     app.github = retrieve_github_client(ctx)
-    app.run(host=host, port=port, debug=debug)
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, lambda *args: threading.Thread(
+            target=app.hot_reload_config, daemon=True
+        ).start())
+    if watch_config > 0:
+        app.watch_config(watch_config)
+    reconciler = None
+    if reconcile_interval > 0:
+        from .reconcile import Reconciler, has_labels_spec
+        if not has_labels_spec(app.labelord_config):
+            click.echo('No labels specification has been found', err=True)
+            sys.exit(NO_LABELS_SPEC_RETURN)
+        reconciler = Reconciler(app, reconcile_interval, reconcile_mode)
+        reconciler.start()
+    try:
+        app.run(host=host, port=port, debug=debug)
+    finally:
+        if reconciler is not None:
+            reconciler.stop()
+        app.shutdown()
+
+
+def run_asgi_server(ctx, host, port, debug):
+    """
+    Run ASGI application in uvicorn.
+
+    :param: ``ctx``: Click context.
+    :param: ``host``: The interface to bind to.
+    :param: ``port``: The port to bind to.
+    :param: ``debug``: Turn on DEBUG logging.
+    """
+    try:
+        import uvicorn
+        from .asgi import app, AsyncGitHub
+    except ImportError as e:
+        click.echo('ASGI server needs optional dependencies: {}'.format(e),
+                   err=True)
+        sys.exit(DEFAULT_ERROR_RETURN)
+    app.labelord_config = ctx.obj['config']
+    app.github = AsyncGitHub(retrieve_github_client(ctx).token,
+                             pool_size=app.fanout_workers)
+    uvicorn.run(app, host=host, port=port,
+                log_level='debug' if debug else 'info')
+
+
+@cli.command(help='Process webhook events from durable queue.')
+@click.option('--workers', '-w', type=click.IntRange(min=1), default=1,
+              help='Number of worker threads.')
+@click.option('--once', is_flag=True,
+              help='Exit when the queue is empty.')
+@click.option('--poll-interval', type=float, default=1.0,
+              help='Pause (seconds) when the queue is empty.')
+@click.pass_context
+def worker(ctx, workers, once, poll_interval):
+    """
+    Consume webhook events queued by web application.
+
+    Events are stored by ``run_server`` when ``queue`` option of ``[server]``
+    config section is set, so ingestion and processing can be scaled and
+    restarted independently. Events from one repository are processed in
+    order, also by several workers. Jobs with failed writes are retried
+    for the failed repositories. SIGTERM and SIGINT stop the worker after
+    jobs in progress are finished.
+
+    :param: ``ctx``: Click context.
+    :param: ``workers``: Number of worker threads.
+    :param: ``once``: Exit when the queue is empty.
+    :param: ``poll_interval``: Pause (seconds) when the queue is empty.
+    """
+    cfg = ctx.obj['config']
+    github = retrieve_github_client(ctx)
+    if not cfg.has_option('server', 'queue'):
+        click.echo('No webhook queue has been configured', err=True)
+        sys.exit(NO_QUEUE_SPEC_RETURN)
+    from .ignores import is_valid_ignore_url
+    if not is_valid_ignore_url(cfg.get('server', 'ignore_backend',
+                                       fallback='memory://')):
+        click.echo('Unsupported ignore backend', err=True)
+        sys.exit(INVALID_IGNORE_BACKEND_RETURN)
+    check_repos(cfg)
+    from .jobs import work  # job queue is imported only by worker
+    from .web import LabelordWeb
+    app = LabelordWeb.create_app(cfg, github)
+    jobs = app.job_queue
+    stop = threading.Event()
+    handlers = {}
+    if threading.current_thread() is threading.main_thread():
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            handlers[signum] = signal.signal(signum,
+                                             lambda *args: stop.set())
+    options = {'once': once, 'stop': stop, 'poll_interval': poll_interval,
+               'logger': app.logger}
+    threads = [threading.Thread(target=work, kwargs=options,
+                                args=(jobs, app.process_job))
+               for _ in range(workers)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        app.shutdown()
+        for signum, handler in handlers.items():
+            signal.signal(signum, handler)
+
+
+@cli.command(help='Replay label webhook events from NDJSON file.')
+@click.argument('filename', type=click.File('rb'))
+@click.option('--url', '-u', default=None,
+              help='Send events to batch endpoint of running server.')
+@click.pass_context
+def replay(ctx, filename, url):
+    """
+    Replay label events missed e.g. during outage.
+
+    Events are processed by local application, which reports also events
+    not propagated to some repositories, or with ``url`` sent signed to
+    ``/batch`` endpoint of running server. Events from one repository are
+    processed in order, repositories concurrently.
+
+    :param: ``ctx``: Click context.
+    :param: ``filename``: File with one event per line.
+    :param: ``url``: URL of running server.
+    """
+    cfg = ctx.obj['config']
+    body = filename.read()
+    if url is not None:
+        secret = cfg.get('github', 'webhook_secret', fallback='')
+        if not secret:
+            click.echo('No webhook secret has been provided', err=True)
+            sys.exit(NO_WEBHOOK_SECRET_RETURN)
+        response = requests.post(
+            url.rstrip('/') + '/batch', data=body,
+            headers={'Content-Type': 'application/x-ndjson',
+                     'X-Hub-Signature-256': WebhookVerifier(secret).sign(body)}
+        )
+        if response.status_code != 202:
+            click.echo('Replay failed: {} {}'.format(response.status_code,
+                                                     response.reason),
+                       err=True)
+            sys.exit(DEFAULT_ERROR_RETURN)
+        result = response.json()
+    else:
+        github = retrieve_github_client(ctx)
+        from .ignores import is_valid_ignore_url
+        if not is_valid_ignore_url(cfg.get('server', 'ignore_backend',
+                                           fallback='memory://')):
+            click.echo('Unsupported ignore backend', err=True)
+            sys.exit(INVALID_IGNORE_BACKEND_RETURN)
+        check_repos(cfg)
+        from .server import read_label_events
+        from .web import LabelordWeb
+        try:
+            events = read_label_events(body.splitlines())
+        except ValueError as e:
+            click.echo(str(e), err=True)
+            sys.exit(DEFAULT_ERROR_RETURN)
+        app = LabelordWeb.create_app(cfg, github)
+        try:
+            result = app.process_label_batch(events, wait=True)
+        finally:
+            app.shutdown()
+    failed = result['failed']
+    click.echo('Replayed {} events: {} accepted, {} skipped, {} duplicate, '
+               '{} failed'.format(
+                   result['accepted'] + result['skipped'] +
+                   result['duplicate'] + len(failed), result['accepted'],
+                   result['skipped'], result['duplicate'], len(failed)
+               ))
+    for failure in failed:
+        click.echo('Event {} ({}) failed: {}'.format(
+            failure['index'], failure['delivery'] or 'no delivery',
+            failure['error']
+        ), err=True)
+    if failed:
+        sys.exit(DEFAULT_ERROR_RETURN)
+
+
+@cli.command(help='Serve shared echo-suppression state over TCP.')
+@click.option('--host', '-h', default='127.0.0.1',
+              help='The interface to bind to.')
+@click.option('--port', '-p', default=5001,
+              help='The port to bind to.')
+@click.option('--ttl', type=float, default=None,
+              help='Seconds for which echo of a change is expected '
+                   '(default 10).')
+def ignore_server(host, port, ttl):
+    """
+    Run server of expected webhook echoes.
+
+    Web servers and workers use it when ``ignore_backend`` option of
+    ``[server]`` config section is ``tcp://host:port``.
+
+    :param: ``host``: The interface to bind to.
+    :param: ``port``: The port to bind to.
+    :param: ``ttl``: Seconds for which echo of a change is expected.
+    """
+    from .ignores import IgnoreServer, DEFAULT_TTL
+    server = IgnoreServer(host, port, DEFAULT_TTL if ttl is None else ttl)
+    click.echo('Serving ignores on {}'.format(server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
 
 
 def main():
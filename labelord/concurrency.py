@@ -0,0 +1,325 @@
+"""
+This module contains helpers for running GitHub calls concurrently.
+"""
+import collections
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+from .github import GitHubError
+
+
+###############################################################################
+# Adaptive concurrency
+###############################################################################
+
+
+class AIMDController:
+    """
+    Class **AIMDController** limits number of concurrent GitHub calls.
+
+    The limit is raised additively while calls succeed with stable latency
+    and it is cut multiplicatively when GitHub replies with (primary or
+    secondary) rate limit error, sends ``Retry-After`` header or when latency
+    starts rising.
+    """
+
+    DEFAULT_BACKOFF = 60
+
+    def __init__(self, initial=4, minimum=1, maximum=16, increase=1.0,
+                 decrease=0.5, latency_factor=2.0, smoothing=0.2,
+                 max_retries=3, backoff=None, on_change=None,
+                 clock=time.monotonic):
+        """
+        :param: ``initial``: Initial number of concurrent calls.
+        :param: ``minimum``: The lowest allowed limit.
+        :param: ``maximum``: The highest allowed limit.
+        :param: ``increase``: Limit increase per window of successful calls.
+        :param: ``decrease``: Multiplier applied to limit on congestion.
+        :param: ``latency_factor``: Latency is rising when it exceeds baseline by this factor.
+        :param: ``smoothing``: Weight of new sample in latency baseline.
+        :param: ``max_retries``: How many times call is retried after rate limit error.
+        :param: ``backoff``: Pause (seconds) after rate limit error without ``Retry-After``.
+        :param: ``on_change``: Callback called with new limit when it changes.
+        :param: ``clock``: Monotonic time source used to measure latency.
+        """
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.smoothing = smoothing
+        self.max_retries = max_retries
+        self.backoff = self.DEFAULT_BACKOFF if backoff is None else backoff
+        self.on_change = on_change
+        self.clock = clock
+        self._limit = float(min(max(initial, self.minimum), self.maximum))
+        self._in_flight = 0
+        self._baseline = None
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self):
+        """
+        Current number of allowed concurrent calls.
+        """
+        return int(self._limit)
+
+    @property
+    def in_flight(self):
+        """
+        Number of calls which are running right now.
+        """
+        return self._in_flight
+
+    def acquire(self):
+        """
+        Wait until a new call may be started.
+        """
+        with self._cond:
+            while True:
+                pause = self._blocked_until - self.clock()
+                if pause > 0:
+                    self._cond.wait(pause)
+                elif self._in_flight < self.limit:
+                    break
+                else:
+                    self._cond.wait()
+            self._in_flight += 1
+
+    def release(self, started, latency, error=None):
+        """
+        Mark call as finished and adjust the limit.
+
+        :param: ``started``: Monotonic time when call was started.
+        :param: ``latency``: Duration of call in seconds, *None* to skip adjusting.
+        :param: ``error``: :class:`~labelord.github.GitHubError` if call failed.
+        """
+        with self._cond:
+            self._in_flight -= 1
+            old_limit = self.limit
+            self._adjust(started, latency, error)
+            new_limit = self.limit
+            self._cond.notify_all()
+        if new_limit != old_limit and self.on_change is not None:
+            self.on_change(new_limit)
+
+    def _adjust(self, started, latency, error):
+        if error is not None and error.is_rate_limit:
+            pause = error.retry_after
+            if pause is None:
+                pause = self.backoff
+            self._blocked_until = max(self._blocked_until,
+                                      self.clock() + pause)
+            self._cut(started)
+            return
+        if error is not None or latency is None:
+            return  # not a congestion signal (e.g. 404, 422)
+        if self._baseline is None:
+            self._baseline = latency
+            return
+        rising = latency > self._baseline * self.latency_factor
+        self._baseline += self.smoothing * (latency - self._baseline)
+        if rising:
+            self._cut(started)
+        else:
+            self._limit = min(self.maximum,
+                              self._limit + self.increase / self._limit)
+
+    def _cut(self, started):
+        # Calls started before the last cut saw the old limit, react only once
+        if started < self._last_decrease:
+            return
+        self._last_decrease = self.clock()
+        self._limit = max(self.minimum, self._limit * self.decrease)
+
+    def call(self, func, *args, **kwargs):
+        """
+        Run ``func`` within the limit, rate limited calls are retried.
+
+        :return: Return value of ``func``.
+        """
+        attempt = 0
+        while True:
+            self.acquire()
+            started = self.clock()
+            try:
+                result = func(*args, **kwargs)
+            except GitHubError as error:
+                self.release(started, self.clock() - started, error)
+                if not error.is_rate_limit or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+            except Exception:
+                self.release(started, None)
+                raise
+            else:
+                self.release(started, self.clock() - started)
+                return result
+
+
+###############################################################################
+# Bounded concurrent mapping
+###############################################################################
+
+
+def bounded_map(func, items, workers, executor=None):
+    """
+    Call ``func`` for every item on a pool of ``workers`` threads.
+
+    Results are yielded as soon as calls finish, not in order of ``items``.
+
+    :param: ``func``: Function with one argument.
+    :param: ``items``: Iterable of arguments.
+    :param: ``workers``: Number of threads.
+    :param: ``executor``: Shared executor used instead of a new pool.
+    :return: Generator of ``(item, result, error)`` tuples, ``error`` is :class:`~labelord.github.GitHubError` or *None*.
+    """
+    if executor is None:
+        with ThreadPoolExecutor(max(1, workers)) as executor:
+            yield from bounded_map(func, items, workers, executor)
+        return
+    yield from completed({executor.submit(func, item): item for item in items})
+
+
+def completed(futures):
+    """
+    Collect results of futures as soon as they finish.
+
+    :param: ``futures``: Dictionary with futures as keys and items as values.
+    :return: Generator of ``(item, result, error)`` tuples, ``error`` is :class:`~labelord.github.GitHubError` or *None*.
+    """
+    for future in as_completed(futures):
+        item = futures[future]
+        try:
+            yield item, future.result(), None
+        except GitHubError as error:
+            yield item, None, error
+
+
+###############################################################################
+# Ordered execution
+###############################################################################
+
+
+DEFAULT_KEY_QUEUE_SIZE = 100
+
+
+class KeyedExecutor:
+    """
+    Class **KeyedExecutor** runs tasks of one key strictly in order of
+    submission and tasks of different keys concurrently.
+
+    Keys take turns on a pool of ``workers`` threads, one task at a time,
+    so a busy key does not starve the others. Every key has bounded queue;
+    :meth:`submit` blocks while it is full, which slows producers down
+    instead of letting work pile up.
+    """
+
+    def __init__(self, workers, queue_size=DEFAULT_KEY_QUEUE_SIZE):
+        """
+        :param: ``workers``: Number of threads.
+        :param: ``queue_size``: Maximal number of waiting tasks of one key.
+        """
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self._queues = {}
+        self._ready = collections.deque()
+        self._running = set()
+        self._queued = 0
+        self._pending = 0
+        self._threads = []
+        self._stopped = False
+        self._cond = threading.Condition()
+
+    @property
+    def queued(self):
+        """
+        Number of tasks waiting for a thread.
+        """
+        return self._queued
+
+    def submit(self, key, func, *args, timeout=None):
+        """
+        Schedule ``func(*args)`` after previously submitted tasks of ``key``.
+
+        :param: ``key``: Hashable key, e.g. repository.
+        :param: ``func``: Function to call.
+        :param: ``*args``: Arguments of function.
+        :param: ``timeout``: Seconds to wait for free place in queue of the key, forever if *None*.
+        :return: :class:`concurrent.futures.Future` of the call.
+        :raises: ``queue.Full`` if queue of the key stays full, ``RuntimeError`` after shutdown.
+        """
+        future = Future()
+        with self._cond:
+            if not self._cond.wait_for(
+                    lambda: self._stopped or
+                    len(self._queues.get(key, ())) < self.queue_size,
+                    timeout):
+                raise queue.Full
+            if self._stopped:
+                raise RuntimeError('Executor has been shut down')
+            if not self._threads:
+                self._start()
+            tasks = self._queues.setdefault(key, collections.deque())
+            if not tasks and key not in self._running:
+                self._ready.append(key)
+            tasks.append((future, func, args))
+            self._queued += 1
+            self._pending += 1
+            self._cond.notify_all()
+        return future
+
+    def _start(self):
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._work, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._ready or self._stopped)
+                if not self._ready:
+                    return
+                key = self._ready.popleft()
+                self._running.add(key)
+                future, func, args = self._queues[key].popleft()
+                self._queued -= 1
+                self._cond.notify_all()
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(func(*args))
+                except BaseException as e:
+                    future.set_exception(e)
+            with self._cond:
+                self._running.discard(key)
+                if self._queues[key]:
+                    self._ready.append(key)
+                else:
+                    del self._queues[key]
+                self._pending -= 1
+                self._cond.notify_all()
+
+    def join(self):
+        """
+        Wait until all submitted tasks are finished.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: not self._pending)
+
+    def shutdown(self, wait=True):
+        """
+        Stop accepting tasks, submitted ones are still run.
+
+        :param: ``wait``: Wait until they are finished.
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
@@ -0,0 +1,121 @@
+"""
+This module contains log of received webhook deliveries.
+"""
+import collections
+import os
+import threading
+
+
+###############################################################################
+# Delivery deduplication
+###############################################################################
+
+
+DEFAULT_DELIVERY_LOG_SIZE = 1000
+
+
+class DeliveryLog:
+    """
+    Class **DeliveryLog** remembers IDs of recent webhook deliveries.
+
+    GitHub (or operator) may redeliver webhook which has been already
+    accepted. Only ``size`` most recently seen IDs are kept (LRU). When
+    ``filename`` is given IDs are appended to it, so they survive restart;
+    forgotten IDs are appended as tombstones (``-`` prefix). The file is
+    compacted when it grows over twice the size and when it is closed.
+    """
+    TOMBSTONE = '-'
+
+    def __init__(self, size=DEFAULT_DELIVERY_LOG_SIZE, filename=None):
+        """
+        :param: ``size``: Number of remembered deliveries.
+        :param: ``filename``: Path to file with remembered deliveries.
+        """
+        self.size = size
+        self.filename = filename
+        self._seen = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._lines = 0
+        self._file = None
+        if filename is not None:
+            self._load()
+
+    def __len__(self):
+        return len(self._seen)
+
+    def __contains__(self, delivery):
+        return delivery in self._seen
+
+    def _load(self):
+        if os.path.exists(self.filename):
+            with open(self.filename) as f:
+                for line in f:
+                    self._lines += 1
+                    line = line.strip()
+                    if line.startswith(self.TOMBSTONE):
+                        self._seen.pop(line[len(self.TOMBSTONE):], None)
+                    else:
+                        self._remember(line)
+        self._file = open(self.filename, 'a')
+
+    def _remember(self, delivery):
+        if not delivery:
+            return
+        self._seen[delivery] = None
+        self._seen.move_to_end(delivery)
+        while len(self._seen) > self.size:
+            self._seen.popitem(last=False)
+
+    def _compact(self):
+        self._file.close()
+        temporary = self.filename + '.tmp'
+        with open(temporary, 'w') as f:
+            f.writelines(d + '\n' for d in self._seen)
+        os.replace(temporary, self.filename)
+        self._lines = len(self._seen)
+        self._file = open(self.filename, 'a')
+
+    def _append(self, line):
+        if self._file is None:
+            return
+        self._file.write(line + '\n')
+        self._file.flush()
+        self._lines += 1
+        if self._lines > 2 * self.size:
+            self._compact()
+
+    def seen(self, delivery):
+        """
+        Check whether delivery has been seen and remember it.
+
+        :param: ``delivery``: Value of ``X-GitHub-Delivery`` header.
+        :return: *True* if delivery is a duplicate.
+        """
+        with self._lock:
+            if delivery in self._seen:
+                self._seen.move_to_end(delivery)
+                return True
+            self._remember(delivery)
+            self._append(delivery)
+            return False
+
+    def forget(self, delivery):
+        """
+        Forget delivery which has not been accepted, so it can be redelivered.
+
+        :param: ``delivery``: Value of ``X-GitHub-Delivery`` header.
+        """
+        with self._lock:
+            if delivery in self._seen:
+                del self._seen[delivery]
+                self._append(self.TOMBSTONE + delivery)
+
+    def close(self):
+        """
+        Compact and close the file with remembered deliveries.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._compact()
+                self._file.close()
+                self._file = None
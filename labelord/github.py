@@ -9,6 +9,9 @@ import requests
 import sys
 import time
 
+from .labels import Label, format_color, parse_color
+from .metrics import observe_github_response
+
 
 ###############################################################################
 # GitHub API communicator
@@ -19,9 +22,47 @@ class GitHubError(Exception):
     """
     Class **GitHubError** serves as Exception for Github errors.
     """
-    def __init__(self, response):
-        self.status_code = response.status_code
-        self.message = response.json().get('message', 'No message provided')
+    SECONDARY_LIMIT_MARKERS = ('secondary rate limit', 'abuse')
+
+    def __init__(self, status_code, message, headers=None):
+        """
+        :param: ``status_code``: HTTP status code.
+        :param: ``message``: Error message.
+        :param: ``headers``: Response headers (rate limit, ``Retry-After``).
+        """
+        super().__init__(status_code, message)
+        self.status_code = status_code
+        self.message = message
+        headers = headers or {}
+        # Primary rate limit: 403/429 once X-RateLimit-Remaining drops to 0
+        self.exhausted = (self.status_code in (403, 429) and
+                          headers.get('X-RateLimit-Remaining') == '0')
+        self.retry_after = self._parse_retry_after(headers, self.exhausted)
+
+    @classmethod
+    def from_response(cls, response):
+        """
+        Create error from GitHub API response.
+
+        :param: ``response``: Response with error status code.
+        """
+        return cls(response.status_code,
+                   response.json().get('message', 'No message provided'),
+                   getattr(response, 'headers', None))
+
+    @staticmethod
+    def _parse_retry_after(headers, exhausted):
+        try:
+            return float(headers.get('Retry-After'))
+        except (TypeError, ValueError):
+            pass
+        if not exhausted:
+            return None
+        try:
+            return max(0.0, float(headers.get('X-RateLimit-Reset')) -
+                       time.time())
+        except (TypeError, ValueError):
+            return None
 
     def __str__(self):
         return 'GitHub: ERROR {}'.format(self.code_message)
@@ -33,6 +74,18 @@ class GitHubError(Exception):
         """
         return sep.join([str(self.status_code), self.message])
 
+    @property
+    def is_rate_limit(self):
+        """
+        *True* if error was caused by GitHub primary or secondary rate limiting.
+        """
+        if self.retry_after is not None or self.exhausted:
+            return True
+        if self.status_code not in (403, 429):
+            return False
+        message = self.message.lower()
+        return any(m in message for m in self.SECONDARY_LIMIT_MARKERS)
+
 
 class GitHub:
     """
@@ -40,10 +93,23 @@ class GitHub:
     """ 
 
     GH_API_ENDPOINT = 'https://api.github.com'
+    PER_PAGE = 100
 
     def __init__(self, token, session=None):
         self.token = token
         self.set_session(session)
+        self._etags = None
+
+    def enable_conditional_requests(self):
+        """
+        Remember ``ETag`` of every read and repeat reads conditionally.
+
+        Unchanged resources are then answered with *304 Not Modified*,
+        which does not count against GitHub rate limit, and the remembered
+        response is reused.
+        """
+        if self._etags is None:
+            self._etags = {}
 
     def set_session(self, session):
         """
@@ -53,20 +119,59 @@ class GitHub:
         """    
         self.session = session or requests.Session()
         self.session.auth = self._session_auth()
+        hooks = self.session.hooks.setdefault('response', [])
+        if self._observe not in hooks:
+            hooks.append(self._observe)
+
+    @staticmethod
+    def _observe(response, *args, **kwargs):
+        observe_github_response(response.request.method,
+                                response.status_code,
+                                response.elapsed.total_seconds(),
+                                response.headers)
+
+    def set_pool_size(self, size):
+        """
+        Let session keep up to ``size`` connections to GitHub API.
+
+        Sessions with custom adapters (e.g. recording ones) are left alone.
+
+        :param: ``size``: Number of pooled connections.
+        """
+        adapter = self.session.get_adapter(self.GH_API_ENDPOINT)
+        if type(adapter) is not requests.adapters.HTTPAdapter:
+            return
+        self.session.mount(self.GH_API_ENDPOINT, requests.adapters.HTTPAdapter(
+            pool_connections=size, pool_maxsize=size
+        ))
 
     def _session_auth(self):
         def github_auth(req):
-            req.headers = {
+            # Keep Content-Type and Content-Length of JSON bodies, without
+            # them bodies are sent chunked and each write waits for ACK
+            req.headers.update({
                 'Authorization': 'token ' + self.token,
                 'User-Agent': 'Python/Labelord'
-            }
+            })
             return req
         return github_auth
 
     def _get_raising(self, url, expected_code=200):
-        response = self.session.get(url)
+        if self._etags is None:
+            response = self.session.get(url)
+            if response.status_code != expected_code:
+                raise GitHubError.from_response(response)
+            return response
+        cached = self._etags.get(url)
+        headers = {'If-None-Match': cached[0]} if cached else {}
+        response = self.session.get(url, headers=headers)
+        if cached and response.status_code == 304:
+            return cached[1]
         if response.status_code != expected_code:
-            raise GitHubError(response)
+            self._etags.pop(url, None)
+            raise GitHubError.from_response(response)
+        if 'ETag' in response.headers:
+            self._etags[url] = (response.headers['ETag'], response)
         return response
 
     def _get_all_data(self, resource):
@@ -75,14 +180,25 @@ class GitHub:
         
         :param: ``resource``: Resource address.
         """
-        response = self._get_raising('{}{}?per_page=100&page=1'.format(
-            self.GH_API_ENDPOINT, resource
+        response = self._get_raising('{}{}?per_page={}&page=1'.format(
+            self.GH_API_ENDPOINT, resource, self.PER_PAGE
         ))
         yield from response.json()
         while 'next' in response.links:
             response = self._get_raising(response.links['next']['url'])
             yield from response.json()
 
+    def rate_limit(self):
+        """
+        Get state of core rate limit, the call itself is not counted.
+
+        :return: Dictionary with ``limit``, ``remaining`` and ``reset`` (Unix time).
+        """
+        response = self.session.get(self.GH_API_ENDPOINT + '/rate_limit')
+        if response.status_code != 200:
+            raise GitHubError.from_response(response)
+        return response.json()['resources']['core']
+
     def list_repositories(self):
         """
         Get list of names of accessible repositories (including owner).
@@ -94,32 +210,43 @@ class GitHub:
 
     def list_labels(self, repository):
         """
-        Get dict of labels with colors for given repository slug.
+        Get dict of labels for given repository slug.
 
         :param: ``repository``: Given repository name.
-        :return: Dictionary with tags name as keys and color as values.
+        :return: Dictionary with tags name as keys and :class:`~labelord.labels.Label` as values.
         """
         data = self._get_all_data('/repos/{}/labels'.format(repository))
-        return {l['name']: str(l['color']) for l in data}
+        labels = (Label.from_json(l) for l in data)
+        return {l.name: l for l in labels}
 
-    def create_label(self, repository, name, color, **kwargs):
+    @staticmethod
+    def _label_data(name, color, description):
+        data = {'name': name, 'color': format_color(parse_color(color))}
+        if description is not None:
+            data['description'] = description
+        return data
+
+    def create_label(self, repository, name, color, description=None,
+                     **kwargs):
         """
         Create new label in given repository.
         
         :param: ``repository``: Given repository name.
         :param: ``name``: Tag name.
         :param: ``color``: Tag color.
+        :param: ``description``: Tag description (unchanged if *None*).
         :param: ``*kwargs``: Additional arguments.
         """
-        data = {'name': name, 'color': color}
+        data = self._label_data(name, color, description)
         response = self.session.post(
             '{}/repos/{}/labels'.format(self.GH_API_ENDPOINT, repository),
             json=data
         )
         if response.status_code != 201:
-            raise GitHubError(response)
+            raise GitHubError.from_response(response)
 
-    def update_label(self, repository, name, color, old_name=None, **kwargs):
+    def update_label(self, repository, name, color, old_name=None,
+                     description=None, **kwargs):
         """
         Update existing label in given repository.
         
@@ -127,9 +254,10 @@ class GitHub:
         :param: ``name``: Tag name.
         :param: ``color``: Tag color.
         :param: ``old_name``: Old tag name.
+        :param: ``description``: Tag description (unchanged if *None*).
         :param: ``*kwargs``: Additional arguments.
         """
-        data = {'name': name, 'color': color}
+        data = self._label_data(name, color, description)
         response = self.session.patch(
             '{}/repos/{}/labels/{}'.format(
                 self.GH_API_ENDPOINT, repository, old_name or name
@@ -137,7 +265,7 @@ class GitHub:
             json=data
         )
         if response.status_code != 200:
-            raise GitHubError(response)
+            raise GitHubError.from_response(response)
 
     def delete_label(self, repository, name, **kwargs):
         """
@@ -152,12 +280,69 @@ class GitHub:
              )
         )
         if response.status_code != 204:
-            raise GitHubError(response)
+            raise GitHubError.from_response(response)
 
     @staticmethod
     def webhook_verify_signature(data, signature, secret, encoding='utf-8'):
         """
-        Verify hmac signature.
+        Verify hmac signature (``sha256=...`` or ``sha1=...``).
         """ 
-        h = hmac.new(secret.encode(encoding), data, hashlib.sha1)
-        return hmac.compare_digest('sha1=' + h.hexdigest(), signature)
+        return WebhookVerifier(secret, encoding).verify(data, signature)
+
+
+class WebhookVerifier:
+    """
+    Class **WebhookVerifier** checks signatures of webhook deliveries.
+
+    HMAC keys are prepared once for the secret, every verification only
+    copies the prepared state and hashes the body.
+    """
+    DIGESTS = (('sha256=', hashlib.sha256), ('sha1=', hashlib.sha1))
+
+    def __init__(self, secret, encoding='utf-8'):
+        """
+        :param: ``secret``: Webhook secret.
+        :param: ``encoding``: Encoding of the secret.
+        """
+        self.secret = secret
+        key = secret.encode(encoding)
+        self._macs = [(prefix, hmac.new(key, digestmod=digest))
+                      for prefix, digest in self.DIGESTS]
+
+    @staticmethod
+    def signature(headers):
+        """
+        Pick the strongest signature of delivery.
+
+        :param: ``headers``: Request headers.
+        :return: Value of ``X-Hub-Signature-256`` or ``X-Hub-Signature``.
+        """
+        return (headers.get('X-Hub-Signature-256') or
+                headers.get('X-Hub-Signature') or '')
+
+    def sign(self, data):
+        """
+        Sign data like GitHub signs webhook deliveries.
+
+        :param: ``data``: Raw request body.
+        :return: Value of ``X-Hub-Signature-256`` header.
+        """
+        prefix, mac = self._macs[0]
+        h = mac.copy()
+        h.update(data)
+        return prefix + h.hexdigest()
+
+    def verify(self, data, signature):
+        """
+        Verify hmac signature.
+
+        :param: ``data``: Raw request body.
+        :param: ``signature``: Signature with ``sha256=`` or ``sha1=`` prefix.
+        :return: *True* if signature matches.
+        """
+        for prefix, mac in self._macs:
+            if signature.startswith(prefix):
+                h = mac.copy()
+                h.update(data)
+                return hmac.compare_digest(prefix + h.hexdigest(), signature)
+        return False
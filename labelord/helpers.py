@@ -1,10 +1,11 @@
 """
 This module contains helper functions.
 """
-import click
 import configparser
+import fnmatch
 import os
-import sys
+
+from .labels import Label
 
 
 ###############################################################################
@@ -13,9 +14,51 @@ import sys
 
 
 DEFAULT_CONFIG_FILE = './config.cfg'
+NO_GH_TOKEN_RETURN = 3
 NO_LABELS_SPEC_RETURN = 6
 NO_REPOS_SPEC_RETURN = 7
+NO_WEBHOOK_SECRET_RETURN = 8
+INVALID_LABELS_SPEC_RETURN = 9
+INVALID_IGNORE_BACKEND_RETURN = 12
+PROFILE_SECTION_PREFIX = 'profile:'
+PROFILE_TEMPLATE_OPTION = 'template-repo'
+
+
+def _valid_ignore_backend(cfg):
+    # Ignore stores (sqlite3, sockets) are imported only by servers
+    from .ignores import is_valid_ignore_url
+    return is_valid_ignore_url(cfg.get('server', 'ignore_backend',
+                                       fallback='memory://'))
+
+
+# Problems of config which prevent webhook server from starting
+CONFIG_PROBLEMS = (
+    (NO_GH_TOKEN_RETURN, 'No GitHub token has been provided',
+     lambda cfg: cfg.has_option('github', 'token')),
+    (NO_REPOS_SPEC_RETURN, 'No repositories specification has been found',
+     lambda cfg: cfg.has_section('repos')),
+    (NO_WEBHOOK_SECRET_RETURN, 'No webhook secret has been provided',
+     lambda cfg: cfg.has_option('github', 'webhook_secret')),
+    (INVALID_IGNORE_BACKEND_RETURN, 'Unsupported ignore backend',
+     _valid_ignore_backend),
+)
+
 
+class ConfigError(Exception):
+    """
+    Class **ConfigError** reports configuration which cannot be used.
+
+    Command-line application turns it into exit ``code``, Web application
+    logs it and keeps running.
+    """
+
+    def __init__(self, code, message):
+        """
+        :param: ``code``: Exit code of command-line application.
+        :param: ``message``: Description of the problem.
+        """
+        super().__init__(message)
+        self.code = code
 
 
 def create_config(config_filename=None, token=None):
@@ -44,15 +87,140 @@ def extract_labels(gh, template_opt, cfg):
     :param: ``gh``: GitHub object
     :param: ``template_opt``: Template repository
     :param: ``cfg``: Dictionary with configuration
+    :return: Dictionary with label names as keys and :class:`~labelord.labels.Label` as values.
+    :raises: :class:`ConfigError` if there is no labels specification.
     """
     if template_opt is not None:
         return gh.list_labels(template_opt)
     if cfg.has_section('others') and 'template-repo' in cfg['others']:
         return gh.list_labels(cfg['others']['template-repo'])
     if cfg.has_section('labels'):
-        return {name: str(color) for name, color in cfg['labels'].items()}
-    click.echo('No labels specification has been found', err=True)
-    sys.exit(NO_LABELS_SPEC_RETURN)
+        return parse_labels(cfg['labels'])
+    raise ConfigError(NO_LABELS_SPEC_RETURN,
+                      'No labels specification has been found')
+
+
+def _profile_templates(cfg):
+    return {name[len(PROFILE_SECTION_PREFIX):]:
+            cfg[name].get(PROFILE_TEMPLATE_OPTION)
+            for name in cfg.sections()
+            if name.startswith(PROFILE_SECTION_PREFIX)}
+
+
+def has_label_profiles(cfg):
+    """
+    Check whether config defines label profiles.
+
+    :param: ``cfg``: Dictionary with configuration
+    """
+    return bool(_profile_templates(cfg))
+
+
+def profile_template_repos(cfg):
+    """
+    Template repositories of label profiles.
+
+    :param: ``cfg``: Dictionary with configuration
+    :return: Set of repositories.
+    """
+    return {t for t in _profile_templates(cfg).values() if t is not None}
+
+
+def assign_profiles(cfg, repos):
+    """
+    Assign label profiles to repositories.
+
+    Keys of ``[profiles]`` section are repositories or shell-style
+    patterns (e.g. ``org/web-*``), values are profile names. Exact
+    repository wins over patterns, patterns are tried in order of the file.
+
+    :param: ``cfg``: Dictionary with configuration
+    :param: ``repos``: List of repositories.
+    :return: Dictionary with repositories as keys and profile names (*None* for default specification) as values.
+    """
+    assignments = cfg['profiles'] if cfg.has_section('profiles') else {}
+    patterns = [(k, v) for k, v in assignments.items()
+                if any(c in k for c in '*?[')]
+    profiles = {}
+    for repo in repos:
+        profile = assignments.get(repo)
+        if profile is None:
+            profile = next((p for pattern, p in patterns
+                            if fnmatch.fnmatchcase(repo, pattern)), None)
+        profiles[repo] = profile
+    return profiles
+
+
+def extract_label_profiles(gh, template_opt, cfg, repos):
+    """
+    Extract labels specification of every repository.
+
+    Repositories get specification of their profile (see
+    :func:`assign_profiles`), profile is ``[profile:NAME]`` section with
+    labels or with ``template-repo`` option. Repositories without profile
+    use default specification (see :func:`extract_labels`), template
+    repository given by option is used for all of them. Every distinct
+    specification is fetched and parsed only once and it is shared by its
+    repositories.
+
+    :param: ``gh``: GitHub object
+    :param: ``template_opt``: Template repository
+    :param: ``cfg``: Dictionary with configuration
+    :param: ``repos``: List of repositories.
+    :return: Dictionary with repositories as keys and specifications (dictionaries with label names as keys and :class:`~labelord.labels.Label` as values) as values.
+    :raises: :class:`ConfigError` if a specification is missing or invalid.
+    """
+    if template_opt is not None:
+        labels = extract_labels(gh, template_opt, cfg)
+        return {repo: labels for repo in repos}
+    templates = _profile_templates(cfg)
+    compiled = {}
+
+    def spec(profile):
+        if profile is None:
+            key = ('template', cfg.get('others', 'template-repo',
+                                       fallback=None))
+        elif profile not in templates:
+            raise ConfigError(
+                NO_LABELS_SPEC_RETURN,
+                'Label profile {} has not been found'.format(profile)
+            )
+        elif templates[profile] is not None:
+            key = ('template', templates[profile])
+        else:
+            key = ('profile', profile)
+        if key not in compiled:
+            if key[0] == 'profile':
+                section = cfg[PROFILE_SECTION_PREFIX + profile]
+                compiled[key] = parse_labels(section)
+            elif key[1] is not None:
+                compiled[key] = gh.list_labels(key[1])
+            else:
+                compiled[key] = extract_labels(gh, None, cfg)
+        return compiled[key]
+
+    return {repo: spec(profile)
+            for repo, profile in assign_profiles(cfg, repos).items()}
+
+
+def parse_labels(section):
+    """
+    Parse labels specification from configuration section.
+
+    :param: ``section``: Section with label names as keys and colors as values.
+    :return: Dictionary with label names as keys and :class:`~labelord.labels.Label` as values.
+    :raises: :class:`ConfigError` if a color is invalid.
+    """
+    labels = {}
+    for name, color in section.items():
+        try:
+            labels[name] = Label(name, color)
+        except ValueError:
+            raise ConfigError(
+                INVALID_LABELS_SPEC_RETURN,
+                'Invalid color {} of label {}'.format(color, name)
+            )
+    return labels
 
 
 def extract_repos(cfg):
@@ -61,10 +229,11 @@ def extract_repos(cfg):
     
     :param: ``cfg``: Dictionary with configuration
     :return: List of repositories.
+    :raises: :class:`ConfigError` if there is no repositories specification.
     """
     if cfg.has_section('repos'):
         repos = cfg['repos'].keys()
         return [r for r in repos if cfg['repos'].getboolean(r, False)]
-    click.echo('No repositories specification has been found', err=True)
-    sys.exit(NO_REPOS_SPEC_RETURN)
+    raise ConfigError(NO_REPOS_SPEC_RETURN,
+                      'No repositories specification has been found')
 
@@ -0,0 +1,459 @@
+"""
+This module contains stores of changes made by labelord itself.
+
+Webhook server remembers every change it propagates, so the webhook which
+GitHub sends back for it (an echo) is not propagated again.
+
+Store is selected by URL (see :func:`create_ignore_store`), stores shared
+by more processes (:class:`SQLiteIgnoreStore`, :class:`TCPIgnoreStore`)
+let several webhook servers or workers recognize echoes of each other.
+Keys of shared stores must be tuples of JSON values.
+"""
+import collections
+import json
+import socket
+import socketserver
+import sqlite3
+import threading
+import time
+import urllib.parse
+import uuid
+
+from .labels import Label, parse_color
+
+
+###############################################################################
+# Echo suppression
+###############################################################################
+
+
+DEFAULT_TTL = 10
+
+
+class LabelordChange:
+    """
+    Class **LabelordChange** identifies label change made by labelord, so
+    its echo can be recognized in ignore store.
+    """
+    CHANGE_TIMEOUT = DEFAULT_TTL
+
+    def __init__(self, action, name, color, new_name=None):
+        self.action = action
+        self.name = name
+        self.color = None if action == 'deleted' else parse_color(color)
+        self.new_name = new_name
+
+    @property
+    def tuple(self):
+        return self.action, self.name, self.color, self.new_name
+
+    def __eq__(self, other):
+        if not isinstance(other, LabelordChange):
+            return NotImplemented
+        return self.tuple == other.tuple
+
+    def __hash__(self):
+        return hash(self.tuple)
+
+
+def label_change(data):
+    """
+    Identify change described by label webhook event.
+
+    :param: ``data``: Label webhook event.
+    :return: Tuple of action, :class:`~labelord.labels.Label`, changes and :class:`LabelordChange`.
+    """
+    action = data['action']
+    label = Label.from_json(data['label'])
+    changes = data.get('changes') or {}
+    change = LabelordChange(action, label.name, label.color)
+    if action == 'edited' and 'name' in changes:
+        change.new_name = label.name
+        change.name = changes['name']['from']
+    return action, label, changes, change
+
+
+def is_noop_edit(label, changes):
+    """
+    Check whether label edit changes nothing that is propagated.
+
+    Only name and color are propagated, edit of description or of color to
+    an equal value (e.g. ``FF0000`` to ``ff0000``) would become a write
+    which changes nothing.
+
+    :param: ``label``: Edited :class:`~labelord.labels.Label`.
+    :param: ``changes``: Changes part of webhook event.
+    """
+    def previous(key, current):
+        value = changes.get(key)
+        return value['from'] if isinstance(value, dict) else current
+
+    return (previous('name', label.name) == label.name and
+            parse_color(previous('color', label.color)) == label.color)
+
+
+class MemoryIgnoreStore:
+    """
+    Class **MemoryIgnoreStore** keeps expected echoes in process memory.
+
+    Changes are counted per ``(repo, key)`` (the same change may be expected
+    more times) and expire after ``ttl`` seconds of monotonic clock. All
+    entries share one TTL, so they expire in insertion order and a FIFO
+    serves as timing wheel: every operation is amortized constant time.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, clock=time.monotonic):
+        """
+        :param: ``ttl``: Seconds for which change is expected.
+        :param: ``clock``: Monotonic clock.
+        """
+        self.ttl = ttl
+        self._clock = clock
+        self._pending = {}
+        self._expiry = collections.deque()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def _expire(self, now):
+        while self._expiry and self._expiry[0][0] <= now:
+            _, entry = self._expiry.popleft()
+            times = self._pending.get(entry)
+            if times and times[0] <= now:
+                times.popleft()
+                self._size -= 1
+                if not times:
+                    del self._pending[entry]
+
+    def expire(self):
+        """
+        Drop expired changes.
+        """
+        with self._lock:
+            self._expire(self._clock())
+
+    def add(self, repos, key):
+        """
+        Expect change in repositories.
+
+        :param: ``repos``: Iterable of repositories.
+        :param: ``key``: Hashable identification of change.
+        """
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+            expires = now + self.ttl
+            for repo in repos:
+                entry = (repo, key)
+                self._pending.setdefault(entry, collections.deque()).append(
+                    expires
+                )
+                self._expiry.append((expires, entry))
+                self._size += 1
+
+    def consume(self, repo, key):
+        """
+        Check whether change is expected and forget one occurrence of it.
+
+        :param: ``repo``: Repository where change happened.
+        :param: ``key``: Hashable identification of change.
+        :return: *True* if change was expected.
+        """
+        with self._lock:
+            self._expire(self._clock())
+            times = self._pending.get((repo, key))
+            if not times:
+                return False
+            times.popleft()
+            self._size -= 1
+            if not times:
+                del self._pending[(repo, key)]
+            return True
+
+
+class SQLiteIgnoreStore:
+    """
+    Class **SQLiteIgnoreStore** keeps expected echoes in SQLite database
+    which can be shared by processes on one host or shared volume.
+
+    Expiry uses wall clock because monotonic clocks of processes differ.
+    Consumption is single ``DELETE`` statement, so one echo is consumed
+    by exactly one process.
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS ignores (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            repo TEXT NOT NULL,
+            key TEXT NOT NULL,
+            expires REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS ignores_change ON ignores (repo, key, id);
+        CREATE INDEX IF NOT EXISTS ignores_expires ON ignores (expires);
+    '''
+
+    def __init__(self, filename, ttl=DEFAULT_TTL, clock=time.time):
+        """
+        :param: ``filename``: Path to SQLite database.
+        :param: ``ttl``: Seconds for which change is expected.
+        :param: ``clock``: Wall clock.
+        """
+        self.filename = filename
+        self.ttl = ttl
+        self._clock = clock
+        self._local = threading.local()
+        self._connect().executescript(self.SCHEMA)
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.filename, timeout=30,
+                                         isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+        return connection
+
+    def __len__(self):
+        return self._connect().execute(
+            'SELECT COUNT(*) FROM ignores WHERE expires > ?', (self._clock(),)
+        ).fetchone()[0]
+
+    def expire(self):
+        """
+        Drop expired changes.
+        """
+        self._connect().execute('DELETE FROM ignores WHERE expires <= ?',
+                                (self._clock(),))
+
+    def add(self, repos, key):
+        """
+        Expect change in repositories.
+
+        :param: ``repos``: Iterable of repositories.
+        :param: ``key``: Tuple identifying change.
+        """
+        now = self._clock()
+        expires = now + self.ttl
+        key = json.dumps(key)
+        connection = self._connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute('DELETE FROM ignores WHERE expires <= ?',
+                               (now,))
+            connection.executemany(
+                'INSERT INTO ignores (repo, key, expires) VALUES (?, ?, ?)',
+                ((repo, key, expires) for repo in repos)
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def consume(self, repo, key):
+        """
+        Check whether change is expected and forget one occurrence of it.
+
+        :param: ``repo``: Repository where change happened.
+        :param: ``key``: Tuple identifying change.
+        :return: *True* if change was expected.
+        """
+        cursor = self._connect().execute(
+            'DELETE FROM ignores WHERE id = (SELECT id FROM ignores '
+            'WHERE repo = ? AND key = ? AND expires > ? ORDER BY id LIMIT 1)',
+            (repo, json.dumps(key), self._clock())
+        )
+        return cursor.rowcount == 1
+
+
+###############################################################################
+# TCP ignore server
+###############################################################################
+
+
+class _IgnoreHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            result = self.server.execute(json.loads(line.decode()))
+            self.wfile.write(json.dumps({'result': result}).encode() + b'\n')
+            self.wfile.flush()
+
+
+class IgnoreServer(socketserver.ThreadingTCPServer):
+    """
+    Class **IgnoreServer** serves :class:`MemoryIgnoreStore` over TCP to
+    :class:`TCPIgnoreStore` clients.
+
+    Protocol is one JSON object per line in both directions. Replies of
+    the last ``REPLIES`` requests are kept by request ``id``, so a request
+    repeated by client after lost reply is not applied twice.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+    REPLIES = 10000
+
+    def __init__(self, host='127.0.0.1', port=0, ttl=DEFAULT_TTL):
+        """
+        :param: ``host``: Address to listen on.
+        :param: ``port``: Port to listen on, *0* picks free one.
+        :param: ``ttl``: Seconds for which change is expected.
+        """
+        super().__init__((host, port), _IgnoreHandler)
+        self.store = MemoryIgnoreStore(ttl)
+        self._replies = collections.OrderedDict()
+        self._replies_lock = threading.Lock()
+
+    def _apply(self, request):
+        operation = request['op']
+        if operation == 'add':
+            self.store.add(request['repos'], tuple(request['key']))
+            return True
+        if operation == 'consume':
+            return self.store.consume(request['repo'], tuple(request['key']))
+        if operation == 'len':
+            return len(self.store)
+        return None
+
+    def execute(self, request):
+        """
+        Apply request to store, once for every request ``id``.
+
+        :param: ``request``: Decoded request.
+        :return: Result of the operation.
+        """
+        request_id = request.get('id')
+        if request_id is None:
+            return self._apply(request)
+        with self._replies_lock:
+            if request_id not in self._replies:
+                self._replies[request_id] = self._apply(request)
+                if len(self._replies) > self.REPLIES:
+                    self._replies.popitem(last=False)
+            return self._replies[request_id]
+
+    @property
+    def url(self):
+        return 'tcp://{}:{}'.format(*self.server_address)
+
+
+class TCPIgnoreStore:
+    """
+    Class **TCPIgnoreStore** is client of :class:`IgnoreServer`.
+
+    Every thread keeps its own connection, store operations are atomic
+    on the server. Request is sent again over new connection when the
+    reply is lost, it carries unique ``id`` so the server applies it once.
+    """
+
+    def __init__(self, host, port, timeout=5):
+        """
+        :param: ``host``: Address of server.
+        :param: ``port``: Port of server.
+        :param: ``timeout``: Socket timeout in seconds.
+        """
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @staticmethod
+    def _exchange(stream, data):
+        stream.write(data)
+        stream.flush()
+        line = stream.readline()
+        if not line:
+            raise ConnectionError('Ignore server closed connection')
+        return json.loads(line.decode())['result']
+
+    def _request(self, **request):
+        request['id'] = uuid.uuid4().hex
+        data = json.dumps(request).encode() + b'\n'
+        stream = getattr(self._local, 'stream', None)
+        if stream is not None:
+            try:
+                return self._exchange(stream, data)
+            except OSError:
+                stream.close()  # stale connection or lost reply
+        self._local.stream = None
+        connection = socket.create_connection((self.host, self.port),
+                                              self.timeout)
+        stream = connection.makefile('rwb')
+        connection.close()
+        self._local.stream = stream
+        return self._exchange(stream, data)
+
+    def __len__(self):
+        return self._request(op='len')
+
+    def expire(self):
+        """
+        Expired changes are dropped by the server.
+        """
+
+    def add(self, repos, key):
+        """
+        Expect change in repositories.
+
+        :param: ``repos``: Iterable of repositories.
+        :param: ``key``: Tuple identifying change.
+        """
+        self._request(op='add', repos=list(repos), key=key)
+
+    def consume(self, repo, key):
+        """
+        Check whether change is expected and forget one occurrence of it.
+
+        :param: ``repo``: Repository where change happened.
+        :param: ``key``: Tuple identifying change.
+        :return: *True* if change was expected.
+        """
+        return self._request(op='consume', repo=repo, key=key)
+
+
+###############################################################################
+# Backend selection
+###############################################################################
+
+
+def _parse_ignore_url(url):
+    parsed = urllib.parse.urlsplit(url)
+    if parsed.scheme == 'memory':
+        return MemoryIgnoreStore, ()
+    if parsed.scheme == 'sqlite' and parsed.path:
+        return SQLiteIgnoreStore, (parsed.path,)
+    if parsed.scheme == 'tcp' and parsed.hostname and parsed.port:
+        return TCPIgnoreStore, (parsed.hostname, parsed.port)
+    raise ValueError('Unsupported ignore backend: {}'.format(url))
+
+
+def create_ignore_store(url, ttl=DEFAULT_TTL):
+    """
+    Create store of expected echoes from URL.
+
+    Supported URLs are ``memory://`` (default, one process),
+    ``sqlite:///path/to/file.db`` and ``tcp://host:port``
+    (see :class:`IgnoreServer`, TTL is then set by the server).
+
+    :param: ``url``: URL of store.
+    :param: ``ttl``: Seconds for which change is expected.
+    :return: Ignore store.
+    :raises: ``ValueError`` if URL is not supported.
+    """
+    store, args = _parse_ignore_url(url)
+    if store is TCPIgnoreStore:
+        return store(*args)
+    return store(*args, ttl=ttl)
+
+
+def is_valid_ignore_url(url):
+    """
+    Check whether URL can be passed to :func:`create_ignore_store`.
+
+    :param: ``url``: URL of store.
+    """
+    try:
+        _parse_ignore_url(url)
+    except ValueError:
+        return False
+    return True
@@ -0,0 +1,261 @@
+"""
+This module contains durable queue of webhook events.
+"""
+import collections
+import contextlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+
+###############################################################################
+# Durable job queue
+###############################################################################
+
+
+Job = collections.namedtuple('Job', ['id', 'payload', 'attempts'])
+
+
+class JobQueue:
+    """
+    Class **JobQueue** stores webhook events in SQLite database.
+
+    Claimed job is leased to one worker, if the worker does not acknowledge
+    or renew it within the lease (e.g. it crashed) the job becomes available
+    again.
+    Failed jobs are retried with exponential backoff and after
+    ``max_attempts`` they are kept as *dead* for inspection.
+
+    Jobs with the same key (e.g. source repository) are claimed one by one
+    in order of arrival, also by workers in different processes: a job is
+    not claimed while an older job with its key is pending (in progress or
+    waiting for retry).
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            payload TEXT NOT NULL,
+            state TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            available_at REAL NOT NULL,
+            last_error TEXT,
+            key TEXT
+        );
+        CREATE INDEX IF NOT EXISTS jobs_available
+            ON jobs (state, available_at, id);
+    '''
+    KEY_INDEX = '''
+        CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, state, id);
+    '''
+
+    def __init__(self, filename, lease=60, max_attempts=5, backoff=2,
+                 max_backoff=300):
+        """
+        :param: ``filename``: Path to SQLite database.
+        :param: ``lease``: Seconds for which claimed job is reserved.
+        :param: ``max_attempts``: Number of attempts before job is dead.
+        :param: ``backoff``: Base of exponential delay (seconds) between attempts.
+        :param: ``max_backoff``: The longest delay between attempts.
+        """
+        self.filename = filename
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._local = threading.local()
+        connection = self._connect()
+        connection.executescript(self.SCHEMA)
+        columns = [row[1] for row in connection.execute(
+            'PRAGMA table_info(jobs)'
+        )]
+        if 'key' not in columns:  # queue created by older version
+            connection.execute('ALTER TABLE jobs ADD COLUMN key TEXT')
+        connection.executescript(self.KEY_INDEX)
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.filename, timeout=30,
+                                         isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+        return connection
+
+    def put(self, payload, key=None):
+        """
+        Store new job.
+
+        :param: ``payload``: JSON serializable event.
+        :param: ``key``: Jobs with the same key are processed in order, jobs without key in any order.
+        :return: Job id.
+        """
+        cursor = self._connect().execute(
+            'INSERT INTO jobs (payload, available_at, key) VALUES (?, ?, ?)',
+            (json.dumps(payload), time.time(), key)
+        )
+        return cursor.lastrowid
+
+    def claim(self):
+        """
+        Reserve the oldest available job.
+
+        :return: :class:`Job` or *None* if there is no available job.
+        """
+        connection = self._connect()
+        now = time.time()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT id, payload, attempts FROM jobs AS j '
+                'WHERE state = ? AND available_at <= ? AND NOT EXISTS ('
+                '    SELECT 1 FROM jobs AS o WHERE o.key = j.key '
+                '    AND o.state = ? AND o.id < j.id'
+                ') ORDER BY id LIMIT 1',
+                ('pending', now, 'pending')
+            ).fetchone()
+            if row is not None:
+                connection.execute(
+                    'UPDATE jobs SET attempts = attempts + 1, '
+                    'available_at = ? WHERE id = ?',
+                    (now + self.lease, row[0])
+                )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        if row is None:
+            return None
+        return Job(row[0], json.loads(row[1]), row[2] + 1)
+
+    def renew(self, job):
+        """
+        Extend lease of job which is still being processed.
+
+        :param: ``job``: Claimed :class:`Job`.
+        """
+        self._connect().execute(
+            'UPDATE jobs SET available_at = ? WHERE id = ? AND state = ?',
+            (time.time() + self.lease, job.id, 'pending')
+        )
+
+    def ack(self, job):
+        """
+        Remove successfully processed job.
+
+        :param: ``job``: Claimed :class:`Job`.
+        """
+        self._connect().execute('DELETE FROM jobs WHERE id = ?', (job.id,))
+
+    def fail(self, job, error, payload=None):
+        """
+        Schedule retry of failed job or mark it dead.
+
+        :param: ``job``: Claimed :class:`Job`.
+        :param: ``error``: Description of failure.
+        :param: ``payload``: Payload replacing the original one (e.g. with only the failed part of work), *None* to keep it.
+        """
+        connection = self._connect()
+        if payload is not None:
+            connection.execute('UPDATE jobs SET payload = ? WHERE id = ?',
+                               (json.dumps(payload), job.id))
+        if job.attempts >= self.max_attempts:
+            connection.execute(
+                'UPDATE jobs SET state = ?, last_error = ? WHERE id = ?',
+                ('dead', error, job.id)
+            )
+            return
+        delay = min(self.max_backoff, self.backoff ** job.attempts)
+        connection.execute(
+            'UPDATE jobs SET available_at = ?, last_error = ? WHERE id = ?',
+            (time.time() + delay, error, job.id)
+        )
+
+    def depth(self):
+        """
+        Number of jobs waiting for (successful) processing.
+        """
+        return self._connect().execute(
+            'SELECT COUNT(*) FROM jobs WHERE state = ?', ('pending',)
+        ).fetchone()[0]
+
+    def dead(self):
+        """
+        List jobs which failed too many times.
+
+        :return: List of :class:`Job`.
+        """
+        rows = self._connect().execute(
+            'SELECT id, payload, attempts FROM jobs WHERE state = ? '
+            'ORDER BY id', ('dead',)
+        )
+        return [Job(r[0], json.loads(r[1]), r[2]) for r in rows]
+
+
+@contextlib.contextmanager
+def leased(jobs, job):
+    """
+    Keep renewing lease of the job (several times per lease) in background
+    thread until the block exits.
+
+    :param: ``jobs``: :class:`JobQueue`.
+    :param: ``job``: Claimed :class:`Job`.
+    """
+    done = threading.Event()
+
+    def heartbeat():
+        while not done.wait(jobs.lease / 3):
+            jobs.renew(job)
+
+    thread = None
+    if jobs.lease > 0:
+        thread = threading.Thread(target=heartbeat, daemon=True)
+        thread.start()
+    try:
+        yield job
+    finally:
+        done.set()
+        if thread is not None:
+            thread.join()
+
+
+def work(jobs, handler, once=False, poll_interval=1.0, stop=None,
+         logger=None):
+    """
+    Process jobs from queue until stopped.
+
+    The job stays leased while the handler runs (see :func:`leased`), so
+    propagation longer than the lease is not claimed by another worker.
+
+    :param: ``jobs``: :class:`JobQueue`.
+    :param: ``handler``: Function called with payload of every job, exception marks the job failed (its ``payload`` attribute, if any, is retried instead of the original payload).
+    :param: ``once``: Return when there is no available job.
+    :param: ``poll_interval``: Pause (seconds) when queue is empty.
+    :param: ``stop``: *threading.Event* which stops processing when set.
+    :param: ``logger``: Logger for failed jobs.
+    :return: Number of processed jobs.
+    """
+    logger = logger or logging.getLogger(__name__)
+    stop = stop or threading.Event()
+    processed = 0
+    while not stop.is_set():
+        job = jobs.claim()
+        if job is None:
+            if once:
+                break
+            stop.wait(poll_interval)
+            continue
+        try:
+            with leased(jobs, job):
+                handler(job.payload)
+        except Exception as error:
+            logger.exception('Job {} failed (attempt {})'.format(
+                job.id, job.attempts
+            ))
+            jobs.fail(job, repr(error), getattr(error, 'payload', None))
+        else:
+            jobs.ack(job)
+        processed += 1
+    return processed
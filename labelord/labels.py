@@ -0,0 +1,155 @@
+"""
+This module contains compact representation of GitHub labels.
+"""
+import sys
+
+
+###############################################################################
+# Labels
+###############################################################################
+
+
+_COLORS = {}
+
+
+def parse_color(color):
+    """
+    Convert color to 24-bit integer.
+
+    :param: ``color``: Color as integer or hex string (``FF0000``, ``#ff0000``).
+    :return: Integer value of color, equal values share one object.
+    """
+    if isinstance(color, int):
+        value = color
+    else:
+        value = int(str(color).strip().lstrip('#'), 16)
+    if not 0 <= value <= 0xFFFFFF:
+        raise ValueError('Color out of range: {}'.format(color))
+    return _COLORS.setdefault(value, value)
+
+
+def format_color(color):
+    """
+    Convert 24-bit integer color to hex string used by GitHub.
+
+    :param: ``color``: Integer color.
+    :return: Six lowercase hex digits.
+    """
+    return '{:06x}'.format(color)
+
+
+def canonical_description(description):
+    """
+    Normalize label description for comparison.
+
+    :param: ``description``: Description, *None* if not set.
+    :return: Description with collapsed whitespace, empty string if not set.
+    """
+    return ' '.join(description.split()) if description else ''
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+class Label:
+    """
+    Class **Label** represents one GitHub label.
+
+    Names and descriptions are interned so labels with same name share one
+    string across all repositories, color is stored as integer. Color
+    string which is not in GitHub's form (e.g. ``#FF0000``) is kept as
+    ``raw_color``.
+    """
+    __slots__ = ('name', 'color', 'raw_color', 'description', 'id')
+
+    def __init__(self, name, color, description=None, id=None):
+        self.name = _intern(name)
+        self.color = parse_color(color)
+        self.raw_color = (_intern(color) if isinstance(color, str) and
+                          color != format_color(self.color) else None)
+        self.description = _intern(description)
+        self.id = id
+
+    @classmethod
+    def from_json(cls, data):
+        """
+        Create label from GitHub API representation.
+
+        :param: ``data``: Dictionary with label data.
+        """
+        return cls(data['name'], data['color'],
+                   data.get('description'), data.get('id'))
+
+    def to_json(self):
+        """
+        Convert label to GitHub API representation.
+
+        :return: Dictionary with label data.
+        """
+        return {'id': self.id, 'name': self.name, 'color': self.hex,
+                'description': self.description}
+
+    @property
+    def hex(self):
+        """
+        Color as hex string.
+        """
+        return format_color(self.color)
+
+    def differs(self, other):
+        """
+        Check whether writing this label over ``other`` changes it.
+
+        Colors are compared as integers, descriptions canonically and only
+        when this label sets one.
+
+        :param: ``other``: Current :class:`Label`.
+        """
+        if self.color != other.color:
+            return True
+        return (self.description is not None and
+                canonical_description(self.description) !=
+                canonical_description(other.description))
+
+    def is_noop_write(self, other):
+        """
+        Check whether this label differs from ``other`` only in raw form,
+        e.g. color ``FF0000`` and ``ff0000`` or whitespace of description,
+        so writing it would change nothing (see :meth:`differs`).
+
+        :param: ``other``: Current :class:`Label`.
+        """
+        if self.differs(other):
+            return False
+        if (self.raw_color or self.hex) != (other.raw_color or other.hex):
+            return True
+        return self.description not in (None, other.description)
+
+    @property
+    def key(self):
+        return self.name, self.color, self.description
+
+    def __eq__(self, other):
+        if not isinstance(other, Label):
+            return NotImplemented
+        return self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return 'Label({!r}, {!r})'.format(self.name, self.hex)
+
+
+def as_labels(labels):
+    """
+    Convert ``{name: color}`` dictionary to ``{name: Label}``.
+
+    :param: ``labels``: Dictionary with colors or :class:`Label` values.
+    :return: Dictionary with :class:`Label` values.
+    """
+    if all(type(label) is Label for label in labels.values()):
+        return labels
+    return {name: label if isinstance(label, Label) else Label(name, label)
+            for name, label in labels.items()}
@@ -0,0 +1,276 @@
+"""
+This module contains metrics of webhook server in Prometheus text format.
+"""
+import bisect
+import threading
+
+
+###############################################################################
+# Metrics
+###############################################################################
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+
+
+def _escape(value):
+    return (str(value).replace('\\', '\\\\').replace('\n', '\\n')
+            .replace('"', '\\"'))
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(n, _escape(v))
+                          for n, v in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    Class **Metric** is base of metrics with optional labels.
+    """
+    TYPE = None
+
+    def __init__(self, name, help, labels=()):
+        """
+        :param: ``name``: Metric name.
+        :param: ``help``: Description.
+        :param: ``labels``: Names of labels.
+        """
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labels):
+            raise ValueError('Metric {} expects labels {}'.format(
+                self.name, self.labels
+            ))
+        return tuple(str(l) for l in labels)
+
+    def clear(self):
+        """
+        Forget all values.
+        """
+        with self._lock:
+            self._values.clear()
+
+    def samples(self):
+        """
+        :return: List of ``(suffix, label values, extra labels, value)``.
+        """
+        with self._lock:
+            return [('', key, (), value)
+                    for key, value in sorted(self._values.items())]
+
+    def render(self):
+        """
+        :return: Metric in Prometheus text format.
+        """
+        lines = ['# HELP {} {}'.format(self.name, self.help),
+                 '# TYPE {} {}'.format(self.name, self.TYPE)]
+        for suffix, key, extra, value in self.samples():
+            lines.append('{}{}{} {}'.format(
+                self.name, suffix, _format_labels(self.labels, key, extra),
+                _format_value(value)
+            ))
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """
+    Class **Counter** counts events.
+    """
+    TYPE = 'counter'
+
+    def inc(self, *labels, amount=1):
+        """
+        Increase counter.
+
+        :param: ``*labels``: Label values.
+        :param: ``amount``: Increment.
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    """
+    Class **Gauge** holds current value.
+    """
+    TYPE = 'gauge'
+
+    def set(self, value, *labels):
+        """
+        Set value.
+
+        :param: ``value``: New value.
+        :param: ``*labels``: Label values.
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, *labels):
+        return self._values.get(self._key(labels))
+
+
+class Histogram(Metric):
+    """
+    Class **Histogram** counts observations (e.g. latencies) in buckets.
+    """
+    TYPE = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        """
+        :param: ``buckets``: Sorted upper bounds of buckets.
+        """
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        """
+        Record observation.
+
+        :param: ``value``: Observed value.
+        :param: ``*labels``: Label values.
+        """
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0, 0]
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, *labels):
+        state = self._values.get(self._key(labels))
+        return 0 if state is None else state[2]
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2]))
+                           for k, v in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                samples.append(('_bucket', key, (('le', _format_value(
+                    float(bound))),), cumulative))
+            samples.append(('_bucket', key, (('le', '+Inf'),), count))
+            samples.append(('_sum', key, (), total))
+            samples.append(('_count', key, (), count))
+        return samples
+
+
+class Registry:
+    """
+    Class **Registry** keeps metrics rendered together.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        """
+        Add metric to registry.
+
+        :return: The metric.
+        """
+        self._metrics.append(metric)
+        return metric
+
+    def clear(self):
+        """
+        Forget values of all metrics.
+        """
+        for metric in self._metrics:
+            metric.clear()
+
+    def render(self):
+        """
+        :return: All metrics in Prometheus text format.
+        """
+        return '\n'.join(m.render() for m in self._metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+WEBHOOKS = REGISTRY.register(Counter(
+    'labelord_webhooks_total', 'Webhook deliveries by event and response.',
+    ('event', 'status')
+))
+SIGNATURE_FAILURES = REGISTRY.register(Counter(
+    'labelord_webhook_signature_failures_total',
+    'Webhook deliveries with wrong signature.'
+))
+ECHOES = REGISTRY.register(Counter(
+    'labelord_echoes_total', 'Webhooks recognized as echo of own change.'
+))
+NOOP_WRITES = REGISTRY.register(Counter(
+    'labelord_noop_writes_skipped_total',
+    'Label writes skipped because they would change nothing.'
+))
+PROPAGATION_LATENCY = REGISTRY.register(Histogram(
+    'labelord_propagation_duration_seconds',
+    'Duration of propagation of label change to one repository.',
+    ('action', 'result')
+))
+# Labelled by target repository on purpose: its cardinality is bounded by
+# allowed repositories of configuration, so slow targets can be spotted.
+FANOUT_LATENCY = REGISTRY.register(Histogram(
+    'labelord_fanout_duration_seconds',
+    'Duration from start of fan-out of label change until it is written '
+    'to target repository.',
+    ('action', 'repo')
+))
+GITHUB_LATENCY = REGISTRY.register(Histogram(
+    'labelord_github_request_duration_seconds',
+    'Duration of GitHub API requests.', ('method', 'status')
+))
+RATE_LIMIT_REMAINING = REGISTRY.register(Gauge(
+    'labelord_github_rate_limit_remaining',
+    'GitHub API requests remaining in current rate limit window.'
+))
+IGNORES = REGISTRY.register(Gauge(
+    'labelord_ignores', 'Expected echoes in ignore store.'
+))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    'labelord_queue_depth', 'Webhook events waiting for processing.'
+))
+
+
+def observe_github_response(method, status, latency, headers):
+    """
+    Record GitHub API response.
+
+    :param: ``method``: HTTP method.
+    :param: ``status``: Status code.
+    :param: ``latency``: Duration in seconds.
+    :param: ``headers``: Response headers.
+    """
+    GITHUB_LATENCY.observe(latency, method, status)
+    remaining = headers.get('X-RateLimit-Remaining')
+    if remaining is not None:
+        try:
+            RATE_LIMIT_REMAINING.set(int(remaining))
+        except ValueError:
+            pass
@@ -0,0 +1,189 @@
+"""
+This module contains periodic reconciliation of labels for webhook server.
+
+Webhooks may be missed or their propagation may fail, reconciler re-syncs
+allowed repositories with labels specification in the background, so
+drift is healed without running ``labelord run``.
+"""
+import threading
+import time
+
+from .cli import BasePrinter, RunProcessor
+from .concurrency import AIMDController
+from .helpers import (extract_label_profiles, has_label_profiles,
+                      ConfigError)
+from .ignores import LabelordChange
+
+DEFAULT_RECONCILE_CONCURRENCY = 2
+
+
+###############################################################################
+# Reconciliation
+###############################################################################
+
+
+def has_labels_spec(cfg):
+    """
+    Check whether config specifies labels (section, template repository or
+    profiles).
+
+    :param: ``cfg``: Labelord configuration.
+    """
+    return (cfg.has_section('labels') or
+            cfg.has_option('others', 'template-repo') or
+            has_label_profiles(cfg))
+
+
+class LoggingPrinter(BasePrinter):
+    """
+    Class **LoggingPrinter** logs writes of reconciler.
+    """
+
+    def __init__(self, logger):
+        super().__init__()
+        self.logger = logger
+
+    def event(self, event, result, repo, *args, latency=None):
+        super().event(event, result, repo, *args, latency=latency)
+        if result == self.RESULT_ERROR:
+            self.logger.warning('Reconciliation {} {} failed: {}'.format(
+                event, repo, '; '.join(str(a) for a in args)
+            ))
+        elif event != self.EVENT_LABELS:
+            self.logger.info('Reconciliation {} {} {}'.format(
+                event, repo, ' '.join(str(a) for a in args)
+            ))
+
+
+class ReconcileProcessor(RunProcessor):
+    """
+    Class **ReconcileProcessor** syncs labels like :class:`~labelord.cli.RunProcessor`
+    and registers every write in ignore store, so its webhook echo is not
+    propagated.
+    """
+
+    CHANGES = {
+        BasePrinter.EVENT_CREATE: 'created',
+        BasePrinter.EVENT_UPDATE: 'edited',
+        BasePrinter.EVENT_DELETE: 'deleted',
+    }
+
+    def __init__(self, github, ignores, printer=None, controller=None):
+        super().__init__(github, printer, controller)
+        self.ignores = ignores
+
+    def _process_generic(self, slug, key, label, event, method):
+        action = self.CHANGES[event]
+        if action == 'edited' and key != label.name:
+            change = LabelordChange(action, key, label.color, label.name)
+        else:
+            change = LabelordChange(action, label.name, label.color)
+        self.ignores.add([slug], change.tuple)
+        super()._process_generic(slug, key, label, event, method)
+
+
+class Reconciler:
+    """
+    Class **Reconciler** periodically syncs allowed repositories of webhook
+    application.
+
+    Repositories are reconciled one by one, evenly spread over
+    ``interval``, so GitHub calls never come in bursts. Reads are
+    conditional (see :meth:`~labelord.github.GitHub.enable_conditional_requests`)
+    and cost no rate limit while labels do not change.
+    """
+
+    MODES = RunProcessor.MODES
+
+    def __init__(self, app, interval, mode='update', logger=None):
+        """
+        :param: ``app``: :class:`~labelord.web.LabelordWeb` application.
+        :param: ``interval``: Seconds in which all repositories are synced.
+        :param: ``mode``: ``update`` or ``replace`` (see ``labelord run``).
+        :param: ``logger``: Logger, application logger by default.
+        """
+        self.app = app
+        self.interval = interval
+        self.mode = self.MODES[mode]
+        self.logger = logger or app.logger
+        self.controller = AIMDController(
+            initial=1, maximum=DEFAULT_RECONCILE_CONCURRENCY
+        )
+        self._stop = threading.Event()
+        self._thread = None
+        self.cycles = 0
+
+    def reconcile(self, slug, labels):
+        """
+        Sync one repository.
+
+        :param: ``slug``: Repository.
+        :param: ``labels``: Labels specification.
+        :return: Number of errors.
+        """
+        printer = LoggingPrinter(self.logger)
+        processor = ReconcileProcessor(self.app.github, self.app.ignores,
+                                       printer, self.controller)
+        processor.run([slug], labels, self.mode)
+        return printer.errors
+
+    def run_cycle(self):
+        """
+        Sync all allowed repositories once, spread over the interval.
+
+        :return: Number of errors.
+        """
+        cfg = self.app.labelord_config
+        repos = sorted(self.app.repos)
+        if not has_labels_spec(cfg) or not repos:
+            self.logger.error('Reconciliation skipped: '
+                              'No labels or repositories specification')
+            self._stop.wait(self.interval)
+            return 0
+        step = self.interval / len(repos)
+        errors = 0
+        specs = None
+        for slug in repos:
+            started = time.monotonic()
+            try:
+                if specs is None:
+                    specs = extract_label_profiles(self.app.github, None, cfg,
+                                                   repos)
+                errors += self.reconcile(slug, specs[slug])
+            except ConfigError as error:
+                self.logger.error('Reconciliation skipped: {}'.format(error))
+                self._stop.wait(self.interval)
+                return errors + 1
+            except Exception:
+                errors += 1
+                self.logger.exception('Reconciliation of {} failed'.format(
+                    slug
+                ))
+            if self._stop.wait(max(0, step - (time.monotonic() - started))):
+                break
+        self.cycles += 1
+        return errors
+
+    def start(self):
+        """
+        Start reconciling in daemon thread.
+
+        :return: Started thread.
+        """
+        self.app.github.enable_conditional_requests()
+
+        def loop():
+            while not self._stop.is_set():
+                self.run_cycle()
+
+        self._thread = threading.Thread(target=loop, daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        """
+        Stop reconciling after the current repository.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,902 @@
+"""
+This module contains state and webhook processing shared by Web
+applications (:mod:`labelord.web` and :mod:`labelord.asgi`).
+
+Front ends only read requests, write responses and write label changes
+to GitHub, so both of them accept, order, coalesce and queue webhook
+events the same way.
+"""
+import atexit
+import collections
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from .concurrency import KeyedExecutor
+from .deliveries import DeliveryLog, DEFAULT_DELIVERY_LOG_SIZE
+from .github import WebhookVerifier
+from .helpers import (create_config, extract_repos, CONFIG_PROBLEMS,
+                      DEFAULT_CONFIG_FILE)
+from .ignores import (create_ignore_store, is_noop_edit, label_change,
+                      LabelordChange)
+from .jobs import JobQueue
+from .labels import Label
+from . import metrics
+
+DEFAULT_WEBHOOK_WORKERS = 4
+DEFAULT_WEBHOOK_QUEUE_SIZE = 1000
+DEFAULT_FANOUT_WORKERS = 8
+DEFAULT_FANOUT_QUEUE_SIZE = 100
+DEFAULT_MAX_BODY_SIZE = 1024 * 1024
+DEFAULT_MAX_BATCH_SIZE = 64 * 1024 * 1024
+BATCH_ENQUEUE_TIMEOUT = 60
+SUPPORTED_EVENTS = frozenset(['label', 'ping'])
+RETRY_TARGETS = 'labelord_targets'
+
+###############################################################################
+# Batches of events
+###############################################################################
+
+
+def read_label_events(lines):
+    """
+    Parse batch of webhook events, one JSON object per line (NDJSON).
+
+    Line is either label webhook payload or envelope
+    ``{"event": ..., "delivery": ..., "payload": ...}``, events other
+    than ``label`` are skipped.
+
+    :param: ``lines``: Iterable of lines (``str`` or ``bytes``).
+    :return: List of ``(delivery, data)`` tuples, ``delivery`` may be *None*.
+    :raises: ``ValueError`` if a line is not label event.
+    """
+    events = []
+    for number, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+            delivery = None
+            if 'payload' in data:
+                if data.get('event', 'label') != 'label':
+                    continue
+                delivery, data = data.get('delivery'), data['payload']
+            data['repository']['full_name'], data['label']['name']
+            data['action']
+        except (ValueError, TypeError, KeyError) as e:
+            raise ValueError('Line {} is not label event: {}'.format(
+                number, e
+            ))
+        events.append((delivery, data))
+    return events
+
+
+###############################################################################
+# Background processing
+###############################################################################
+
+
+class PropagationError(Exception):
+    """
+    Class **PropagationError** reports label change which was not written
+    to some target repositories.
+
+    Its ``payload`` is the event limited to the failed targets, so job of
+    durable queue is retried only for them.
+    """
+
+    def __init__(self, data, errors):
+        """
+        :param: ``data``: Label webhook event.
+        :param: ``errors``: Dictionary with target repositories as keys and :class:`~labelord.github.GitHubError` as values.
+        """
+        super().__init__('Not propagated to {}'.format(', '.join(
+            '{} ({})'.format(target, error.code_message)
+            for target, error in sorted(errors.items())
+        )))
+        self.errors = errors
+        self.payload = dict(data, **{RETRY_TARGETS: sorted(errors)})
+
+
+class WebhookWorkerPool:
+    """
+    Class **WebhookWorkerPool** processes webhook events in background threads.
+
+    Events wait in bounded queue, events with the same ``key`` (e.g. source
+    repository) are processed in order of arrival, the others concurrently.
+    :meth:`shutdown` stops accepting new events and waits until the queued
+    ones are processed.
+    """
+
+    def __init__(self, handler, workers=DEFAULT_WEBHOOK_WORKERS,
+                 queue_size=DEFAULT_WEBHOOK_QUEUE_SIZE, logger=None,
+                 key=None):
+        """
+        :param: ``handler``: Function called with every event.
+        :param: ``workers``: Number of threads.
+        :param: ``queue_size``: Maximal number of waiting events.
+        :param: ``logger``: Logger for errors raised by ``handler``.
+        :param: ``key``: Function returning key of event, events are not ordered if *None*.
+        """
+        self.handler = handler
+        self.workers = workers
+        self.queue_size = queue_size
+        self.key = key or (lambda event: object())
+        self.logger = logger or logging.getLogger(__name__)
+        self._executor = KeyedExecutor(workers, queue_size)
+        self._lock = threading.Lock()
+        self._started = False
+        self._stopped = False
+
+    @property
+    def depth(self):
+        """
+        Number of events waiting for processing.
+        """
+        return self._executor.queued
+
+    def submit(self, event, timeout=0):
+        """
+        Enqueue event.
+
+        :param: ``event``: Event passed to handler.
+        :param: ``timeout``: Seconds to wait for place in queue of the event's key, with 0 the event is refused right away when the pool is full.
+        :return: *False* if queue is full or pool is shut down.
+        """
+        with self._lock:
+            if self._stopped:
+                return False
+            if not timeout and self._executor.queued >= self.queue_size:
+                return False
+            if not self._started:
+                self._started = True
+                atexit.register(self.shutdown)
+        try:
+            self._executor.submit(self.key(event), self._handle, event,
+                                  timeout=timeout)
+        except (queue.Full, RuntimeError):
+            return False
+        return True
+
+    def join(self):
+        """
+        Wait until all queued events are processed.
+        """
+        self._executor.join()
+
+    def shutdown(self):
+        """
+        Stop accepting events and wait for processing of queued ones.
+        """
+        with self._lock:
+            if self._stopped:
+                return
+            self._stopped = True
+        self._executor.shutdown()
+
+    def _handle(self, event):
+        try:
+            self.handler(event)
+        except Exception:
+            self.logger.exception('Processing of webhook event failed')
+
+
+def _label_before(label, changes):
+    previous = {key: value['from'] for key, value in changes.items()
+                if isinstance(value, dict) and 'from' in value}
+    return Label(previous.get('name', label.name),
+                 previous.get('color', label.color),
+                 previous.get('description', label.description), label.id)
+
+
+def net_label_event(repository, before, after):
+    """
+    Create webhook event with net change of one label.
+
+    :param: ``repository``: Repository part of webhook event.
+    :param: ``before``: :class:`~labelord.labels.Label` before the changes, *None* if it was created.
+    :param: ``after``: :class:`~labelord.labels.Label` after the changes, *None* if it was deleted.
+    :return: Webhook event or *None* if the changes cancel out.
+    """
+    if after is None:
+        if before is None:
+            return None
+        action, label, changes = 'deleted', before, {}
+    elif before is None:
+        action, label, changes = 'created', after, {}
+    else:
+        if before == after:
+            return None
+        action, label, changes = 'edited', after, {}
+        if before.name != after.name:
+            changes['name'] = {'from': before.name}
+        if before.color != after.color:
+            changes['color'] = {'from': before.hex}
+        if before.description != after.description:
+            changes['description'] = {'from': before.description}
+    return {'action': action, 'label': label.to_json(), 'changes': changes,
+            'repository': repository}
+
+
+class LabelEventCoalescer:
+    """
+    Class **LabelEventCoalescer** merges bursts of label webhook events.
+
+    Events of one label in one repository (keyed by label id) are collected
+    for ``window`` seconds since the first of them, then only their net
+    change (see :func:`net_label_event`) is passed to handler, so
+    intermediate states are never propagated.
+    """
+
+    def __init__(self, handler, window, clock=time.monotonic, logger=None):
+        """
+        :param: ``handler``: Function called with every net event.
+        :param: ``window``: Seconds for which events are collected.
+        :param: ``clock``: Monotonic clock.
+        :param: ``logger``: Logger for errors raised by ``handler``.
+        """
+        self.handler = handler
+        self.window = window
+        self.logger = logger or logging.getLogger(__name__)
+        self._clock = clock
+        self._pending = {}
+        self._deadlines = collections.deque()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    def __len__(self):
+        return len(self._pending)
+
+    def submit(self, data):
+        """
+        Merge label webhook event into pending changes.
+
+        :param: ``data``: Label webhook event.
+        :return: *False* if coalescer is shut down.
+        """
+        action = data['action']
+        label = Label.from_json(data['label'])
+        repo = data['repository']['full_name']
+        key = (repo, label.id if label.id is not None else label.name)
+        with self._condition:
+            if self._stopped:
+                return False
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._work,
+                                                daemon=True)
+                self._thread.start()
+            entry = self._pending.get(key)
+            if entry is None:
+                before = (None if action == 'created' else
+                          _label_before(label, data.get('changes') or {}))
+                entry = self._pending[key] = [data['repository'], before,
+                                              None]
+                self._deadlines.append((self._clock() + self.window, key))
+                self._condition.notify()
+            entry[2] = None if action == 'deleted' else label
+        return True
+
+    def _due(self, everything):
+        now = self._clock()
+        events = []
+        while self._deadlines and (everything or
+                                   self._deadlines[0][0] <= now):
+            _, key = self._deadlines.popleft()
+            event = net_label_event(*self._pending.pop(key))
+            if event is not None:
+                events.append(event)
+        return events
+
+    def _handle(self, events):
+        for event in events:
+            try:
+                self.handler(event)
+            except Exception:
+                self.logger.exception('Processing of webhook event failed')
+
+    def flush(self):
+        """
+        Pass all pending changes to handler right away.
+        """
+        with self._condition:
+            events = self._due(True)
+        self._handle(events)
+
+    def shutdown(self):
+        """
+        Stop accepting events and flush pending changes.
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._stopped:
+                    if self._deadlines:
+                        wait = self._deadlines[0][0] - self._clock()
+                        if wait <= 0:
+                            break
+                        self._condition.wait(wait)
+                    else:
+                        self._condition.wait()
+                if self._stopped:
+                    return
+                events = self._due(False)
+            self._handle(events)
+
+###############################################################################
+# Shared application
+###############################################################################
+
+
+class HTTPError(Exception):
+    """
+    Class **HTTPError** aborts request with given status code.
+    """
+
+    def __init__(self, code, description=''):
+        super().__init__(description)
+        self.code = code
+        self.description = description
+
+
+class LabelordServer:
+    """
+    Class **LabelordServer** holds configuration and webhook processing
+    of Web application.
+
+    Subclasses provide ``logger`` and :meth:`_fan_out`, which writes label
+    change to target repositories. Webhook events are processed by
+    :attr:`webhook_pool` (events from one repository in order) or stored in
+    durable :attr:`job_queue`, bursts are merged by :attr:`coalescer`.
+    """
+
+    def __init__(self, labelord_config, github):
+        """
+        :param: ``labelord_config``: Labelord configuration.
+        :param: ``github``: GitHub client.
+        """
+        self.labelord_config = labelord_config
+        self.config_filename = None
+        self.github = github
+        self._ignores = None
+        self._webhook_pool = None
+        self._state_lock = threading.Lock()
+        self._job_queue = None
+        self._coalescer = None
+        self._delivery_log = None
+        self._webhook_verifier = None
+
+    @property
+    def labelord_config(self):
+        """
+        Labelord configuration.
+
+        Allowed repositories are compiled when configuration is set, both
+        are swapped at once so requests never see mixed state.
+        """
+        return self._config_state[0]
+
+    @labelord_config.setter
+    def labelord_config(self, cfg):
+        repos = frozenset(extract_repos(cfg) if cfg.has_section('repos')
+                          else ())
+        self._config_state = (cfg, repos)
+
+    @property
+    def repos(self):
+        """
+        Allowed repositories.
+
+        :return: Frozen set of repositories.
+        """
+        return self._config_state[1]
+
+    def config_problem(self, cfg=None):
+        """
+        Check configuration.
+
+        :param: ``cfg``: Configuration, current one if *None*.
+        :return: ``(code, message)`` of the first problem or *None*.
+        """
+        cfg = cfg or self.labelord_config
+        for code, message, check in CONFIG_PROBLEMS:
+            if not check(cfg):
+                return code, message
+        return None
+
+    def _read_config(self):
+        return create_config(
+            token=os.getenv('GITHUB_TOKEN', None),
+            config_filename=(self.config_filename or
+                             os.environ.get('LABELORD_CONFIG', None))
+        )
+
+    def hot_reload_config(self):
+        """
+        Reload config file of running application.
+
+        Invalid configuration is logged and the current one is kept. Token
+        given on command line is kept if the file does not contain any.
+
+        :return: *True* if new configuration has been applied.
+        """
+        cfg = self._read_config()
+        if (not cfg.has_option('github', 'token') and
+                self.labelord_config.has_option('github', 'token')):
+            cfg.read_dict({'github': {
+                'token': self.labelord_config.get('github', 'token')
+            }})
+        problem = self.config_problem(cfg)
+        if problem is not None:
+            self.logger.error('Config not reloaded: {}'.format(problem[1]))
+            return False
+        self.labelord_config = cfg
+        self.github.token = cfg.get('github', 'token')
+        self.logger.info('Config reloaded, {} repositories allowed'.format(
+            len(self.repos)
+        ))
+        return True
+
+    def watch_config(self, interval):
+        """
+        Reload config whenever modification time of config file changes.
+
+        :param: ``interval``: Seconds between checks.
+        :return: Started daemon thread.
+        """
+        def mtime():
+            filename = (self.config_filename or
+                        os.environ.get('LABELORD_CONFIG', None) or
+                        DEFAULT_CONFIG_FILE)
+            try:
+                return os.stat(filename).st_mtime_ns
+            except OSError:
+                return None
+
+        def watch():
+            last = mtime()
+            while True:
+                time.sleep(interval)
+                current = mtime()
+                if current != last:
+                    last = current
+                    self.hot_reload_config()
+
+        thread = threading.Thread(target=watch, daemon=True)
+        thread.start()
+        return thread
+
+    @property
+    def webhook_pool(self):
+        """
+        Pool processing accepted webhook events, created on first use.
+
+        Events from one repository are processed in order. Size is read from
+        ``webhook_workers`` and ``webhook_queue_size`` options of
+        ``[server]`` config section.
+        """
+        with self._state_lock:
+            if self._webhook_pool is None:
+                cfg = self.labelord_config
+                self._webhook_pool = WebhookWorkerPool(
+                    self.process_label_webhook,
+                    workers=cfg.getint('server', 'webhook_workers',
+                                       fallback=DEFAULT_WEBHOOK_WORKERS),
+                    queue_size=cfg.getint('server', 'webhook_queue_size',
+                                          fallback=DEFAULT_WEBHOOK_QUEUE_SIZE),
+                    logger=self.logger,
+                    key=lambda data: data['repository']['full_name']
+                )
+            return self._webhook_pool
+
+    @property
+    def fanout_workers(self):
+        """
+        Number of repositories updated concurrently by one event.
+        """
+        return self.labelord_config.getint('server', 'fanout_workers',
+                                           fallback=DEFAULT_FANOUT_WORKERS)
+
+    @property
+    def coalescer(self):
+        """
+        :class:`LabelEventCoalescer` if ``coalesce_window`` option (seconds)
+        of ``[server]`` config section is positive, otherwise *None*.
+        """
+        window = self.labelord_config.getfloat('server', 'coalesce_window',
+                                               fallback=0)
+        if window <= 0:
+            return None
+        with self._state_lock:
+            if self._coalescer is None:
+                self._coalescer = LabelEventCoalescer(
+                    self.propagate_label_event, window, logger=self.logger
+                )
+            self._coalescer.window = window
+            return self._coalescer
+
+    @property
+    def ignores(self):
+        """
+        Store of expected echoes, created on first use from
+        ``ignore_backend`` URL of ``[server]`` config section
+        (see :func:`~labelord.ignores.create_ignore_store`).
+        """
+        with self._state_lock:
+            if self._ignores is None:
+                self._ignores = create_ignore_store(
+                    self.labelord_config.get('server', 'ignore_backend',
+                                             fallback='memory://'),
+                    LabelordChange.CHANGE_TIMEOUT
+                )
+            return self._ignores
+
+    @ignores.setter
+    def ignores(self, store):
+        self._ignores = store
+
+    @property
+    def webhook_verifier(self):
+        """
+        :class:`~labelord.github.WebhookVerifier` for current webhook secret.
+        """
+        secret = self.labelord_config.get('github', 'webhook_secret',
+                                          fallback='')
+        verifier = self._webhook_verifier
+        if verifier is None or verifier.secret != secret:
+            verifier = self._webhook_verifier = WebhookVerifier(secret)
+        return verifier
+
+    @property
+    def max_body_size(self):
+        """
+        The largest accepted webhook body (``max_body_size`` option of
+        ``[server]`` config section, in bytes).
+        """
+        return self.labelord_config.getint('server', 'max_body_size',
+                                           fallback=DEFAULT_MAX_BODY_SIZE)
+
+    @property
+    def max_batch_size(self):
+        """
+        The largest accepted batch of events (``max_batch_size`` option of
+        ``[server]`` config section, in bytes).
+        """
+        return self.labelord_config.getint('server', 'max_batch_size',
+                                           fallback=DEFAULT_MAX_BATCH_SIZE)
+
+    @property
+    def delivery_log(self):
+        """
+        :class:`~labelord.deliveries.DeliveryLog` of accepted webhooks,
+        created on first use.
+
+        Size is read from ``deliveries`` option of ``[server]`` config
+        section, IDs are persisted to file given by ``deliveries_file``.
+        """
+        with self._state_lock:
+            if self._delivery_log is None:
+                cfg = self.labelord_config
+                self._delivery_log = DeliveryLog(
+                    cfg.getint('server', 'deliveries',
+                               fallback=DEFAULT_DELIVERY_LOG_SIZE),
+                    cfg.get('server', 'deliveries_file', fallback=None)
+                )
+            return self._delivery_log
+
+    @property
+    def job_queue(self):
+        """
+        Durable :class:`~labelord.jobs.JobQueue` if ``queue`` option
+        of ``[server]`` config section is set, otherwise *None*.
+        """
+        filename = self.labelord_config.get('server', 'queue', fallback=None)
+        if filename is None:
+            return None
+        with self._state_lock:
+            if self._job_queue is None or self._job_queue.filename != filename:
+                self._job_queue = JobQueue(filename)
+            return self._job_queue
+
+    @property
+    def queue_depth(self):
+        """
+        Number of webhook events waiting for processing.
+        """
+        jobs = self.job_queue
+        if jobs is not None:
+            return jobs.depth()
+        pool = self._webhook_pool
+        return 0 if pool is None else pool.depth
+
+    def check_webhook_event(self, event):
+        """
+        Refuse unsupported event before its body is read.
+
+        :param: ``event``: Value of ``X-GitHub-Event`` header.
+        :raises: :class:`HTTPError` if event is not supported.
+        """
+        if event not in SUPPORTED_EVENTS:
+            raise HTTPError(400, 'Event not supported')
+
+    def accept_webhook(self, event, body, signature, delivery=None):
+        """
+        Accept webhook.
+
+        Wrong signatures are refused before the body is parsed. Label events
+        are queued, they are processed in background. Redelivered events
+        (same ``delivery``) are acknowledged and dropped.
+
+        :param: ``event``: Supported event (see :meth:`check_webhook_event`).
+        :param: ``body``: Request body (``bytes``).
+        :param: ``signature``: Value of signature header.
+        :param: ``delivery``: Value of ``X-GitHub-Delivery`` header.
+        :return: Status code, *202* if event has been queued.
+        :raises: :class:`HTTPError` if webhook is refused.
+        """
+        if not self.webhook_verifier.verify(body, signature):
+            metrics.SIGNATURE_FAILURES.inc()
+            raise HTTPError(401, 'Invalid signature')
+
+        if event == 'ping':
+            self.logger.info('Accepting PING webhook event')
+            return 200
+        try:
+            data = json.loads(body.decode('utf-8'))
+        except ValueError:
+            raise HTTPError(400, 'Invalid JSON')
+        if data['repository']['full_name'] not in self.repos:
+            raise HTTPError(400, 'Repository is not allowed in application')
+        deliveries = self.delivery_log
+        if delivery and deliveries.seen(delivery):
+            self.logger.info(
+                'Ignoring redelivered webhook {}'.format(delivery)
+            )
+            return 200
+        if not self.enqueue_label_webhook(data):
+            if delivery:
+                deliveries.forget(delivery)
+            raise HTTPError(503, 'Webhook queue is full')
+        return 202
+
+    def accept_batch(self, body, signature):
+        """
+        Accept batch of label events (NDJSON, see :func:`read_label_events`).
+
+        Body is signed with webhook secret like a single webhook.
+
+        :param: ``body``: Request body (``bytes``).
+        :param: ``signature``: Value of signature header.
+        :return: Result of :meth:`process_label_batch`.
+        :raises: :class:`HTTPError` if batch is refused.
+        """
+        if not self.webhook_verifier.verify(body, signature):
+            metrics.SIGNATURE_FAILURES.inc()
+            raise HTTPError(401, 'Invalid signature')
+        try:
+            events = read_label_events(body.splitlines())
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+        self.logger.info('Accepting batch of {} events'.format(len(events)))
+        return self.process_label_batch(events)
+
+    def process_label_batch(self, events, wait=False):
+        """
+        Enqueue batch of label webhook events, e.g. replay of missed ones.
+
+        Every event goes through the same allow-list, redelivery check and
+        queue as a single webhook, so it is processed in order with other
+        events of its repository. Events wait up to
+        ``BATCH_ENQUEUE_TIMEOUT`` seconds for place in full queue.
+
+        With ``wait`` (and without durable queue) events are processed by
+        own pool, in order per repository, without coalescing, and events
+        not propagated to some targets are reported as failed too.
+
+        :param: ``events``: List of ``(delivery, data)`` tuples (see :func:`read_label_events`).
+        :param: ``wait``: Return after the events are processed.
+        :return: Dictionary with numbers of ``accepted``, ``skipped`` (not allowed repository) and ``duplicate`` events and list of ``failed`` ones (``index`` in batch, ``delivery`` and ``error``).
+        """
+        result = {'accepted': 0, 'skipped': 0, 'duplicate': 0, 'failed': []}
+        repos = self.repos
+        deliveries = self.delivery_log
+        pool = None
+        not_propagated = []
+        if wait and self.job_queue is None:
+            pool = self._batch_pool(not_propagated)
+        try:
+            for index, (delivery, data) in enumerate(events):
+                if data['repository']['full_name'] not in repos:
+                    result['skipped'] += 1
+                    continue
+                if delivery and deliveries.seen(delivery):
+                    result['duplicate'] += 1
+                    continue
+                try:
+                    if pool is None:
+                        queued = self.enqueue_label_webhook(
+                            data, BATCH_ENQUEUE_TIMEOUT
+                        )
+                    else:
+                        queued = pool.submit((index, delivery, data),
+                                             BATCH_ENQUEUE_TIMEOUT)
+                    error = None if queued else 'Webhook queue is full'
+                except Exception as e:
+                    self.logger.exception(
+                        'Event {} of batch not queued'.format(index)
+                    )
+                    error = str(e) or repr(e)
+                if error is None:
+                    result['accepted'] += 1
+                    continue
+                if delivery:
+                    deliveries.forget(delivery)
+                result['failed'].append({'index': index,
+                                         'delivery': delivery,
+                                         'error': error})
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        for failure in not_propagated:
+            result['accepted'] -= 1
+            if failure['delivery']:
+                deliveries.forget(failure['delivery'])
+        result['failed'] = sorted(result['failed'] + not_propagated,
+                                  key=lambda failure: failure['index'])
+        return result
+
+    def _batch_pool(self, failed):
+        def process(item):
+            index, delivery, data = item
+            try:
+                self.process_job(data)
+            except Exception as e:
+                if not isinstance(e, PropagationError):
+                    self.logger.exception(
+                        'Event {} of batch not processed'.format(index)
+                    )
+                failed.append({'index': index, 'delivery': delivery,
+                               'error': str(e) or repr(e)})
+
+        cfg = self.labelord_config
+        return WebhookWorkerPool(
+            process,
+            workers=cfg.getint('server', 'webhook_workers',
+                               fallback=DEFAULT_WEBHOOK_WORKERS),
+            queue_size=cfg.getint('server', 'webhook_queue_size',
+                                  fallback=DEFAULT_WEBHOOK_QUEUE_SIZE),
+            logger=self.logger,
+            key=lambda item: item[2]['repository']['full_name']
+        )
+
+    def enqueue_label_webhook(self, data, timeout=0):
+        """
+        Hand webhook event over to background processing.
+
+        Events are stored in durable queue for ``labelord worker`` when it is
+        configured, otherwise they are processed by in-process worker pool.
+        Either way events from one repository are processed in order.
+
+        :param: ``data``: Response from GitHub.
+        :param: ``timeout``: Seconds to wait for place in full queue.
+        :return: *False* if event cannot be accepted now.
+        """
+        jobs = self.job_queue
+        if jobs is not None:
+            jobs.put(data, key=data['repository']['full_name'])
+            return True
+        return self.webhook_pool.submit(data, timeout)
+
+    def process_job(self, data):
+        """
+        Process event of durable job queue (see ``labelord worker``).
+
+        Change is propagated right away, without coalescing, so the job is
+        acknowledged only after all writes are done.
+
+        :param: ``data``: Label webhook event.
+        :raises: :class:`PropagationError` if a write failed.
+        """
+        results = self.process_label_webhook(data, coalesce=False)
+        errors = {target: error for target, error in (results or {}).items()
+                  if error is not None}
+        if errors:
+            raise PropagationError(data, errors)
+
+    def process_label_webhook(self, data, coalesce=True):
+        """
+        Process response from Github.
+
+        Change is propagated to all other repositories concurrently,
+        at most ``fanout_workers`` (``[server]`` config section) at once.
+        When coalescing is enabled only net change of the burst is propagated
+        later (see :attr:`coalescer`).
+
+        :param: ``data``: Response from GitHub.
+        :param: ``coalesce``: *False* to propagate right away even when coalescing is enabled.
+        :return: Dictionary with target repositories as keys and :class:`~labelord.github.GitHubError` or *None* as values, *None* if event was not propagated (yet).
+        """
+        action, label, changes, change = label_change(data)
+        repo = data['repository']['full_name']
+        self.logger.info(
+            'Processing LABEL webhook event with action {} from {} '
+            'with label {}'.format(action, repo, label)
+        )
+        if repo not in self.repos:
+            return  # This repo is not being allowed in this app
+        if self.ignores.consume(repo, change.tuple):
+            metrics.ECHOES.inc()
+            return  # This change was initiated by this service
+
+        coalescer = self.coalescer if coalesce else None
+        if coalescer is not None and coalescer.submit(data):
+            return
+        return self.propagate_label_event(data)
+
+    def propagate_label_event(self, data):
+        """
+        Propagate label change to all other allowed repositories.
+
+        :param: ``data``: Label webhook event which is not an echo, retried event (see :class:`PropagationError`) is propagated only to its failed targets.
+        :return: Dictionary with target repositories as keys and :class:`~labelord.github.GitHubError` or *None* as values.
+        """
+        action, label, changes, change = label_change(data)
+        repo = data['repository']['full_name']
+        retry = data.get(RETRY_TARGETS)
+        targets = [r for r in self.repos
+                   if r != repo and (retry is None or r in retry)]
+        if action == 'edited' and is_noop_edit(label, changes):
+            metrics.NOOP_WRITES.inc(amount=len(targets))
+            self.logger.info('Label {} edited in {} without propagated '
+                             'change'.format(label.name, repo))
+            return {}
+        self.ignores.add(targets, change.tuple)
+        return self._fan_out(action, label, changes, repo, targets)
+
+    def _fan_out(self, action, label, changes, repo, targets):
+        """
+        Write label change to target repositories.
+
+        :return: Dictionary with target repositories as keys and :class:`~labelord.github.GitHubError` or *None* as values.
+        """
+        raise NotImplementedError
+
+    def _propagated(self, action, label, repo, target, started, latency,
+                    error):
+        metrics.FANOUT_LATENCY.observe(time.monotonic() - started, action,
+                                       target)
+        if error is None:
+            self.logger.info(
+                'Label {} {} from {} propagated to {} in {:.3f} s'.format(
+                    label.name, action, repo, target, latency
+                )
+            )
+        else:
+            self.logger.warning(
+                'Label {} {} from {} not propagated to {}: {}'.format(
+                    label.name, action, repo, target, error.code_message
+                )
+            )
+
+    def shutdown(self):
+        """
+        Finish processing of accepted webhook events.
+        """
+        if self._webhook_pool is not None:
+            self._webhook_pool.shutdown()
+        if self._coalescer is not None:
+            self._coalescer.shutdown()
+        if self._delivery_log is not None:
+            self._delivery_log.close()
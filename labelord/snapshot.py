@@ -0,0 +1,128 @@
+"""
+This module contains offline snapshots of repository labels.
+"""
+import gzip
+import json
+import time
+
+from .concurrency import bounded_map
+from .github import GitHubError
+from .labels import Label
+
+
+###############################################################################
+# Snapshots
+###############################################################################
+
+
+SNAPSHOT_VERSION = 1
+
+
+class SnapshotError(GitHubError):
+    """
+    Class **SnapshotError** is raised for repositories missing in snapshot.
+
+    It behaves as GitHub *404* error so processors handle it the same way.
+    """
+    def __init__(self, message, status_code=404):
+        super().__init__(status_code, message)
+
+
+class Snapshot:
+    """
+    Class **Snapshot** holds labels of repositories fetched at one moment.
+
+    It provides reading part of :class:`~labelord.github.GitHub` interface
+    so it can replace GitHub client in dry runs.
+    """
+
+    def __init__(self, repos, created=None):
+        """
+        :param: ``repos``: Dictionary with repository slugs as keys and labels dictionaries as values.
+        :param: ``created``: Unix time of snapshot creation.
+        """
+        self.repos = repos
+        self.created = int(time.time()) if created is None else created
+
+    def list_repositories(self):
+        """
+        Get list of repositories in snapshot.
+        """
+        return sorted(self.repos)
+
+    def rate_limit(self):
+        """
+        Snapshot has no rate limit.
+
+        :return: *None*
+        """
+        return None
+
+    def list_labels(self, repository):
+        """
+        Get labels of repository from snapshot.
+
+        :param: ``repository``: Given repository name.
+        :return: Dictionary with tags name as keys and :class:`~labelord.labels.Label` as values.
+        """
+        try:
+            return self.repos[repository]
+        except KeyError:
+            raise SnapshotError(
+                'Repository {} is not in snapshot'.format(repository)
+            ) from None
+
+    @classmethod
+    def fetch(cls, github, slugs, workers=8, on_error=None):
+        """
+        Fetch labels of repositories concurrently.
+
+        :param: ``github``: GitHub object.
+        :param: ``slugs``: Repositories to fetch.
+        :param: ``workers``: Number of concurrent requests.
+        :param: ``on_error``: Callback called with slug and error for failed repositories.
+        :return: New snapshot with repositories fetched successfully.
+        """
+        repos = {}
+        for slug, labels, error in bounded_map(github.list_labels,
+                                               slugs, workers):
+            if error is None:
+                repos[slug] = labels
+            elif on_error is not None:
+                on_error(slug, error)
+        return cls(repos)
+
+    def save(self, filename):
+        """
+        Write snapshot to gzipped JSON file.
+
+        :param: ``filename``: Path to file.
+        """
+        data = {
+            'version': SNAPSHOT_VERSION,
+            'created': self.created,
+            'repos': {
+                slug: [[l.name, l.color, l.description, l.id]
+                       for l in labels.values()]
+                for slug, labels in self.repos.items()
+            },
+        }
+        with gzip.open(filename, 'wt', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Read snapshot from file written by :meth:`save`.
+
+        :param: ``filename``: Path to file.
+        """
+        with gzip.open(filename, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != SNAPSHOT_VERSION:
+            raise ValueError('Unsupported snapshot version')
+        repos = {}
+        for slug, labels in data['repos'].items():
+            labels = (Label(*fields) for fields in labels)
+            repos[slug] = {l.name: l for l in labels}
+        return cls(repos, data['created'])
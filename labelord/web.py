@@ -2,56 +2,36 @@
 This module contains classes and functions for Web application.
 """
 import click
-import configparser
 import flask
-import hashlib
-import hmac
+import functools
 import os
 import sys
 import time
 
-from .helpers import create_config, extract_labels, extract_repos
-from .github import GitHub, GitHubError
-
-NO_WEBHOOK_SECRET_RETURN = 8
-NO_GH_TOKEN_RETURN = 3
-NO_REPOS_SPEC_RETURN = 7
+from .concurrency import completed, KeyedExecutor
+from .github import GitHub, WebhookVerifier
+from .helpers import create_config
+from .ignores import LabelordChange  # noqa: F401 (public name of module)
+from .server import (HTTPError, LabelordServer, DEFAULT_FANOUT_QUEUE_SIZE,
+                     SUPPORTED_EVENTS)
+# Background processing used to live here, keep its public names
+from .server import (LabelEventCoalescer, PropagationError,  # noqa: F401
+                     WebhookWorkerPool, net_label_event, read_label_events)
+from . import metrics
 
 ###############################################################################
 # Flask task
 ###############################################################################
 
 
-class LabelordChange:
-    CHANGE_TIMEOUT = 10
-
-    def __init__(self, action, name, color, new_name=None):
-        self.action = action
-        self.name = name
-        self.color = None if action == 'deleted' else color
-        self.old_name = new_name
-        self.timestamp = int(time.time())
-
-    @property
-    def tuple(self):
-        return self.action, self.name, self.color, self.old_name
-
-    def __eq__(self, other):
-        return self.tuple == other.tuple
-
-    def is_valid(self):
-        return self.timestamp > (int(time.time()) - self.CHANGE_TIMEOUT)
-
-
-class LabelordWeb(flask.Flask):
+class LabelordWeb(LabelordServer, flask.Flask):
     """
     Class **LabelordWeb** represents Flask web application
     """
     def __init__(self, labelord_config, github, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.labelord_config = labelord_config
-        self.github = github
-        self.ignores = {}
+        flask.Flask.__init__(self, *args, **kwargs)
+        LabelordServer.__init__(self, labelord_config, github)
+        self._fanout_executor = None
 
     def inject_session(self, session):
         """
@@ -65,34 +45,56 @@ class LabelordWeb(flask.Flask):
         """
         Reload config file.
         """
-        config_filename = os.environ.get('LABELORD_CONFIG', None)
-        self.labelord_config = create_config(
-            token=os.getenv('GITHUB_TOKEN', None),
-            config_filename=config_filename
-        )
+        self.labelord_config = self._read_config()
         self._check_config()
         self.github.token = self.labelord_config.get('github', 'token')
 
     @property
-    def repos(self):
+    def fanout_executor(self):
         """
-        Extract repositories.
-        
-        :return: List of repositories.
+        :class:`~labelord.concurrency.KeyedExecutor` shared by fan-outs of
+        all events, created on first use.
+
+        Writes to one target repository run in order, different repositories
+        in parallel. When ``fanout_queue_size`` (``[server]`` config section)
+        writes wait for one repository, processing of further events blocks.
         """
-        return extract_repos(flask.current_app.labelord_config)
+        with self._state_lock:
+            if self._fanout_executor is None:
+                workers = self.fanout_workers
+                self.github.set_pool_size(workers)
+                self._fanout_executor = KeyedExecutor(
+                    workers, self.labelord_config.getint(
+                        'server', 'fanout_queue_size',
+                        fallback=DEFAULT_FANOUT_QUEUE_SIZE
+                    )
+                )
+            return self._fanout_executor
+
+    def shutdown(self):
+        """
+        Finish processing of accepted webhook events.
+        """
+        super().shutdown()
+        if self._fanout_executor is not None:
+            self._fanout_executor.shutdown()
 
     def _check_config(self):
-        if not self.labelord_config.has_option('github', 'token'):
-            click.echo('No GitHub token has been provided', err=True)
-            sys.exit(NO_GH_TOKEN_RETURN)
-        if not self.labelord_config.has_section('repos'):
-            click.echo('No repositories specification has been found',
-                       err=True)
-            sys.exit(NO_REPOS_SPEC_RETURN)
-        if not self.labelord_config.has_option('github', 'webhook_secret'):
-            click.echo('No webhook secret has been provided', err=True)
-            sys.exit(NO_WEBHOOK_SECRET_RETURN)
+        problem = self.config_problem()
+        if problem is not None:
+            click.echo(problem[1], err=True)
+            sys.exit(problem[0])
+
+    def _init_routes(self):
+        self.before_first_request(finalize_setup)
+        self.after_request(count_webhook)
+        self.add_url_rule('/', 'index', index, methods=['GET'])
+        self.add_url_rule('/status', 'status', status, methods=['GET'])
+        self.add_url_rule('/metrics', 'metrics_page', metrics_page,
+                          methods=['GET'])
+        self.add_url_rule('/batch', 'batch_accept', batch_accept,
+                          methods=['POST'])
+        self.add_url_rule('/', 'hook_accept', hook_accept, methods=['POST'])
 
     def _init_error_handlers(self):
         from werkzeug.exceptions import default_exceptions
@@ -109,7 +111,7 @@ class LabelordWeb(flask.Flask):
     @staticmethod
     def create_app(config=None, github=None):
         """
-        Create application.
+        Create application with all its routes.
 
         :param: ``config``: congiuration file
         :param: ``github``: GitHub object
@@ -120,7 +122,9 @@ class LabelordWeb(flask.Flask):
         )
         gh = github or GitHub('')  # dummy, but will be checked later
         gh.token = cfg.get('github', 'token', fallback='')
-        return LabelordWeb(cfg, gh, import_name=__name__)
+        app = LabelordWeb(cfg, gh, import_name=__name__)
+        app._init_routes()
+        return app
 
     @staticmethod
     def _error_page(error):
@@ -128,89 +132,72 @@ class LabelordWeb(flask.Flask):
 
     def cleanup_ignores(self):
         """
-        Clenaup ingore repositories.
+        Drop expired changes from ignores.
         """
-        for repo in self.ignores:
-            self.ignores[repo] = [c for c in self.ignores[repo]
-                                  if c.is_valid()]
+        self.ignores.expire()
 
     def process_label_webhook_create(self, label, repo):
         """
         Create label on Github.
 
-        :param: ``label``: Created label.
+        :param: ``label``: Created :class:`~labelord.labels.Label`.
         :param: ``repo``: Given repository.
         """
-        self.github.create_label(repo, label['name'], label['color'])
+        self.github.create_label(repo, label.name, label.hex)
 
     def process_label_webhook_delete(self, label, repo):
         """
         Delete label on Github.
 
-        :param: ``label``: Created label.
+        :param: ``label``: Deleted :class:`~labelord.labels.Label`.
         :param: ``repo``: Given repository.
         """
-        self.github.delete_label(repo, label['name'])
+        self.github.delete_label(repo, label.name)
 
     def process_label_webhook_edit(self, label, repo, changes):
         """
         Update label on Github.
 
-        :param: ``label``: Created label.
+        :param: ``label``: Edited :class:`~labelord.labels.Label`.
         :param: ``repo``: Given repository.
         :param: ``changes``: Desired changes.
         """
-        name = old_name = label['name']
-        color = label['color']
+        name = old_name = label.name
+        color = label.hex
         if 'name' in changes:
             old_name = changes['name']['from']
         self.github.update_label(repo, name, color, old_name)
 
-    def process_label_webhook(self, data):
-        """
-        Process response from Github.
+    def _propagate(self, action, label, changes, target):
+        started = time.monotonic()
+        result = 'error'
+        try:
+            if action == 'created':
+                self.process_label_webhook_create(label, target)
+            elif action == 'deleted':
+                self.process_label_webhook_delete(label, target)
+            elif action == 'edited':
+                self.process_label_webhook_edit(label, target, changes)
+            result = 'ok'
+        finally:
+            latency = time.monotonic() - started
+            metrics.PROPAGATION_LATENCY.observe(latency, action, result)
+        return latency
+
+    def _fan_out(self, action, label, changes, repo, targets):
+        started = time.monotonic()
+        results = {}
+        propagate = functools.partial(self._propagate, action, label, changes)
+        executor = self.fanout_executor
+        futures = {executor.submit(target, propagate, target): target
+                   for target in targets}
+        for target, latency, error in completed(futures):
+            results[target] = error
+            self._propagated(action, label, repo, target, started, latency,
+                             error)
+        return results
 
-        :param: ``data``: Response from GitHub.
-        """
-        self.cleanup_ignores()
-        action = data['action']
-        label = data['label']
-        repo = data['repository']['full_name']
-        flask.current_app.logger.info(
-            'Processing LABEL webhook event with action {} from {} '
-            'with label {}'.format(action, repo, label)
-        )
-        if repo not in self.repos:
-            return  # This repo is not being allowed in this app
-
-        change = LabelordChange(action, label['name'], label['color'])
-        if action == 'edited' and 'name' in data['changes']:
-            change.new_name = label['name']
-            change.name = data['changes']['name']['from']
-
-        if repo in self.ignores and change in self.ignores[repo]:
-            self.ignores[repo].remove(change)
-            return  # This change was initiated by this service
-        for r in self.repos:
-            if r == repo:
-                continue
-            if r not in self.ignores:
-                self.ignores[r] = []
-            self.ignores[r].append(change)
-            try:
-                if action == 'created':
-                    self.process_label_webhook_create(label, r)
-                elif action == 'deleted':
-                    self.process_label_webhook_delete(label, r)
-                elif action == 'edited':
-                    self.process_label_webhook_edit(label, r, data['changes'])
-            except GitHubError:
-                pass  # Ignore GitHub errors
 
-app = LabelordWeb.create_app()
-
-
-@app.before_first_request
 def finalize_setup():
     """
     Setup finalization.
@@ -218,37 +205,95 @@ def finalize_setup():
     flask.current_app.finish_setup()
 
 
-@app.route('/', methods=['GET'])
 def index():
     """
     Index action.
     """
-    repos = flask.current_app.repos
+    repos = sorted(flask.current_app.repos)
     return flask.render_template('index.html', repos=repos)
 
 
-@app.route('/', methods=['POST'])
+def status():
+    """
+    Status of background webhook processing.
+    """
+    return flask.jsonify(queue_depth=flask.current_app.queue_depth)
+
+
+def metrics_page():
+    """
+    Metrics in Prometheus text format.
+    """
+    current_app = flask.current_app
+    metrics.IGNORES.set(len(current_app.ignores))
+    metrics.QUEUE_DEPTH.set(current_app.queue_depth)
+    return flask.Response(metrics.REGISTRY.render(),
+                          content_type='text/plain; version=0.0.4')
+
+
+def count_webhook(response):
+    """
+    Count webhook deliveries by event and response status.
+    """
+    if flask.request.method == 'POST' and flask.request.path == '/':
+        event = flask.request.headers.get('X-GitHub-Event', '')
+        metrics.WEBHOOKS.inc(event if event in SUPPORTED_EVENTS else 'other',
+                             response.status_code)
+    return response
+
+
+def _read_body(limit):
+    request = flask.request
+    if request.content_length is not None and request.content_length > limit:
+        flask.abort(413)
+    body = request.stream.read(limit + 1)
+    if len(body) > limit:
+        flask.abort(413)
+    return body
+
+
+def batch_accept():
+    """
+    Accept batch of label events (NDJSON, see
+    :func:`~labelord.server.read_label_events`).
+
+    Body is signed with webhook secret like a single webhook. Events are
+    queued like webhooks (see :meth:`LabelordWeb.process_label_batch`),
+    *202 Accepted* reports their numbers and the events which failed.
+    """
+    current_app = flask.current_app
+    body = _read_body(current_app.max_batch_size)
+    try:
+        result = current_app.accept_batch(
+            body, WebhookVerifier.signature(flask.request.headers)
+        )
+    except HTTPError as e:
+        flask.abort(e.code, e.description)
+    return flask.jsonify(result), 202
+
+
 def hook_accept():
     """
     Accept hook.
+
+    Unsupported events, oversized bodies and wrong signatures are refused
+    before the body is parsed. Label events are queued, they are processed
+    in background and *202 Accepted* is returned right away. Redelivered
+    events (same ``X-GitHub-Delivery``) are acknowledged and dropped.
     """
+    current_app = flask.current_app
     headers = flask.request.headers
-    signature = headers.get('X-Hub-Signature', '')
     event = headers.get('X-GitHub-Event', '')
-    data = flask.request.get_json()
-
-    if not flask.current_app.github.webhook_verify_signature(
-            flask.request.data, signature,
-            flask.current_app.labelord_config.get('github', 'webhook_secret')
-    ):
-        flask.abort(401)
-
-    if event == 'label':
-        if data['repository']['full_name'] not in flask.current_app.repos:
-            flask.abort(400, 'Repository is not allowed in application')
-        flask.current_app.process_label_webhook(data)
-        return ''
-    if event == 'ping':
-        flask.current_app.logger.info('Accepting PING webhook event')
-        return ''
-    flask.abort(400, 'Event not supported')
+    try:
+        current_app.check_webhook_event(event)
+        body = _read_body(current_app.max_body_size)
+        status_code = current_app.accept_webhook(
+            event, body, WebhookVerifier.signature(headers),
+            headers.get('X-GitHub-Delivery')
+        )
+    except HTTPError as e:
+        flask.abort(e.code, e.description)
+    return '', status_code
+
+
+app = LabelordWeb.create_app()
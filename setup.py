@@ -14,8 +14,10 @@ setup(
     license='GNU GPLv3',
     url='https://github.com/jakubjancicka/labelord',
     packages=['labelord'],
+    python_requires='>=3.7',
     package_data={'labelord': ['templates/*.html', 'static/*.css', 'config.cfg.sample']},
     install_requires=['flask', 'click', 'requests', 'configparser', 'werkzeug'],
+    extras_require={'asgi': ['httpx', 'uvicorn']},
     setup_requires=['pytest-runner'],
     tests_require=['pytest', 'betamax', 'flexmock'],   
     entry_points={
@@ -36,7 +38,7 @@ setup(
         'Natural Language :: English',
         'Programming Language :: Python',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.5',
+        'Programming Language :: Python :: 3.7',
         'Topic :: Utilities',
         ],
     zip_safe=False,
@@ -0,0 +1,263 @@
+"""
+Local fake of GitHub API used by tests and benchmarks.
+
+It implements only endpoints which labelord uses, keeps labels in memory
+and optionally sleeps before every reply to simulate network latency.
+"""
+import configparser
+import hashlib
+import hmac
+import json
+import math
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from labelord.github import GitHub
+
+
+PER_PAGE = 100
+SECRET = 'benchmark-secret'
+
+
+class FakeGitHubState:
+    """
+    Labels of all fake repositories and counters of served calls.
+    """
+
+    def __init__(self, repos=None):
+        self.lock = threading.Lock()
+        self.repos = {}
+        self.reads = 0
+        self.writes = 0
+        self.not_modified = 0
+        self.failing = set()
+        self._next_id = 1
+        for slug, labels in (repos or {}).items():
+            self.set_labels(slug, labels)
+
+    def set_labels(self, slug, labels):
+        """
+        Replace labels of repository ``slug`` with ``{name: color}``.
+        """
+        with self.lock:
+            self.repos[slug] = {}
+            for name, color in labels.items():
+                self._add(slug, name, color)
+
+    def _add(self, slug, name, color, description=None):
+        self.repos[slug][name.lower()] = {
+            'id': self._next_id, 'name': name, 'color': color,
+            'description': description, 'default': False,
+        }
+        self._next_id += 1
+
+    def fail_writes(self, *slugs):
+        """
+        Answer writes to repositories ``slugs`` with *502 Bad Gateway*.
+        """
+        with self.lock:
+            self.failing = set(slugs)
+
+    def reset_counters(self):
+        with self.lock:
+            self.reads = self.writes = self.not_modified = 0
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def _body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            data = b''.join(chunks)
+        else:
+            data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        return json.loads(data.decode() or '{}')
+
+    def _reply(self, code, data=None, headers=None):
+        body = b'' if data is None else json.dumps(data).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _page(self, items):
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        page = int(query.get('page', ['1'])[0])
+        per_page = int(query.get('per_page', [str(PER_PAGE)])[0])
+        pages = max(1, math.ceil(len(items) / per_page))
+        headers = {}
+        if page < pages:
+            headers['Link'] = '<{}{}?per_page={}&page={}>; rel="next"'.format(
+                self.server.url, url.path, per_page, page + 1
+            )
+        return items[(page - 1) * per_page:page * per_page], headers
+
+    def _route(self):
+        self.server.delay()
+        path = urllib.parse.urlsplit(self.path).path
+        parts = [urllib.parse.unquote(p) for p in path.strip('/').split('/')]
+        slug = '/'.join(parts[1:3]) if parts[0] == 'repos' else None
+        return parts, slug
+
+    def do_GET(self):
+        parts, slug = self._route()
+        with self.state.lock:
+            if parts == ['rate_limit']:
+                # Like on GitHub, asking for rate limit is not counted
+                return self._reply(200, {'resources': {'core': {
+                    'limit': 5000, 'remaining': 5000 - self.state.reads,
+                    'reset': int(time.time()) + 3600}}})
+            self.state.reads += 1
+            if parts == ['user', 'repos']:
+                items = [{'full_name': s} for s in sorted(self.state.repos)]
+            elif slug in self.state.repos and parts[3:] == ['labels']:
+                items = list(self.state.repos[slug].values())
+            else:
+                return self._reply(404, {'message': 'Not Found'})
+        page, headers = self._page(items)
+        etag = '"{}"'.format(hashlib.sha1(
+            json.dumps(page, sort_keys=True).encode()
+        ).hexdigest())
+        headers['ETag'] = etag
+        if self.headers.get('If-None-Match') == etag:
+            with self.state.lock:
+                self.state.reads -= 1
+                self.state.not_modified += 1
+            return self._reply(304, headers=headers)
+        self._reply(200, page, headers)
+
+    def do_POST(self):
+        parts, slug = self._route()
+        data = self._body()
+        with self.state.lock:
+            self.state.writes += 1
+            if slug in self.state.failing:
+                return self._reply(502, {'message': 'Server Error'})
+            if slug not in self.state.repos:
+                return self._reply(404, {'message': 'Not Found'})
+            labels = self.state.repos[slug]
+            if data['name'].lower() in labels:
+                return self._reply(422, {'message': 'Validation Failed'})
+            self.state._add(slug, data['name'], data['color'],
+                            data.get('description'))
+            self._reply(201, labels[data['name'].lower()])
+
+    def do_PATCH(self):
+        parts, slug = self._route()
+        data = self._body()
+        with self.state.lock:
+            self.state.writes += 1
+            if slug in self.state.failing:
+                return self._reply(502, {'message': 'Server Error'})
+            labels = self.state.repos.get(slug, {})
+            label = labels.pop(parts[-1].lower(), None)
+            if label is None:
+                return self._reply(404, {'message': 'Not Found'})
+            label.update(data)
+            labels[label['name'].lower()] = label
+            self._reply(200, label)
+
+    def do_DELETE(self):
+        parts, slug = self._route()
+        with self.state.lock:
+            self.state.writes += 1
+            if slug in self.state.failing:
+                return self._reply(502, {'message': 'Server Error'})
+            labels = self.state.repos.get(slug, {})
+            if labels.pop(parts[-1].lower(), None) is None:
+                return self._reply(404, {'message': 'Not Found'})
+            self._reply(204)
+
+
+class FakeGitHubServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server with fake GitHub API running in background thread.
+
+    :param: ``repos``: Initial labels as ``{slug: {name: color}}``.
+    :param: ``latency``: Seconds to sleep before every reply.
+    """
+    daemon_threads = True
+
+    def __init__(self, repos=None, latency=0.0):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.state = FakeGitHubState(repos)
+        self.latency = latency
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://{}:{}'.format(*self.server_address)
+
+    def delay(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def client(self, token='<TOKEN>', session=None):
+        """
+        Create :class:`~labelord.github.GitHub` talking to this server.
+        """
+        github = GitHub(token, session)
+        github.GH_API_ENDPOINT = self.url
+        return github
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+def make_config(repos, secret=SECRET):
+    cfg = configparser.ConfigParser()
+    cfg.optionxform = str
+    cfg.read_dict({
+        'github': {'token': '<TOKEN>', 'webhook_secret': secret},
+        'repos': {slug: 'on' for slug in repos},
+    })
+    return cfg
+
+
+def sign(body, secret=SECRET):
+    digest = hmac.new(secret.encode(), body, hashlib.sha1).hexdigest()
+    return 'sha1=' + digest
+
+
+def label_payload(action, repo, name, color='ff0000', changes=None):
+    data = {
+        'action': action,
+        'label': {'name': name, 'color': color},
+        'repository': {'full_name': repo},
+    }
+    if changes is not None:
+        data['changes'] = changes
+    return json.dumps(data).encode()
+
+
+def headers(body, event='label'):
+    return {'X-Hub-Signature': sign(body), 'X-GitHub-Event': event,
+            'Content-Type': 'application/json'}
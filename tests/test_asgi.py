@@ -0,0 +1,246 @@
+import asyncio
+import json
+import pytest
+from labelord import helpers
+from labelord.asgi import AsyncGitHub, LabelordASGI
+from labelord.github import GitHub, GitHubError
+from fakegithub import label_payload, headers, SECRET
+from fakegithub import FakeGitHubServer
+
+
+class RecordingAsyncGitHub:
+    def __init__(self):
+        self.calls = []
+        self.token = ''
+
+    async def create_label(self, repo, name, color, **kwargs):
+        await asyncio.sleep(0)
+        self.calls.append(('create', repo, name, color))
+
+    async def update_label(self, repo, name, color, old_name=None, **kwargs):
+        self.calls.append(('update', repo, name, color, old_name))
+
+    async def delete_label(self, repo, name, **kwargs):
+        self.calls.append(('delete', repo, name))
+
+    async def aclose(self):
+        pass
+
+    webhook_verify_signature = staticmethod(GitHub.webhook_verify_signature)
+
+
+@pytest.fixture
+def asgi(utils):
+    cfg = helpers.create_config(utils.config('repos'))
+    cfg['github']['webhook_secret'] = SECRET
+    return LabelordASGI.create_app(cfg, RecordingAsyncGitHub())
+
+
+async def call_app(app, method, path, body=b'', headers=None):
+    scope = {'type': 'http', 'method': method, 'path': path,
+             'headers': [(k.lower().encode(), v.encode())
+                         for k, v in (headers or {}).items()]}
+    messages = [{'type': 'http.request', 'body': body[:10],
+                 'more_body': True},
+                {'type': 'http.request', 'body': body[10:]}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return sent[0]['status'], sent[1]['body']
+
+
+def request(app, method, path, body=b'', headers=None):
+    async def call():
+        response = await call_app(app, method, path, body, headers)
+        await app.join()
+        return response
+
+    return asyncio.run(call())
+
+
+def post(app, body, event='label'):
+    return request(app, 'POST', '/', body, headers(body, event))
+
+
+def test_index(asgi):
+    status, body = request(asgi, 'GET', '/', headers={'Host': 'example.com'})
+    assert status == 200
+    assert b'user/repo3' in body
+    assert b'http://example.com/' in body
+
+
+def test_label_webhook(asgi):
+    status, _ = post(asgi, label_payload('created', 'user/repo', 'bug'))
+    assert status == 202
+    assert sorted(asgi.github.calls) == [
+        ('create', 'user/repo3', 'bug', 'ff0000'),
+        ('create', 'user2/repo', 'bug', 'ff0000'),
+    ]
+    status, _ = post(asgi, label_payload('created', 'user/repo3', 'bug'))
+    assert status == 202
+    assert len(asgi.github.calls) == 2
+
+
+@pytest.mark.parametrize(
+    ['body', 'event', 'headers', 'expected'],
+    [(label_payload('created', 'user/repo2', 'bug'), 'label', {}, 400),
+     (label_payload('created', 'user/repo', 'bug'), 'push', {}, 400),
+     (b'{}', 'ping', {}, 200),
+     (b'{}', 'ping', {'X-Hub-Signature': 'sha1=0'}, 401)],
+)
+def test_hook_accept_responses(asgi, body, event, headers, expected):
+    from fakegithub import headers as signed
+    status, _ = request(asgi, 'POST', '/', body,
+                        dict(signed(body, event), **headers))
+    assert status == expected
+    assert asgi.github.calls == []
+
+
+def test_not_found(asgi):
+    assert request(asgi, 'GET', '/nothing')[0] == 404
+    assert request(asgi, 'GET', '/static/../asgi.py')[0] == 404
+    assert request(asgi, 'GET', '/static/style.css')[0] == 200
+
+
+def test_process_label_webhook_rename(asgi):
+    post(asgi, label_payload('edited', 'user/repo', 'defect', '00ff00',
+                             {'name': {'from': 'bug'}}))
+    assert sorted(asgi.github.calls) == [
+        ('update', 'user/repo3', 'defect', '00ff00', 'bug'),
+        ('update', 'user2/repo', 'defect', '00ff00', 'bug'),
+    ]
+
+
+def test_process_label_webhook_needs_running_app(asgi):
+    data = json.loads(label_payload('created', 'user/repo', 'bug').decode())
+    with pytest.raises(RuntimeError):
+        asgi.process_label_webhook(data)
+
+
+class BlockingAsyncGitHub(RecordingAsyncGitHub):
+    def __init__(self):
+        super().__init__()
+        self.release = asyncio.Event()
+
+    async def create_label(self, repo, name, color, **kwargs):
+        self.calls.append(('create', repo, name, color))
+        await self.release.wait()
+
+
+def test_fan_out_does_not_hold_worker_thread(asgi):
+    asgi.labelord_config.read_dict({'server': {'webhook_workers': '1'}})
+    asgi.github = BlockingAsyncGitHub()
+
+    async def call():
+        for repo, name in (('user/repo', 'bug'), ('user/repo3', 'ui')):
+            body = label_payload('created', repo, name)
+            assert (await call_app(asgi, 'POST', '/', body,
+                                   headers(body)))[0] == 202
+        await asgi._blocking(asgi.webhook_pool.join)
+        # both events fanned out by the only worker while writes wait,
+        # the second write to user2/repo waits for the first one
+        while len(asgi.github.calls) < 3:
+            await asyncio.sleep(0.01)
+        asgi.github.release.set()
+        await asgi.join()
+
+    asyncio.run(asyncio.wait_for(call(), 5))
+    assert len(asgi.github.calls) == 4
+
+
+def test_lifespan_checks_config(asgi):
+    asgi.labelord_config.remove_option('github', 'webhook_secret')
+    messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi({'type': 'lifespan'}, receive, send))
+    assert sent[0] == {'type': 'lifespan.startup.failed',
+                       'message': 'No webhook secret has been provided'}
+
+
+def test_async_github_fake_server():
+    pytest.importorskip('httpx')
+    with FakeGitHubServer({'user/a': {'bug': 'ff0000'}}) as server:
+        github = AsyncGitHub('<TOKEN>')
+        github.GH_API_ENDPOINT = server.url
+
+        async def write():
+            await github.create_label('user/a', 'new', '00ff00')
+            await github.update_label('user/a', 'defect', '0000ff', 'bug')
+            with pytest.raises(GitHubError) as error:
+                await github.delete_label('user/a', 'missing')
+            await github.aclose()
+            return error.value
+
+        error = asyncio.run(write())
+        assert error.status_code == 404
+        labels = server.state.repos['user/a']
+        assert labels['new']['color'] == '00ff00'
+        assert labels['defect']['color'] == '0000ff'
+
+
+def test_hook_accept_body_limit(asgi):
+    asgi.labelord_config.read_dict({'server': {'max_body_size': '16'}})
+    body = label_payload('created', 'user/repo', 'bug')
+    with_length = dict(headers(body), **{'Content-Length': str(len(body))})
+    assert request(asgi, 'POST', '/', body, with_length)[0] == 413
+    assert post(asgi, body)[0] == 413
+    assert asgi.github.calls == []
+
+
+def test_metrics(asgi):
+    from labelord import metrics
+    metrics.REGISTRY.clear()
+    post(asgi, label_payload('created', 'user/repo', 'bug'))
+    status, body = request(asgi, 'GET', '/metrics')
+    assert status == 200
+    assert (b'labelord_webhooks_total{event="label",status="202"} 1'
+            in body)
+    assert metrics.PROPAGATION_LATENCY.count('created', 'ok') == 2
+    assert metrics.FANOUT_LATENCY.count('created', 'user2/repo') == 1
+    metrics.REGISTRY.clear()
+
+
+def test_batch(asgi):
+    from labelord.github import WebhookVerifier
+    events = [json.loads(label_payload('created', 'user/repo', name))
+              for name in ('bug', 'ui')]
+    events.append(json.loads(label_payload('created', 'user/repo2', 'x')))
+    body = b''.join(json.dumps(e).encode() + b'\n' for e in events)
+    status, response = request(asgi, 'POST', '/batch', body, {
+        'X-Hub-Signature-256': WebhookVerifier(SECRET).sign(body)
+    })
+    assert status == 202
+    assert json.loads(response.decode()) == {
+        'accepted': 2, 'skipped': 1, 'duplicate': 0, 'failed': []
+    }
+    for target in ('user/repo3', 'user2/repo'):
+        assert [call[2] for call in asgi.github.calls
+                if call[1] == target] == ['bug', 'ui']
+    assert request(asgi, 'POST', '/batch', body,
+                   {'X-Hub-Signature-256': 'sha256=0'})[0] == 401
+
+
+def test_coalesce(asgi):
+    asgi.labelord_config.read_dict({'server': {'coalesce_window': '60'}})
+    post(asgi, label_payload('created', 'user/repo', 'bug'))
+    post(asgi, label_payload('edited', 'user/repo', 'bug', '00ff00',
+                             {'color': {'from': 'ff0000'}}))
+    assert asgi.github.calls == []
+    asyncio.run(asgi.shutdown())
+    assert sorted(asgi.github.calls) == [
+        ('create', 'user/repo3', 'bug', '00ff00'),
+        ('create', 'user2/repo', 'bug', '00ff00'),
+    ]
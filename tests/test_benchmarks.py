@@ -0,0 +1,50 @@
+import pytest
+from benchmarks.runner import run_benchmarks, compare
+
+
+def test_benchmarks_quick():
+    from labelord.web import app
+    state = (app.labelord_config, app.github)
+    results = run_benchmarks(quick=True)
+    assert (app.labelord_config, app.github) == state
+    assert results['meta']['quick'] is True
+    assert 'runmodes.update' in results['benchmarks']
+    assert 'sync.replace' in results['benchmarks']
+    sync = results['benchmarks']['sync.replace']
+    assert sync['extra']['github_writes'] > 0
+    assert sync['median'] > 0
+
+
+def test_benchmarks_compare():
+    base = {'benchmarks': {'a': {'median': 1.0}, 'b': {'median': 1.0}}}
+    current = {'benchmarks': {'a': {'median': 1.1}, 'b': {'median': 2.0},
+                              'c': {'median': 1.0}}}
+    rows = compare(base, current, threshold=0.25)
+    assert [(r[0], r[-1]) for r in rows] == [('a', False), ('b', True)]
+
+
+@pytest.mark.parametrize('http', [False, True])
+def test_loadtest(http):
+    from benchmarks.loadtest import generate_events, load_test
+    events = generate_events(12, ['user/repo0', 'user/repo1'], ping_ratio=0.25)
+    assert sum(1 for event, _ in events if event == 'ping') == 3
+    results = load_test(events, repos=3, rate=500 if http else None,
+                        concurrency=2, http=http)
+    assert results['deliveries'] == 12
+    assert results['statuses'] == {'200': 3, '202': 9}
+    assert results['github_writes'] == 9 * 2
+    assert results['latency']['p50'] <= results['latency']['p99']
+    assert results['queue_depth']['max'] is not None
+
+
+def test_loadtest_recorded_payloads():
+    from benchmarks.loadtest import load_events, percentile
+    events = load_events([
+        '{"zen": "Keep it logically awesome."}',
+        '',
+        '{"event": "label", "payload": {"action": "created"}}',
+        '{"action": "deleted", "label": {"name": "bug"}}',
+    ])
+    assert [event for event, _ in events] == ['ping', 'label', 'label']
+    assert percentile([1, 2, 3, 4], 0.5) == 2
+    assert percentile([1, 2, 3, 4], 0.99) == 4
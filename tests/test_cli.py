@@ -1,7 +1,11 @@
+import json
+import threading
 import pytest
 import flexmock
-from labelord import cli
+from labelord import cli, github
+from labelord.cli import DryRunProcessor
 from click.testing import CliRunner
+from fakegithub import FakeGitHubServer
 
 def test_help():
     runner = CliRunner()
@@ -10,3 +14,219 @@ def test_help():
     assert 'list_labels' in result.output
     assert 'list_repos' in result.output
     assert 'run' in result.output
+
+
+@pytest.fixture
+def fake_github(monkeypatch):
+    server = FakeGitHubServer({
+        'user/repo': {'bug': 'EE0701', 'wontfix': 'ffffff'},
+        'user/repo2': {'Test': 'ff0000'},
+    })
+    with server:
+        monkeypatch.setattr(github.GitHub, 'GH_API_ENDPOINT', server.url)
+        yield server
+
+
+def test_list_labels_single(fake_github):
+    runner = CliRunner()
+    result = runner.invoke(cli, ['-t', 'token', 'list_labels', 'user/repo'],
+                           obj={})
+    assert result.exit_code == 0
+    assert result.output == '#ee0701 bug\n#ffffff wontfix\n'
+
+
+def test_list_labels_many(fake_github):
+    runner = CliRunner()
+    result = runner.invoke(cli, ['-t', 'token', 'list_labels', '-w', '2',
+                                 'user/repo', 'user/repo2', 'user/nope'],
+                           obj={})
+    assert result.exit_code == 5
+    lines = sorted(result.output.splitlines())
+    assert lines == ['user/nope: GitHub: ERROR 404 - Not Found',
+                     'user/repo #ee0701 bug', 'user/repo #ffffff wontfix',
+                     'user/repo2 #ff0000 Test']
+
+
+def test_list_labels_all_repos_jsonl(fake_github):
+    runner = CliRunner()
+    result = runner.invoke(cli, ['-t', 'token', 'list_labels', '-a',
+                                 '-o', 'jsonl'], obj={})
+    assert result.exit_code == 0
+    records = {r['repo']: r for r in map(json.loads,
+                                         result.output.splitlines())}
+    assert sorted(records) == ['user/repo', 'user/repo2']
+    assert records['user/repo2']['labels'] == [
+        {'name': 'Test', 'color': 'ff0000', 'description': None, 'id': 3}
+    ]
+
+
+def test_list_labels_no_repository():
+    runner = CliRunner()
+    result = runner.invoke(cli, ['-t', 'token', 'list_labels'], obj={})
+    assert result.exit_code == 2
+
+
+def test_replay(fake_github, tmpdir):
+    config = tmpdir.join('config.cfg')
+    config.write('[github]\ntoken = token\n'
+                 '[repos]\nuser/repo = on\nuser/repo2 = on\n')
+    events = tmpdir.join('events.ndjson')
+    events.write('\n'.join(json.dumps(e) for e in [
+        {'action': 'created', 'label': {'name': 'new', 'color': 'abcdef'},
+         'repository': {'full_name': 'user/repo'}},
+        {'action': 'deleted', 'label': {'name': 'bug', 'color': 'ee0701'},
+         'repository': {'full_name': 'user/repo2'}},
+        {'action': 'created', 'label': {'name': 'x', 'color': 'abcdef'},
+         'repository': {'full_name': 'user/other'}},
+    ]))
+    runner = CliRunner()
+    result = runner.invoke(cli, ['-c', str(config), 'replay', str(events)],
+                           obj={})
+    assert result.exit_code == 0, result.output
+    assert '2 accepted, 1 skipped, 0 duplicate, 0 failed' in result.output
+    repos = fake_github.state.repos
+    assert sorted(repos['user/repo2']) == ['new', 'test']
+    assert sorted(repos['user/repo']) == ['wontfix']
+
+
+def test_replay_failed_writes(fake_github, tmpdir):
+    fake_github.state.fail_writes('user/repo2')
+    config = tmpdir.join('config.cfg')
+    config.write('[github]\ntoken = token\n'
+                 '[repos]\nuser/repo = on\nuser/repo2 = on\n')
+    events = tmpdir.join('events.ndjson')
+    events.write('\n'.join(json.dumps(e) for e in [
+        {'action': 'created', 'label': {'name': 'new', 'color': 'abcdef'},
+         'repository': {'full_name': 'user/repo'}},
+        {'action': 'deleted', 'label': {'name': 'bug', 'color': 'ee0701'},
+         'repository': {'full_name': 'user/repo2'}},
+    ]))
+    runner = CliRunner()
+    result = runner.invoke(cli, ['-c', str(config), 'replay', str(events)],
+                           obj={})
+    assert result.exit_code == 10, result.output
+    assert '1 accepted, 0 skipped, 0 duplicate, 1 failed' in result.output
+    assert 'Event 0 (no delivery) failed: Not propagated to user/repo2' \
+        in result.output
+    assert sorted(fake_github.state.repos['user/repo']) == ['wontfix']
+
+
+def test_run_label_profiles(fake_github, tmpdir):
+    fake_github.state.set_labels('user/tpl', {'tpl': '123456'})
+    config = tmpdir.join('config.cfg')
+    config.write('[github]\ntoken = token\n'
+                 '[repos]\nuser/repo = on\nuser/repo2 = on\n'
+                 '[profile:one]\nOne = 111111\n'
+                 '[profile:two]\ntemplate-repo = user/tpl\n'
+                 '[profiles]\nuser/repo = one\nuser/repo* = two\n')
+    runner = CliRunner()
+    result = runner.invoke(cli, ['-c', str(config), 'run', 'replace'],
+                           obj={})
+    assert result.exit_code == 0, result.output
+    repos = fake_github.state.repos
+    assert [l['name'] for l in repos['user/repo'].values()] == ['One']
+    assert [l['name'] for l in repos['user/repo2'].values()] == ['tpl']
+
+
+def test_run_invalid_labels_spec(fake_github, tmpdir):
+    config = tmpdir.join('config.cfg')
+    config.write('[github]\ntoken = token\n'
+                 '[repos]\nuser/repo = on\n'
+                 '[labels]\nbug = red\n')
+    runner = CliRunner()
+    result = runner.invoke(cli, ['-c', str(config), 'run', 'update'], obj={})
+    assert result.exit_code == 9
+    assert result.output == 'Invalid color red of label bug\n'
+    assert fake_github.state.writes == 0
+
+
+def test_run_skips_noop_writes(fake_github, tmpdir):
+    config = tmpdir.join('config.cfg')
+    config.write('[github]\ntoken = token\n'
+                 '[repos]\nuser/repo = on\nuser/repo2 = on\n'
+                 '[labels]\nbug = #EE0701\n')
+    runner = CliRunner()
+    result = runner.invoke(cli, ['-c', str(config), 'run', 'update'], obj={})
+    assert result.exit_code == 0, result.output
+    assert result.output == ('SUMMARY: 2 repo(s) updated successfully, '
+                             '1 no-op write(s) skipped\n')
+    assert fake_github.state.writes == 1
+
+
+def test_run_in_sync_labels_not_counted(fake_github, tmpdir):
+    config = tmpdir.join('config.cfg')
+    config.write('[github]\ntoken = token\n'
+                 '[repos]\nuser/repo = on\n'
+                 '[labels]\nbug = ee0701\nwontfix = ffffff\n')
+    fake_github.state.set_labels('user/repo', {'bug': 'ee0701',
+                                               'wontfix': 'ffffff'})
+    runner = CliRunner()
+    result = runner.invoke(cli, ['-c', str(config), 'run', 'update'], obj={})
+    assert result.exit_code == 0, result.output
+    assert result.output == 'SUMMARY: 1 repo(s) updated successfully\n'
+    assert fake_github.state.writes == 0
+
+
+def test_run_estimate(fake_github, tmpdir):
+    config = tmpdir.join('config.cfg')
+    config.write('[github]\ntoken = token\n'
+                 '[repos]\nuser/repo = on\nuser/repo2 = on\n'
+                 '[labels]\nbug = #EE0701\nNew = #000000\n')
+    runner = CliRunner()
+    result = runner.invoke(cli, ['-c', str(config), 'run', 'replace',
+                                 '--estimate', '-m', '2'], obj={})
+    assert result.exit_code == 0, result.output
+    lines = result.output.splitlines()
+    assert lines[:3] == [
+        'ESTIMATE user/repo: 1 read(s), 2 write(s)',
+        'ESTIMATE user/repo2: 1 read(s), 3 write(s)',
+        'ESTIMATE total: 2 read(s), 5 write(s), 7 call(s)',
+    ]
+    assert lines[3].endswith(' s at concurrency 2')
+    assert lines[4].startswith('ESTIMATE budget: 4998 of 5000 remaining')
+    assert fake_github.state.writes == 0
+
+
+def test_run_estimate_threaded_output(fake_github, tmpdir):
+    config = tmpdir.join('config.cfg')
+    config.write('[github]\ntoken = token\n'
+                 '[repos]\nuser/repo = on\n'
+                 '[labels]\nbug = #EE0701\n')
+    runner = CliRunner()
+    result = runner.invoke(cli, ['-c', str(config), 'run', 'update',
+                                 '--estimate', '-o', 'jsonl',
+                                 '--threaded-output'], obj={})
+    assert result.exit_code == 0, result.output
+    assert not [t for t in threading.enumerate()  # printer's writer
+                if t.name.endswith('(_consume)')]
+
+
+def test_run_estimate_over_budget(fake_github, tmpdir):
+    fake_github.state.reads = 4997
+    config = tmpdir.join('config.cfg')
+    config.write('[github]\ntoken = token\n'
+                 '[labels]\nNew = #000000\n')
+    runner = CliRunner()
+    result = runner.invoke(cli, ['-c', str(config), 'run', '-a', '-e'],
+                           obj={})
+    assert result.exit_code == 13
+    assert 'ESTIMATE repository list: 1 read(s)' in result.output
+    assert 'ESTIMATE total: 3 read(s), 2 write(s), 5 call(s)' in result.output
+    assert 'exceed remaining GitHub rate limit' in result.output
+    assert fake_github.state.writes == 0
+
+
+def test_run_jsonl_written_when_aborted(fake_github, tmpdir, monkeypatch):
+    def aborting_run(self, specs, mode):
+        self._event('ADD', 'DRY', 'user/repo', 'new', '000000')
+        raise RuntimeError('aborted')
+
+    monkeypatch.setattr(DryRunProcessor, 'run_specs', aborting_run)
+    config = tmpdir.join('config.cfg')
+    config.write('[github]\ntoken = token\n'
+                 '[repos]\nuser/repo = on\n[labels]\nnew = #000000\n')
+    runner = CliRunner()
+    result = runner.invoke(cli, ['-c', str(config), 'run', '-d',
+                                 '-o', 'jsonl', '--threaded-output'], obj={})
+    assert isinstance(result.exception, RuntimeError)
+    assert json.loads(result.output)['name'] == 'new'
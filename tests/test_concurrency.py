@@ -0,0 +1,230 @@
+import queue
+import threading
+import time
+import pytest
+import flexmock
+from labelord.cli import RunProcessor, RunModes, VerbosePrinter
+from labelord.concurrency import AIMDController, KeyedExecutor
+from labelord.github import GitHubError
+
+
+def gh_error(status_code, message, headers=None):
+    response = flexmock(status_code=status_code, headers=headers or {},
+                        json=lambda: {'message': message})
+    return GitHubError.from_response(response)
+
+
+@pytest.mark.parametrize(
+    ['status_code', 'message', 'headers', 'expected'],
+    [(403, 'You have exceeded a secondary rate limit.', {}, True),
+     (403, 'You have triggered an abuse detection mechanism.', {}, True),
+     (422, 'Validation Failed', {'Retry-After': '5'}, True),
+     (403, 'API rate limit exceeded for user ID 1.',
+      {'X-RateLimit-Remaining': '0'}, True),
+     (403, 'Must have admin rights to Repository.', {}, False),
+     (422, 'Validation Failed', {'X-RateLimit-Remaining': '0'}, False),
+     (404, 'Not Found', {}, False)],
+)
+def test_github_error_is_rate_limit(status_code, message, headers, expected):
+    assert gh_error(status_code, message, headers).is_rate_limit is expected
+
+
+def test_retry_after():
+    assert gh_error(403, 'x', {'Retry-After': '7'}).retry_after == 7
+    assert gh_error(403, 'x').retry_after is None
+    reset = str(int(time.time()) + 30)
+    exhausted = gh_error(403, 'API rate limit exceeded',
+                         {'X-RateLimit-Remaining': '0',
+                          'X-RateLimit-Reset': reset})
+    assert 25 < exhausted.retry_after <= 30
+
+
+def test_controller_increases_on_stable_latency():
+    controller = AIMDController(initial=2, maximum=4)
+    for _ in range(20):
+        controller.acquire()
+        controller.release(time.monotonic(), 0.1)
+    assert controller.limit == 4
+    assert controller.in_flight == 0
+
+
+def test_controller_backs_off_on_secondary_limit():
+    changes = []
+    controller = AIMDController(initial=8, maximum=8, backoff=0,
+                                on_change=changes.append)
+    calls = []
+
+    def write():
+        calls.append(1)
+        if len(calls) == 1:
+            raise gh_error(403, 'You have exceeded a secondary rate limit.')
+        return 'done'
+
+    assert controller.call(write) == 'done'
+    assert len(calls) == 2
+    assert controller.limit == 4
+    assert changes[0] == 4
+
+
+def test_controller_honors_retry_after():
+    controller = AIMDController(initial=4, max_retries=0)
+    error = gh_error(403, 'x', {'Retry-After': '0'})
+
+    def write():
+        raise error
+
+    with pytest.raises(GitHubError):
+        controller.call(write)
+    assert controller.limit == 2
+
+
+def test_controller_ignores_regular_errors():
+    controller = AIMDController(initial=4, max_retries=3)
+    calls = []
+
+    def write():
+        calls.append(1)
+        raise gh_error(422, 'Validation Failed')
+
+    with pytest.raises(GitHubError):
+        controller.call(write)
+    assert len(calls) == 1
+    assert controller.limit == 4
+
+
+def test_controller_cuts_on_rising_latency():
+    controller = AIMDController(initial=4, maximum=4)
+    for latency in (0.1, 0.1, 1.0):
+        controller.acquire()
+        controller.release(controller._last_decrease, latency)
+    assert controller.limit == 2
+
+
+class FakeGitHub:
+    def __init__(self, labels):
+        self.labels = labels
+        self.writes = []
+
+    def list_labels(self, slug):
+        return dict(self.labels)
+
+    def create_label(self, slug, name, color, **kwargs):
+        self.writes.append(('create', slug, name))
+
+    def update_label(self, slug, name, color, old_name=None, **kwargs):
+        self.writes.append(('update', slug, name))
+
+    def delete_label(self, slug, name, **kwargs):
+        self.writes.append(('delete', slug, name))
+
+
+def test_run_processor_concurrent_writes(capsys):
+    gh = FakeGitHub({'bug': 'ff0000', 'old': '000000'})
+    printer = VerbosePrinter()
+    # Frozen clock, every write has the same (zero) latency
+    controller = AIMDController(initial=1, maximum=2, clock=lambda: 0.0)
+    processor = RunProcessor(gh, printer, controller)
+    spec = {'bug': '00ff00', 'new': '123456', 'other': '654321'}
+    slugs = ['user/repo{}'.format(i) for i in range(5)]
+
+    code = processor.run(slugs, spec, RunModes.replace_mode)
+
+    assert code == 0
+    assert len(gh.writes) == 5 * 4
+    out, err = capsys.readouterr()
+    assert '[CONCURRENCY] 2' in out
+    assert out.endswith('[SUMMARY] 5 repo(s) updated successfully\n')
+
+
+class PeakGitHub(FakeGitHub):
+    def __init__(self, labels):
+        super().__init__(labels)
+        self.running = self.peak = 0
+        self.lock = threading.Lock()
+
+    def _call(self):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(0.002)
+        with self.lock:
+            self.running -= 1
+
+    def list_labels(self, slug):
+        self._call()
+        return super().list_labels(slug)
+
+    def create_label(self, slug, name, color, **kwargs):
+        self._call()
+        super().create_label(slug, name, color)
+
+
+def test_run_processor_reads_and_writes_share_limit():
+    gh = PeakGitHub({})
+    controller = AIMDController(initial=2, maximum=2)
+    processor = RunProcessor(gh, controller=controller)
+    slugs = ['user/repo{}'.format(i) for i in range(10)]
+    assert processor.run(slugs, {'a': 'ff0000', 'b': '00ff00'},
+                         RunModes.update_mode) == 0
+    assert len(gh.writes) == 20
+    assert gh.peak <= 2
+
+
+def test_keyed_executor_orders_tasks_of_key():
+    executor = KeyedExecutor(4)
+    calls = []
+    lock = threading.Lock()
+
+    def task(key, i):
+        time.sleep(0.001 * ((i * 7) % 3))
+        with lock:
+            calls.append((key, i))
+        return i
+
+    futures = [executor.submit(key, task, key, i)
+               for i in range(10) for key in 'abc']
+    assert [f.result() for f in futures] == [i for i in range(10)
+                                             for _ in 'abc']
+    for key in 'abc':
+        assert [i for k, i in calls if k == key] == list(range(10))
+    executor.shutdown()
+
+
+def test_keyed_executor_runs_keys_concurrently():
+    executor = KeyedExecutor(2)
+    barrier = threading.Barrier(2, timeout=5)
+    futures = [executor.submit(key, barrier.wait) for key in 'ab']
+    for future in futures:
+        future.result()
+    executor.shutdown()
+
+
+def test_keyed_executor_backpressure():
+    executor = KeyedExecutor(1, queue_size=1)
+    release = threading.Event()
+    running = executor.submit('a', release.wait)
+    while executor.queued:
+        time.sleep(0.001)
+    executor.submit('a', lambda: None)
+    with pytest.raises(queue.Full):
+        executor.submit('a', lambda: None, timeout=0.01)
+    other = executor.submit('b', lambda: 'b', timeout=0)
+    release.set()
+    assert running.result() is True
+    assert other.result() == 'b'
+    executor.join()
+    assert executor.queued == 0
+
+
+def test_keyed_executor_shutdown():
+    executor = KeyedExecutor(2)
+    done = []
+    for i in range(5):
+        executor.submit('a', done.append, i)
+    failing = executor.submit('b', lambda: 1 / 0)
+    executor.shutdown()
+    assert done == list(range(5))
+    with pytest.raises(ZeroDivisionError):
+        failing.result()
+    with pytest.raises(RuntimeError):
+        executor.submit('a', done.append, 5)
@@ -0,0 +1,50 @@
+from labelord.deliveries import DeliveryLog
+
+
+def test_duplicates_are_detected():
+    log = DeliveryLog(size=2)
+    assert not log.seen('a')
+    assert not log.seen('b')
+    assert log.seen('a')
+    assert not log.seen('c')
+    assert 'b' not in log
+    assert log.seen('a')
+    assert len(log) == 2
+
+
+def test_forget():
+    log = DeliveryLog()
+    assert not log.seen('a')
+    log.forget('a')
+    assert not log.seen('a')
+
+
+def test_persisted(tmpdir):
+    filename = str(tmpdir.join('deliveries'))
+    log = DeliveryLog(size=3, filename=filename)
+    for delivery in 'abcdefgh':
+        assert not log.seen(delivery)
+    log.close()
+    assert len(open(filename).readlines()) <= 6
+
+    log = DeliveryLog(size=3, filename=filename)
+    assert list(log._seen) == ['f', 'g', 'h']
+    assert log.seen('g')
+    assert not log.seen('a')
+    log.close()
+
+
+def test_forget_appends_tombstone(tmpdir):
+    filename = str(tmpdir.join('deliveries'))
+    log = DeliveryLog(size=10, filename=filename)
+    assert not log.seen('a')
+    assert not log.seen('b')
+    log.forget('a')
+    log.forget('unknown')
+    assert open(filename).read() == 'a\nb\n-a\n'
+
+    reloaded = DeliveryLog(size=10, filename=filename)
+    assert list(reloaded._seen) == ['b']
+    reloaded.close()
+    assert open(filename).read() == 'b\n'
+    log.close()
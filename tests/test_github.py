@@ -1,6 +1,9 @@
+import hashlib
+import hmac
 import pytest
 import flexmock
 from labelord import github, helpers
+from labelord.github import GitHub, WebhookVerifier
 
 
 def test_list_repositories(gh):
@@ -16,7 +19,8 @@ def test_list_labels(gh):
     assert len(res) == 5
     for label in labels:
         assert label in res
-        assert res[label] == labels[label]
+        assert res[label].color == int(labels[label], 16)
+        assert res[label].name == label
 
 def test_list_labels_no_label(gh):
     res = gh.list_labels('jakubjancicka/wator')
@@ -34,3 +38,24 @@ def test_update_label_without_permission(gh):
 def test_delete_nonexisting_label(gh):
     with pytest.raises(github.GitHubError):
         gh.delete_label('jakubjancicka/wator', 'test')
+
+
+@pytest.mark.parametrize(
+    ['digest', 'prefix'],
+    [(hashlib.sha256, 'sha256='), (hashlib.sha1, 'sha1=')],
+)
+def test_webhook_verifier(digest, prefix):
+    body = b'{"zen": "Design for failure."}'
+    signature = prefix + hmac.new(b'secret', body, digest).hexdigest()
+    verifier = WebhookVerifier('secret')
+    assert verifier.verify(body, signature)
+    assert verifier.verify(body, signature)
+    assert not verifier.verify(body + b' ', signature)
+    assert not verifier.verify(body, signature[len(prefix):])
+    assert GitHub.webhook_verify_signature(body, signature, 'secret')
+
+
+def test_webhook_verifier_prefers_sha256():
+    headers = {'X-Hub-Signature': 'sha1=a', 'X-Hub-Signature-256': 'sha256=b'}
+    assert WebhookVerifier.signature(headers) == 'sha256=b'
+    assert WebhookVerifier.signature({}) == ''
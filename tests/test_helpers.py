@@ -1,6 +1,7 @@
+import configparser
 import pytest
 import flexmock
-from labelord.cli import pick_printer, QuietPrinter, VerbosePrinter, Printer, pick_runner, DryRunProcessor, RunProcessor, gh_error_return, retrieve_github_client
+from labelord.cli import pick_printer, QuietPrinter, VerbosePrinter, Printer, JsonLinesPrinter, ThreadedJsonLinesPrinter, pick_runner, DryRunProcessor, RunProcessor, gh_error_return, retrieve_github_client
 from labelord import helpers
 
 def test_create_config(utils):
@@ -30,12 +31,11 @@ def test_create_config_add_token(utils):
 
 def test_extract_repos_no_repo(utils, capsys):
     cfg = helpers.create_config(utils.config('no_repo'))
-    with pytest.raises(SystemExit) as e:
+    with pytest.raises(helpers.ConfigError) as e:
         helpers.extract_repos(cfg)
     assert e.value.code == 7
-    out, err = capsys.readouterr()
-    assert out == ''
-    assert err == 'No repositories specification has been found\n'
+    assert str(e.value) == 'No repositories specification has been found'
+    assert capsys.readouterr() == ('', '')
 
 def test_extract_repos(utils):
     cfg = helpers.create_config(utils.config('repos'))
@@ -55,6 +55,10 @@ def test_pick_printer_printer():
     assert pick_printer(True, True) == Printer
     assert pick_printer(False, False) == Printer
 
+def test_pick_printer_jsonl():
+    assert pick_printer(True, False, 'jsonl') == JsonLinesPrinter
+    assert pick_printer(False, False, 'jsonl', True) == ThreadedJsonLinesPrinter
+
 def test_pick_runner_run():
     assert pick_runner(False) == RunProcessor
 
@@ -81,3 +85,70 @@ def test_retrieve_github_client_no_token(capsys):
 def test_retrieve_github_client():
     ctx = flexmock(obj={'GitHub': 'githubclient'})
     assert retrieve_github_client(ctx) == 'githubclient'
+
+
+PROFILES_CONFIG = '''
+[labels]
+Default = 000000
+
+[profile:backend]
+bug = FF0000
+api = 00FF00
+
+[profile:frontend]
+template-repo = org/design
+
+[profiles]
+org/web-* = frontend
+org/* = backend
+org/special = frontend
+'''
+
+
+def profiles_config():
+    cfg = configparser.ConfigParser()
+    cfg.optionxform = str
+    cfg.read_string(PROFILES_CONFIG)
+    return cfg
+
+
+def test_assign_profiles():
+    assert helpers.assign_profiles(profiles_config(), [
+        'org/web-app', 'org/api', 'org/special', 'user/repo'
+    ]) == {'org/web-app': 'frontend', 'org/api': 'backend',
+           'org/special': 'frontend', 'user/repo': None}
+
+
+def test_extract_label_profiles():
+    github = flexmock()
+    github.should_receive('list_labels').with_args('org/design').once()\
+        .and_return({'ui': 'abcdef'})
+    repos = ['org/web-app', 'org/web-site', 'org/api', 'org/db',
+             'user/repo']
+    specs = helpers.extract_label_profiles(github, None, profiles_config(),
+                                           repos)
+    assert specs['org/web-app'] is specs['org/web-site']
+    assert specs['org/api'] is specs['org/db']
+    assert sorted(specs['org/api']) == ['api', 'bug']
+    assert sorted(specs['user/repo']) == ['Default']
+    assert helpers.has_label_profiles(profiles_config())
+    assert helpers.profile_template_repos(profiles_config()) == {'org/design'}
+
+
+def test_extract_label_profiles_unknown_profile():
+    cfg = profiles_config()
+    cfg['profiles']['user/repo'] = 'missing'
+    with pytest.raises(helpers.ConfigError) as e:
+        helpers.extract_label_profiles(flexmock(), None, cfg, ['user/repo'])
+    assert e.value.code == helpers.NO_LABELS_SPEC_RETURN
+    assert 'Label profile missing' in str(e.value)
+
+
+def test_extract_label_profiles_template_option():
+    github = flexmock()
+    github.should_receive('list_labels').with_args('user/tpl').once()\
+        .and_return({'x': 'ffffff'})
+    specs = helpers.extract_label_profiles(github, 'user/tpl',
+                                           profiles_config(),
+                                           ['org/api', 'org/web-app'])
+    assert specs['org/api'] is specs['org/web-app']
@@ -0,0 +1,138 @@
+import threading
+import pytest
+from labelord.ignores import (MemoryIgnoreStore, SQLiteIgnoreStore,
+                              create_ignore_store, is_valid_ignore_url)
+from labelord.web import LabelordChange
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_consume_counts_occurrences(clock):
+    store = MemoryIgnoreStore(10, clock)
+    change = LabelordChange('created', 'bug', 'ff0000')
+    store.add(['a/b', 'c/d'], change)
+    store.add(['a/b'], LabelordChange('created', 'bug', 'FF0000'))
+    assert len(store) == 3
+    assert store.consume('a/b', change)
+    assert store.consume('a/b', change)
+    assert not store.consume('a/b', change)
+    assert store.consume('c/d', change)
+    assert len(store) == 0
+
+
+def test_changes_expire(clock):
+    store = MemoryIgnoreStore(10, clock)
+    change = LabelordChange('deleted', 'bug', None)
+    store.add(['a/b'], change)
+    clock.now += 5
+    store.add(['a/b'], change)
+    clock.now += 5
+    store.expire()
+    assert len(store) == 1
+    assert store.consume('a/b', change)
+    clock.now += 5
+    store.expire()
+    assert len(store) == 0
+    assert not store.consume('a/b', change)
+
+
+def test_rename_is_part_of_change(clock):
+    store = MemoryIgnoreStore(10, clock)
+    store.add(['a/b'], LabelordChange('edited', 'bug', '000000', 'defect'))
+    assert not store.consume('a/b', LabelordChange('edited', 'bug', '000000'))
+    assert store.consume(
+        'a/b', LabelordChange('edited', 'bug', '000000', 'defect')
+    )
+
+
+@pytest.fixture
+def ignore_server():
+    from labelord.ignores import IgnoreServer
+    server = IgnoreServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(params=['sqlite', 'tcp'])
+def shared_url(request, tmpdir):
+    if request.param == 'sqlite':
+        return 'sqlite://' + str(tmpdir.join('ignores.db'))
+    return request.getfixturevalue('ignore_server').url
+
+
+def test_shared_store_consumed_once(shared_url):
+    first = create_ignore_store(shared_url)
+    second = create_ignore_store(shared_url)
+    key = ('edited', 'bug', 0xff0000, 'defect')
+    first.add(['a/b', 'c/d'], key)
+    assert len(second) == 2
+
+    results = []
+    threads = [threading.Thread(
+        target=lambda s: results.append(s.consume('a/b', key)), args=(s,)
+    ) for s in (first, second, first, second)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(results) == [False, False, False, True]
+    assert second.consume('c/d', key)
+    assert not first.consume('c/d', key)
+
+
+def test_tcp_store_retried_request_applied_once(ignore_server, monkeypatch):
+    from labelord.ignores import TCPIgnoreStore
+    store = create_ignore_store(ignore_server.url)
+    key = ('created', 'bug', 0xff0000, None)
+    store.add(['a/b', 'a/b'], key)
+    exchange = TCPIgnoreStore._exchange
+    lost = []
+
+    def lose_first_reply(stream, data):
+        result = exchange(stream, data)
+        if not lost:
+            lost.append(result)
+            raise TimeoutError('reply lost')
+        return result
+
+    monkeypatch.setattr(TCPIgnoreStore, '_exchange',
+                        staticmethod(lose_first_reply))
+    assert store.consume('a/b', key)
+    assert lost == [True]
+    assert len(store) == 1
+    assert store.consume('a/b', key)
+
+
+def test_sqlite_store_expires(tmpdir, clock):
+    store = SQLiteIgnoreStore(str(tmpdir.join('ignores.db')), 10, clock)
+    store.add(['a/b'], ('deleted', 'bug', None, None))
+    clock.now += 10
+    assert len(store) == 0
+    assert not store.consume('a/b', ('deleted', 'bug', None, None))
+
+
+@pytest.mark.parametrize(
+    ['url', 'valid'],
+    [('memory://', True), ('sqlite:///tmp/ignores.db', True),
+     ('tcp://localhost:5001', True), ('tcp://localhost', False),
+     ('sqlite://', False), ('redis://localhost:6379', False)],
+)
+def test_ignore_urls(url, valid):
+    assert is_valid_ignore_url(url) is valid
+    if not valid:
+        with pytest.raises(ValueError):
+            create_ignore_store(url)
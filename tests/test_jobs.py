@@ -0,0 +1,180 @@
+import time
+import pytest
+import flexmock
+from click.testing import CliRunner
+from labelord import cli, github
+from labelord.jobs import JobQueue, work
+from fakegithub import FakeGitHubServer
+
+
+@pytest.fixture
+def jobs(tmpdir):
+    return JobQueue(str(tmpdir.join('queue.db')), lease=60, backoff=0)
+
+
+def test_put_claim_ack(jobs):
+    jobs.put({'n': 1})
+    jobs.put({'n': 2})
+    assert jobs.depth() == 2
+
+    job = jobs.claim()
+    assert job.payload == {'n': 1}
+    assert job.attempts == 1
+    assert jobs.claim().payload == {'n': 2}
+    assert jobs.claim() is None  # both leased
+    jobs.ack(job)
+    assert jobs.depth() == 1
+
+
+def test_queue_is_durable(jobs):
+    jobs.put({'n': 1})
+    reopened = JobQueue(jobs.filename)
+    assert reopened.claim().payload == {'n': 1}
+
+
+def test_expired_lease_is_claimed_again(tmpdir):
+    jobs = JobQueue(str(tmpdir.join('queue.db')), lease=0)
+    jobs.put({'n': 1})
+    assert jobs.claim().attempts == 1
+    assert jobs.claim().attempts == 2
+
+
+def test_lease_is_renewed_while_job_runs(tmpdir):
+    jobs = JobQueue(str(tmpdir.join('queue.db')), lease=0.3)
+    other = JobQueue(jobs.filename, lease=0.3)  # another worker
+    jobs.put({'n': 1})
+    claimed = []
+
+    def handler(payload):
+        time.sleep(0.8)  # longer than the lease
+        claimed.append(other.claim())
+
+    assert work(jobs, handler, once=True) == 1
+    assert claimed == [None]
+    assert jobs.depth() == 0
+
+
+def test_failed_job_is_retried_then_dead(tmpdir):
+    jobs = JobQueue(str(tmpdir.join('queue.db')), max_attempts=2,
+                    backoff=0)
+    jobs.put({'n': 1})
+    jobs.fail(jobs.claim(), 'boom')
+    job = jobs.claim()
+    assert job.attempts == 2
+    jobs.fail(job, 'boom')
+    assert jobs.claim() is None
+    assert jobs.depth() == 0
+    assert [j.payload for j in jobs.dead()] == [{'n': 1}]
+
+
+def test_failed_job_backoff(tmpdir):
+    jobs = JobQueue(str(tmpdir.join('queue.db')), backoff=60)
+    jobs.put({'n': 1})
+    jobs.fail(jobs.claim(), 'boom')
+    assert jobs.claim() is None
+    assert jobs.depth() == 1
+
+
+def test_work(jobs):
+    for i in range(3):
+        jobs.put({'n': i})
+    seen = []
+
+    def handler(payload):
+        seen.append(payload['n'])
+        if payload['n'] == 1 and seen.count(1) == 1:
+            raise RuntimeError('temporary')
+
+    assert work(jobs, handler, once=True) == 4
+    assert seen == [0, 1, 1, 2]  # retried without delay
+
+
+def test_worker_command(tmpdir, monkeypatch):
+    queue_file = str(tmpdir.join('queue.db'))
+    config = tmpdir.join('config.cfg')
+    config.write('[github]\ntoken = T\nwebhook_secret = S\n'
+                 '[repos]\nuser/repo = on\nuser/repo2 = on\n'
+                 '[server]\nqueue = {}\n'.format(queue_file))
+    JobQueue(queue_file).put({
+        'action': 'created', 'label': {'name': 'bug', 'color': 'ff0000'},
+        'repository': {'full_name': 'user/repo'},
+    })
+    server = FakeGitHubServer({'user/repo': {}, 'user/repo2': {}})
+    with server:
+        monkeypatch.setattr(github.GitHub, 'GH_API_ENDPOINT', server.url)
+        result = CliRunner().invoke(cli, ['-c', str(config), 'worker',
+                                          '--once'], obj={})
+    assert result.exit_code == 0
+    assert 'bug' in server.state.repos['user/repo2']
+    assert JobQueue(queue_file).depth() == 0
+
+
+def test_worker_command_without_queue(utils):
+    result = CliRunner().invoke(cli, ['-c', utils.config('basic_config'),
+                                      'worker', '--once'], obj={})
+    assert result.exit_code == 11
+
+
+def test_claims_are_ordered_by_key(jobs):
+    jobs.put({'n': 1}, key='user/a')
+    jobs.put({'n': 2}, key='user/a')
+    jobs.put({'n': 3}, key='user/b')
+    jobs.put({'n': 4})
+    first = jobs.claim()
+    assert first.payload == {'n': 1}
+    # n=2 waits until n=1 of the same repository is finished
+    assert jobs.claim().payload == {'n': 3}
+    assert jobs.claim().payload == {'n': 4}
+    assert jobs.claim() is None
+    jobs.fail(first, 'boom')
+    assert jobs.claim().payload == {'n': 1}
+
+
+def test_failed_job_with_new_payload(jobs):
+    jobs.put({'n': 1})
+    jobs.fail(jobs.claim(), 'boom', {'n': 1, 'retry': True})
+    assert jobs.claim().payload == {'n': 1, 'retry': True}
+
+
+def test_failed_writes_are_retried_then_dead(tmpdir):
+    from labelord.web import LabelordWeb
+    from fakegithub import make_config
+    jobs = JobQueue(str(tmpdir.join('queue.db')), max_attempts=3,
+                    backoff=0)
+    cfg = make_config(['user/repo', 'user/repo2', 'user/repo3'])
+    cfg.read_dict({'server': {'queue': jobs.filename}})
+    server = FakeGitHubServer({'user/repo': {}, 'user/repo2': {},
+                               'user/repo3': {}})
+    server.state.fail_writes('user/repo3')
+    with server:
+        app = LabelordWeb.create_app(cfg, server.client())
+        app._job_queue = jobs
+        app.enqueue_label_webhook({
+            'action': 'created', 'label': {'name': 'bug', 'color': 'ff0000'},
+            'repository': {'full_name': 'user/repo'},
+        })
+        assert work(jobs, app.process_job, once=True) == 3
+        app.shutdown()
+    assert 'bug' in server.state.repos['user/repo2']
+    # one write to repo2, then three attempts of repo3 only
+    assert server.state.writes == 4
+    assert jobs.depth() == 0
+    [dead] = jobs.dead()
+    assert dead.attempts == 3
+    assert dead.payload['labelord_targets'] == ['user/repo3']
+
+
+def test_job_is_not_coalesced(tmpdir):
+    from labelord.web import LabelordWeb
+    from fakegithub import make_config
+    cfg = make_config(['user/repo', 'user/repo2'])
+    cfg.read_dict({'server': {'queue': str(tmpdir.join('queue.db')),
+                              'coalesce_window': '60'}})
+    with FakeGitHubServer({'user/repo': {}, 'user/repo2': {}}) as server:
+        app = LabelordWeb.create_app(cfg, server.client())
+        app.process_job({
+            'action': 'created', 'label': {'name': 'bug', 'color': 'ff0000'},
+            'repository': {'full_name': 'user/repo'},
+        })
+        assert 'bug' in server.state.repos['user/repo2']
+        app.shutdown()
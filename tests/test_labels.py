@@ -0,0 +1,90 @@
+import pytest
+from labelord.labels import (Label, as_labels, canonical_description,
+                             format_color, parse_color)
+from labelord import helpers
+
+
+@pytest.mark.parametrize(
+    ['color', 'value'],
+    [('FF0000', 0xFF0000), ('#ff0000', 0xFF0000), (' 00ff00 ', 0x00FF00),
+     (0x123456, 0x123456)],
+)
+def test_parse_color(color, value):
+    assert parse_color(color) == value
+
+
+@pytest.mark.parametrize('color', ['XYZ', '1000000', -1, ''])
+def test_parse_color_invalid(color):
+    with pytest.raises(ValueError):
+        parse_color(color)
+
+
+def test_format_color():
+    assert format_color(0xEE0701) == 'ee0701'
+    assert format_color(0) == '000000'
+
+
+def test_label():
+    label = Label.from_json({'id': 1, 'name': 'bug', 'color': 'EE0701',
+                             'description': 'Broken', 'default': True})
+    assert label.name == 'bug'
+    assert label.color == 0xEE0701
+    assert label.hex == 'ee0701'
+    assert label.description == 'Broken'
+    assert label.id == 1
+    assert label == Label('bug', '#ee0701', 'Broken')
+    assert label != Label('bug', 'ee0702', 'Broken')
+    assert not hasattr(label, '__dict__')
+
+
+def test_label_names_are_shared():
+    a = Label(''.join(['b', 'ug']), 'ee0701')
+    b = Label(''.join(['bu', 'g']), 'ee0701')
+    assert a.name is b.name
+    assert a.color is b.color
+
+
+def test_as_labels():
+    labels = as_labels({'bug': 'ee0701', 'wontfix': Label('wontfix', 0)})
+    assert labels['bug'] == Label('bug', 'ee0701')
+    assert labels['wontfix'].color == 0
+
+
+def test_parse_labels_invalid():
+    with pytest.raises(helpers.ConfigError) as e:
+        helpers.parse_labels({'bug': 'red'})
+    assert e.value.code == 9
+    assert str(e.value) == 'Invalid color red of label bug'
+
+
+@pytest.mark.parametrize(
+    ['description', 'canonical'],
+    [(None, ''), ('', ''), ('  Something   is\nbroken ', 'Something is broken')],
+)
+def test_canonical_description(description, canonical):
+    assert canonical_description(description) == canonical
+
+
+@pytest.mark.parametrize(
+    ['spec', 'current', 'differs'],
+    [(Label('bug', 'FF0000'), Label('bug', '#ff0000', 'Bug'), False),
+     (Label('bug', 'FF0000', ' Bug '), Label('bug', 'ff0000', 'Bug'), False),
+     (Label('bug', 'FF0000', ''), Label('bug', 'ff0000', None), False),
+     (Label('bug', 'FF0000', 'Bug'), Label('bug', 'ff0000', 'Defect'), True),
+     (Label('bug', 'FF0000'), Label('bug', 'ff0001'), True)],
+)
+def test_label_differs(spec, current, differs):
+    assert spec.differs(current) is differs
+
+
+@pytest.mark.parametrize(
+    ['spec', 'current', 'noop'],
+    [(Label('bug', 'FF0000'), Label('bug', 'ff0000'), True),
+     (Label('bug', '#ff0000'), Label('bug', 'ff0000'), True),
+     (Label('bug', 'ff0000'), Label('bug', 'ff0000', 'Bug'), False),
+     (Label('bug', 'ff0000', ' Bug '), Label('bug', 'ff0000', 'Bug'), True),
+     (Label('bug', 'ff0000', 'Bug'), Label('bug', 'ff0000', 'Bug'), False),
+     (Label('bug', 'FF0000'), Label('bug', 'ff0001'), False)],
+)
+def test_label_is_noop_write(spec, current, noop):
+    assert spec.is_noop_write(current) is noop
@@ -0,0 +1,93 @@
+import pytest
+from labelord import helpers
+from labelord import metrics
+from labelord.ignores import MemoryIgnoreStore
+from fakegithub import label_payload, headers, SECRET
+from test_web import RecordingGitHub
+
+
+@pytest.fixture
+def registry():
+    metrics.REGISTRY.clear()
+    yield metrics.REGISTRY
+    metrics.REGISTRY.clear()
+
+
+def test_render_counter_and_gauge():
+    registry = metrics.Registry()
+    counter = registry.register(metrics.Counter(
+        'requests_total', 'Requests.', ('path',)
+    ))
+    gauge = registry.register(metrics.Gauge('depth', 'Depth.'))
+    counter.inc('/')
+    counter.inc('/', amount=2)
+    counter.inc('a"b')
+    gauge.set(7)
+    assert registry.render() == (
+        '# HELP requests_total Requests.\n'
+        '# TYPE requests_total counter\n'
+        'requests_total{path="/"} 3\n'
+        'requests_total{path="a\\"b"} 1\n'
+        '# HELP depth Depth.\n'
+        '# TYPE depth gauge\n'
+        'depth 7\n'
+    )
+
+
+def test_render_histogram():
+    histogram = metrics.Histogram('latency', 'Latency.', ('action',),
+                                  buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.5, 3):
+        histogram.observe(value, 'created')
+    assert histogram.count('created') == 4
+    assert histogram.render().splitlines()[2:] == [
+        'latency_bucket{action="created",le="0.1"} 1',
+        'latency_bucket{action="created",le="1.0"} 3',
+        'latency_bucket{action="created",le="+Inf"} 4',
+        'latency_sum{action="created"} 4.05',
+        'latency_count{action="created"} 4',
+    ]
+
+
+def test_wrong_labels():
+    with pytest.raises(ValueError):
+        metrics.Counter('c', 'C.', ('a', 'b')).inc('a')
+
+
+def test_observe_github_response(registry):
+    metrics.observe_github_response('GET', 200, 0.2,
+                                    {'X-RateLimit-Remaining': '4999'})
+    assert metrics.GITHUB_LATENCY.count('GET', 200) == 1
+    assert metrics.RATE_LIMIT_REMAINING.value() == 4999
+
+
+def test_metrics_endpoint(utils, registry):
+    from labelord.web import app
+    cfg = helpers.create_config(utils.config('repos'))
+    cfg['github']['webhook_secret'] = SECRET
+    app.labelord_config = cfg
+    app.github = RecordingGitHub()
+    app.ignores = MemoryIgnoreStore()
+    client = app.test_client()
+    body = label_payload('created', 'user/repo', 'bug')
+    client.post('/', data=body, headers=headers(body, 'label'))
+    app.webhook_pool.join()
+    client.post('/', data=body, headers={
+        'X-Hub-Signature': 'sha1=0', 'X-GitHub-Event': 'label',
+        'Content-Type': 'application/json'})
+    client.post('/', data=body, headers=headers(body, 'unknown-event'))
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain')
+    text = response.get_data(as_text=True)
+    assert 'labelord_webhooks_total{event="label",status="202"} 1' in text
+    assert 'labelord_webhooks_total{event="label",status="401"} 1' in text
+    assert 'labelord_webhooks_total{event="other",status="400"} 1' in text
+    assert 'labelord_webhook_signature_failures_total 1' in text
+    assert 'labelord_ignores 2' in text
+    assert 'labelord_queue_depth 0' in text
+    assert metrics.FANOUT_LATENCY.count('created', 'user/repo3') == 1
+    assert metrics.FANOUT_LATENCY.count('created', 'user2/repo') == 1
+    assert metrics.FANOUT_LATENCY.count('created', 'user/repo') == 0
+    assert metrics.PROPAGATION_LATENCY.count('created', 'ok') == 2
@@ -1,6 +1,8 @@
+import io
+import json
 import pytest
 import flexmock
-from labelord.cli import BasePrinter, Printer, QuietPrinter, VerbosePrinter
+from labelord.cli import BasePrinter, Printer, QuietPrinter, VerbosePrinter, JsonLinesPrinter, ThreadedJsonLinesPrinter
 
 
 def test_printer(capsys):
@@ -116,3 +118,50 @@ def test_verbose_printer_no_error(capsys):
     assert out[5] == '[SUMMARY] 3 repo(s) updated successfully'
     assert out[6] == ''
     assert err == ''
+
+@pytest.mark.parametrize('printer_cls', [JsonLinesPrinter, ThreadedJsonLinesPrinter])
+def test_jsonl_printer(printer_cls):
+    stream = io.BytesIO()
+    printer = printer_cls(stream)
+    printer.add_repo('repo1')
+    printer.add_repo('repo2')
+    printer.event('ADD', 'SUC', 'repo1', 'label1', 'FF0000', latency=0.5)
+    printer.event('DEL', 'ERR', 'repo2', 'label2', '000000', '404 - Not Found')
+    printer.event('LBL', 'ERR', 'repo2', '401 - Bad credentials')
+    printer.summary()
+
+    lines = [json.loads(l) for l in stream.getvalue().decode().splitlines()]
+    assert len(lines) == 4
+    assert lines[0] == {'event': 'ADD', 'result': 'SUC', 'repo': 'repo1',
+                        'name': 'label1', 'color': 'FF0000', 'error': None,
+                        'latency': 0.5}
+    assert lines[1]['error'] == '404 - Not Found'
+    assert lines[1]['color'] == '000000'
+    assert lines[2]['name'] is None
+    assert lines[2]['error'] == '401 - Bad credentials'
+    assert lines[3] == {'event': 'SUMMARY', 'repos': 2, 'errors': 2,
+                        'summary': '2 error(s) in total, please check log above'}
+    assert printer.errors == 2
+
+
+@pytest.mark.parametrize('printer_cls', [JsonLinesPrinter, ThreadedJsonLinesPrinter])
+def test_jsonl_printer_close_without_summary(printer_cls):
+    stream = io.BytesIO()
+    printer = printer_cls(stream)
+    printer.event('ADD', 'SUC', 'repo1', 'label1', 'FF0000')
+    printer.close()
+    printer.close()
+
+    lines = [json.loads(l) for l in stream.getvalue().decode().splitlines()]
+    assert [l['name'] for l in lines] == ['label1']
+
+
+def test_printer_noop_writes_skipped(capsys):
+    printer = Printer()
+    printer.add_repo('repo1')
+    printer.skipped(2)
+    printer.skipped(3)
+    printer.summary()
+    out, err = capsys.readouterr()
+    assert out == ('SUMMARY: 1 repo(s) updated successfully, '
+                   '5 no-op write(s) skipped\n')
@@ -0,0 +1,73 @@
+import configparser
+from labelord.github import GitHub
+from labelord.reconcile import Reconciler
+from labelord.web import LabelordWeb
+from fakegithub import FakeGitHubServer
+
+
+def make_app(server, mode_labels):
+    cfg = configparser.ConfigParser()
+    cfg.optionxform = str
+    cfg.read_dict({
+        'github': {'token': '<TOKEN>', 'webhook_secret': 'S'},
+        'repos': {'user/a': 'on', 'user/b': 'on'},
+        'labels': mode_labels,
+    })
+    return LabelordWeb.create_app(cfg, server.client())
+
+
+def test_reconcile_heals_drift():
+    repos = {'user/a': {'bug': 'ff0000'},
+             'user/b': {'bug': '000000', 'old': '111111'}}
+    with FakeGitHubServer(repos) as server:
+        app = make_app(server, {'bug': 'ff0000', 'new': '00ff00'})
+        app.github.enable_conditional_requests()
+        reconciler = Reconciler(app, 0.01, 'replace')
+
+        assert reconciler.run_cycle() == 0
+        for slug in ('user/a', 'user/b'):
+            labels = server.state.repos[slug]
+            assert {l['name']: l['color'] for l in labels.values()} == {
+                'bug': 'ff0000', 'new': '00ff00'}
+        assert server.state.writes == 4
+        assert len(app.ignores) == 4
+
+        assert reconciler.run_cycle() == 0
+        server.state.reset_counters()
+        assert reconciler.run_cycle() == 0
+        assert server.state.writes == 0
+        assert server.state.reads == 0
+        assert server.state.not_modified == 2
+
+
+def test_reconcile_writes_are_not_echoed():
+    with FakeGitHubServer({'user/a': {}, 'user/b': {}}) as server:
+        app = make_app(server, {'bug': 'ff0000'})
+        Reconciler(app, 0.01).run_cycle()
+        echo = {'action': 'created', 'label': {'name': 'bug',
+                                               'color': 'ff0000'},
+                'repository': {'full_name': 'user/a'}}
+        with app.app_context():
+            assert app.process_label_webhook(echo) is None
+        assert server.state.writes == 2
+
+
+def test_reconcile_survives_invalid_config():
+    with FakeGitHubServer({'user/a': {}, 'user/b': {}}) as server:
+        app = make_app(server, {'bug': 'red'})
+        reconciler = Reconciler(app, 0.01)
+        assert reconciler.run_cycle() == 1
+        app.labelord_config['labels']['bug'] = 'ff0000'
+        assert reconciler.run_cycle() == 0
+        assert server.state.writes == 2
+
+
+def test_conditional_requests():
+    with FakeGitHubServer({'user/a': {'bug': 'ff0000'}}) as server:
+        github = server.client()
+        github.enable_conditional_requests()
+        assert github.list_labels('user/a')['bug'].hex == 'ff0000'
+        assert github.list_labels('user/a')['bug'].hex == 'ff0000'
+        assert server.state.not_modified == 1
+        server.state.set_labels('user/a', {'bug': '00ff00'})
+        assert github.list_labels('user/a')['bug'].hex == '00ff00'
@@ -1,6 +1,7 @@
 import pytest
 import flexmock
 from labelord.cli import RunModes
+from labelord.labels import Label
 
 @pytest.mark.parametrize(
     ['labels', 'spec', 'create', 'update', 'delete'],
@@ -18,13 +19,13 @@ def test_update_mode(labels, spec, create, update, delete):
     assert len(d) == len(delete)
     for i in c:
         assert i in create
-        assert c[i] == create[i]
+        assert c[i] == Label(*create[i])
     for i in u:
         assert i in update
-        assert u[i] == update[i]
+        assert u[i] == Label(*update[i])
     for i in d:
         assert i in delete
-        assert d[i] == delete[i]
+        assert d[i] == Label(*delete[i])
 
 @pytest.mark.parametrize(
     ['labels', 'spec', 'create', 'update', 'delete'],
@@ -42,10 +43,20 @@ def test_replace_mode(labels, spec, create, update, delete):
     assert len(d) == len(delete)
     for i in c:
         assert i in create
-        assert c[i] == create[i]
+        assert c[i] == Label(*create[i])
     for i in u:
         assert i in update
-        assert u[i] == update[i]
+        assert u[i] == Label(*update[i])
     for i in d:
         assert i in delete
-        assert d[i] == delete[i]
+        assert d[i] == Label(*delete[i])
+
+
+def test_update_mode_compares_canonically():
+    labels = {'bug': Label('bug', 'ee0701', 'Something is broken'),
+              'wontfix': Label('wontfix', 'ffffff', 'Not fixed')}
+    spec = {'bug': Label('bug', '#EE0701', 'Something  is broken '),
+            'wontfix': Label('wontfix', 'FFFFFF', 'Will not be fixed')}
+    create, update, delete = RunModes.update_mode(labels, spec)
+    assert (create, delete) == ({}, {})
+    assert list(update) == ['wontfix']
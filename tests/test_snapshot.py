@@ -0,0 +1,84 @@
+import pytest
+import flexmock
+from click.testing import CliRunner
+from labelord.cli import cli, DryRunProcessor, RunModes, VerbosePrinter
+from labelord.labels import Label
+from labelord.snapshot import Snapshot, SnapshotError
+
+
+class FakeGitHub:
+    def __init__(self, repos):
+        self.repos = repos
+        self.calls = []
+
+    def list_labels(self, slug):
+        self.calls.append(slug)
+        if slug not in self.repos:
+            raise SnapshotError('Not Found')
+        return {n: Label(n, c) for n, c in self.repos[slug].items()}
+
+
+def test_snapshot_fetch():
+    gh = FakeGitHub({'user/repo': {'bug': 'ff0000'}, 'user/repo2': {}})
+    errors = []
+    snapshot = Snapshot.fetch(gh, ['user/repo', 'user/repo2', 'user/nope'],
+                              workers=2,
+                              on_error=lambda s, e: errors.append(s))
+    assert sorted(gh.calls) == ['user/nope', 'user/repo', 'user/repo2']
+    assert snapshot.list_repositories() == ['user/repo', 'user/repo2']
+    assert snapshot.list_labels('user/repo') == {'bug': Label('bug', 'ff0000')}
+    assert errors == ['user/nope']
+
+
+def test_snapshot_roundtrip(tmpdir):
+    filename = str(tmpdir.join('labels.snap'))
+    labels = {'bug': Label('bug', 'ee0701', 'Broken', 42)}
+    Snapshot({'user/repo': labels}, created=1).save(filename)
+
+    snapshot = Snapshot.load(filename)
+    assert snapshot.created == 1
+    label = snapshot.list_labels('user/repo')['bug']
+    assert label == labels['bug']
+    assert label.id == 42
+    with pytest.raises(SnapshotError) as e:
+        snapshot.list_labels('user/repo2')
+    assert e.value.status_code == 404
+
+
+def test_snapshot_error_is_not_rate_limit():
+    error = SnapshotError('Not Found')
+    assert error.is_rate_limit is False
+    assert error.retry_after is None
+    assert error.code_message == '404 - Not Found'
+
+
+def test_dry_run_from_snapshot(capsys):
+    snapshot = Snapshot({'user/repo': {'bug': Label('bug', 'ee0701')}})
+    processor = DryRunProcessor(snapshot, VerbosePrinter())
+    code = processor.run(['user/repo'], {'bug': '00ff00', 'new': '123456'},
+                         RunModes.update_mode)
+    assert code == 0
+    out, err = capsys.readouterr()
+    assert '[UPD][DRY] user/repo; bug; 00ff00' in out
+    assert '[ADD][DRY] user/repo; new; 123456' in out
+
+
+def test_cli_run_from_snapshot(utils, tmpdir):
+    filename = str(tmpdir.join('labels.snap'))
+    Snapshot({'user/repo': {'Test': Label('Test', '00ff00')},
+              'user/tmpl': {'Test': Label('Test', 'ff0000')}}).save(filename)
+    runner = CliRunner()
+    result = runner.invoke(cli, ['-c', utils.config('config_without_token'),
+                                 'run', '--dry-run', '-v', '-r', 'user/tmpl',
+                                 '--from-snapshot', filename], obj={})
+    assert result.exit_code == 0
+    assert '[UPD][DRY] user/repo; Test; ff0000' in result.output
+
+
+def test_cli_run_from_snapshot_requires_dry_run(utils, tmpdir):
+    filename = str(tmpdir.join('labels.snap'))
+    Snapshot({}).save(filename)
+    runner = CliRunner()
+    result = runner.invoke(cli, ['-c', utils.config('config_without_token'),
+                                 'run', '--from-snapshot', filename], obj={})
+    assert result.exit_code == 2
@@ -0,0 +1,33 @@
+import subprocess
+import sys
+import pytest
+from benchmarks.bench_startup import import_times
+
+WEB_MODULES = ('flask', 'werkzeug', 'jinja2', 'labelord.web')
+SERVER_MODULES = ('labelord.jobs', 'labelord.ignores', 'sqlite3',
+                  'socketserver')
+
+
+def test_cli_import_does_not_load_web_stack():
+    times = import_times('labelord.cli')
+    assert 'labelord' in times
+    for module in WEB_MODULES:
+        assert module not in times
+
+
+def test_cli_import_does_not_load_server_modules():
+    times = import_times('labelord.cli')
+    for module in SERVER_MODULES:
+        assert module not in times
+
+
+def test_cli_import_time():
+    # generous bound against regressions, measured ~0.15 s
+    assert import_times('labelord.cli')['labelord'] < 2000000
+
+
+def test_app_is_available_lazily():
+    code = ('import sys, labelord; assert "flask" not in sys.modules; '
+            'from labelord import app; print(type(app).__name__)')
+    out = subprocess.check_output([sys.executable, '-c', code])
+    assert out.strip() == b'LabelordWeb'
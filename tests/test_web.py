@@ -0,0 +1,438 @@
+import json
+import os
+import threading
+import time
+import pytest
+import flexmock
+from labelord import helpers
+from labelord.github import GitHub, GitHubError
+from labelord import server as server_module
+from labelord.ignores import MemoryIgnoreStore
+from labelord.web import WebhookWorkerPool
+from fakegithub import label_payload, headers, SECRET
+
+
+class RecordingGitHub:
+    def __init__(self):
+        self.calls = []
+        self.token = ''
+        self.failing = set()
+
+    def set_pool_size(self, size):
+        pass
+
+    def create_label(self, repo, name, color, **kwargs):
+        if repo in self.failing:
+            raise GitHubError.from_response(flexmock(status_code=404, headers={},
+                                       json=lambda: {'message': 'Not Found'}))
+        self.calls.append(('create', repo, name, color))
+
+    def update_label(self, repo, name, color, old_name=None, **kwargs):
+        self.calls.append(('update', repo, name, color, old_name))
+
+    def delete_label(self, repo, name, **kwargs):
+        self.calls.append(('delete', repo, name))
+
+    webhook_verify_signature = staticmethod(GitHub.webhook_verify_signature)
+
+
+@pytest.fixture
+def web(utils):
+    from labelord.web import app
+    cfg = helpers.create_config(utils.config('repos'))
+    cfg['github']['webhook_secret'] = SECRET
+    app.labelord_config = cfg
+    app.github = RecordingGitHub()
+    app.ignores = MemoryIgnoreStore()
+    return app
+
+
+def post(client, body, event='label'):
+    return client.post('/', data=body, headers=headers(body, event))
+
+
+def test_hook_accept_label_is_queued(web):
+    client = web.test_client()
+    response = post(client, label_payload('created', 'user/repo', 'bug'))
+    assert response.status_code == 202
+    web.webhook_pool.join()
+    assert sorted(web.github.calls) == [
+        ('create', 'user/repo3', 'bug', 'ff0000'),
+        ('create', 'user2/repo', 'bug', 'ff0000'),
+    ]
+
+
+def test_hook_accept_echo_is_ignored(web):
+    client = web.test_client()
+    post(client, label_payload('created', 'user/repo', 'bug'))
+    web.webhook_pool.join()
+    post(client, label_payload('created', 'user/repo3', 'bug'))
+    web.webhook_pool.join()
+    assert len(web.github.calls) == 2
+
+
+def test_hook_accept_bad_signature(web):
+    client = web.test_client()
+    body = label_payload('created', 'user/repo', 'bug')
+    response = client.post('/', data=body, headers={
+        'X-Hub-Signature': 'sha1=0', 'X-GitHub-Event': 'label',
+        'Content-Type': 'application/json'})
+    assert response.status_code == 401
+
+
+def test_hook_accept_not_allowed_repo(web):
+    client = web.test_client()
+    response = post(client, label_payload('created', 'user/repo2', 'bug'))
+    assert response.status_code == 400
+
+
+def test_hook_accept_queue_full(web):
+    flexmock(web).should_receive('enqueue_label_webhook').and_return(False)
+    client = web.test_client()
+    response = post(client, label_payload('created', 'user/repo', 'bug'))
+    assert response.status_code == 503
+
+
+def test_status(web):
+    response = web.test_client().get('/status')
+    assert response.status_code == 200
+    assert response.get_json() == {'queue_depth': 0}
+
+
+def test_worker_pool_drains_on_shutdown():
+    done = []
+    release = threading.Event()
+
+    def handler(event):
+        release.wait()
+        done.append(event)
+
+    pool = WebhookWorkerPool(handler, workers=2, queue_size=10)
+    for i in range(5):
+        assert pool.submit(i)
+    assert pool.depth >= 3
+    release.set()
+    pool.shutdown()
+    assert sorted(done) == [0, 1, 2, 3, 4]
+    assert not pool.submit(5)
+
+
+def test_worker_pool_bounded_queue():
+    release = threading.Event()
+    pool = WebhookWorkerPool(lambda e: release.wait(), workers=1,
+                             queue_size=1)
+    results = [pool.submit(i) for i in range(4)]
+    assert results.count(False) >= 2
+    release.set()
+    pool.shutdown()
+
+
+def test_hook_accept_durable_queue(web, tmpdir):
+    web.labelord_config.read_dict({'server': {
+        'queue': str(tmpdir.join('queue.db'))
+    }})
+    client = web.test_client()
+    response = post(client, label_payload('created', 'user/repo', 'bug'))
+    assert response.status_code == 202
+    assert web.queue_depth == 1
+    assert web.job_queue.claim().payload['label']['name'] == 'bug'
+    assert web.github.calls == []
+
+
+def test_process_label_webhook_reports_errors(web, caplog):
+    web.github.failing.add('user2/repo')
+    data = {'action': 'created', 'label': {'name': 'bug', 'color': 'ff0000'},
+            'repository': {'full_name': 'user/repo'}}
+    with web.app_context():
+        results = web.process_label_webhook(data)
+    assert results['user/repo3'] is None
+    assert results['user2/repo'].status_code == 404
+    assert web.github.calls == [('create', 'user/repo3', 'bug', 'ff0000')]
+    assert 'not propagated to user2/repo: 404 - Not Found' in caplog.text
+
+
+def test_repos_compiled_once(web):
+    repos = web.repos
+    assert repos == frozenset(['user/repo', 'user/repo3', 'user2/repo'])
+    assert web.repos is repos
+    flexmock(server_module).should_receive('extract_repos').never()
+    assert 'user/repo' in web.repos
+
+
+def write_config(path, repos, secret=True):
+    path.write('[github]\ntoken = T\n{}[repos]\n{}'.format(
+        'webhook_secret = S\n' if secret else '',
+        ''.join('{} = on\n'.format(r) for r in repos)
+    ))
+
+
+def test_hot_reload_config(tmpdir):
+    from labelord.web import LabelordWeb
+    config = tmpdir.join('config.cfg')
+    write_config(config, ['user/a'])
+    app = LabelordWeb.create_app(helpers.create_config(str(config)),
+                                 RecordingGitHub())
+    app.config_filename = str(config)
+    assert app.repos == {'user/a'}
+
+    write_config(config, ['user/a', 'user/b'])
+    assert app.hot_reload_config()
+    assert app.repos == {'user/a', 'user/b'}
+
+    write_config(config, ['user/c'], secret=False)
+    assert not app.hot_reload_config()
+    assert app.repos == {'user/a', 'user/b'}
+
+
+def test_watch_config(tmpdir):
+    from labelord.web import LabelordWeb
+    config = tmpdir.join('config.cfg')
+    write_config(config, ['user/a'])
+    app = LabelordWeb.create_app(helpers.create_config(str(config)),
+                                 RecordingGitHub())
+    app.config_filename = str(config)
+    app.watch_config(0.01)
+    time.sleep(0.05)
+    write_config(config, ['user/b'])
+    os.utime(str(config), ns=(1, 1))
+    for _ in range(100):
+        if app.repos == {'user/b'}:
+            break
+        time.sleep(0.01)
+    assert app.repos == {'user/b'}
+
+
+def label_event(action, name, color='ff0000', changes=None, id=1,
+                repo='user/repo'):
+    return {'action': action, 'changes': changes or {},
+            'label': {'id': id, 'name': name, 'color': color},
+            'repository': {'full_name': repo}}
+
+
+@pytest.mark.parametrize(
+    ['events', 'expected'],
+    [([label_event('created', 'bug'),
+       label_event('edited', 'defect', changes={'name': {'from': 'bug'}}),
+       label_event('edited', 'defect', '00ff00',
+                   changes={'color': {'from': 'ff0000'}})],
+      [('create', 'user/repo3', 'defect', '00ff00')]),
+     ([label_event('created', 'bug'), label_event('deleted', 'bug')], []),
+     ([label_event('edited', 'defect', changes={'name': {'from': 'bug'}}),
+       label_event('edited', 'issue', changes={'name': {'from': 'defect'}}),
+       label_event('deleted', 'issue')],
+      [('delete', 'user/repo3', 'bug')]),
+     ([label_event('edited', 'bug', '00ff00',
+                   changes={'color': {'from': 'ff0000'}}),
+       label_event('edited', 'bug', changes={'color': {'from': '00ff00'}})],
+      []),
+     ([label_event('edited', 'defect', changes={'name': {'from': 'bug'}}),
+       label_event('created', 'bug', id=2)],
+      [('create', 'user/repo3', 'bug', 'ff0000'),
+       ('update', 'user/repo3', 'defect', 'ff0000', 'bug')])],
+)
+def test_coalesced_webhooks(utils, events, expected):
+    from labelord.web import LabelordWeb
+    cfg = helpers.create_config(utils.config('repos'))
+    cfg.read_dict({'server': {'coalesce_window': '60'}})
+    cfg.remove_option('repos', 'user2/repo')
+    app = LabelordWeb.create_app(cfg, RecordingGitHub())
+    with app.app_context():
+        for event in events:
+            assert app.process_label_webhook(event) is None
+    assert app.github.calls == []
+    app.shutdown()
+    assert sorted(app.github.calls) == expected
+
+    with app.app_context():
+        for action, repo, name, *rest in expected:
+            echo = label_event(action + 'd', name, *rest, repo=repo)
+            if action == 'update':
+                echo = label_event('edited', name, rest[0],
+                                   changes={'name': {'from': rest[1]}},
+                                   repo=repo)
+            app.process_label_webhook(echo)
+    assert len(app.github.calls) == len(expected)
+
+
+def test_coalescer_flushes_after_window():
+    from labelord.web import LabelEventCoalescer
+    events = []
+    coalescer = LabelEventCoalescer(events.append, 0.01)
+    assert coalescer.submit(label_event('created', 'bug'))
+    assert coalescer.submit(label_event('created', 'other', id=2))
+    for _ in range(100):
+        if len(events) == 2:
+            break
+        time.sleep(0.01)
+    assert [e['label']['name'] for e in events] == ['bug', 'other']
+    assert len(coalescer) == 0
+    coalescer.shutdown()
+    assert not coalescer.submit(label_event('created', 'bug'))
+
+
+def test_hook_accept_redelivery_is_ignored(web):
+    client = web.test_client()
+    body = label_payload('created', 'user/repo', 'redelivered')
+    delivered = dict(headers(body), **{'X-GitHub-Delivery': 'abc-123'})
+    assert client.post('/', data=body, headers=delivered).status_code == 202
+    assert client.post('/', data=body, headers=delivered).status_code == 200
+    web.webhook_pool.join()
+    assert len(web.github.calls) == 2
+
+
+def test_echo_suppressed_across_servers(utils, tmpdir):
+    from labelord.web import LabelordWeb
+    cfg = helpers.create_config(utils.config('repos'))
+    cfg.read_dict({'server': {
+        'ignore_backend': 'sqlite://' + str(tmpdir.join('ignores.db'))
+    }})
+    first = LabelordWeb.create_app(cfg, RecordingGitHub())
+    second = LabelordWeb.create_app(cfg, RecordingGitHub())
+    with first.app_context():
+        first.process_label_webhook(label_event('created', 'bug'))
+    with second.app_context():
+        echo = label_event('created', 'bug', repo='user/repo3')
+        assert second.process_label_webhook(echo) is None
+    assert len(first.github.calls) == 2
+    assert second.github.calls == []
+    first.shutdown()
+    second.shutdown()
+
+
+def test_hook_accept_sha256_signature(web):
+    import hashlib
+    import hmac
+    body = label_payload('created', 'user/repo', 'sha256')
+    digest = hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+    response = web.test_client().post('/', data=body, headers={
+        'X-Hub-Signature-256': 'sha256=' + digest, 'X-GitHub-Event': 'label',
+        'Content-Type': 'application/json'})
+    assert response.status_code == 202
+    web.webhook_pool.join()
+
+
+@pytest.mark.parametrize(
+    ['body', 'event', 'signature', 'expected'],
+    [(b'junk', 'push', 'sha1=0', 400),
+     (b'junk', 'label', 'sha1=0', 401),
+     (b'x' * 2048, 'label', None, 413),
+     (b'{"broken', 'label', None, 400)],
+)
+def test_hook_accept_refused_before_parsing(web, body, event, signature,
+                                            expected):
+    web.labelord_config.read_dict({'server': {'max_body_size': '1024'}})
+    flexmock(server_module.json).should_call('loads').times(
+        1 if expected == 400 and event == 'label' else 0
+    )
+    request_headers = headers(body, event)
+    if signature is not None:
+        request_headers['X-Hub-Signature'] = signature
+    response = web.test_client().post('/', data=body, headers=request_headers)
+    web.labelord_config.remove_option('server', 'max_body_size')
+    assert response.status_code == expected
+    assert web.github.calls == []
+
+
+def batch(*events):
+    return b''.join(json.dumps(e).encode() + b'\n' for e in events)
+
+
+def post_batch(client, body):
+    from labelord.github import WebhookVerifier
+    return client.post('/batch', data=body, headers={
+        'X-Hub-Signature-256': WebhookVerifier(SECRET).sign(body),
+        'Content-Type': 'application/x-ndjson'})
+
+
+def test_batch_accept(web):
+    created = json.loads(label_payload('created', 'user/repo', 'bug'))
+    edited = json.loads(label_payload('edited', 'user/repo', 'bug', '00ff00',
+                                      {'color': {'from': 'ff0000'}}))
+    body = batch(
+        created,
+        {'event': 'ping', 'payload': {'zen': 'Keep it logically awesome.'}},
+        {'event': 'label', 'delivery': 'd1', 'payload': edited},
+        {'event': 'label', 'delivery': 'd1', 'payload': edited},
+        json.loads(label_payload('created', 'user/repo2', 'bug')),
+    )
+    response = post_batch(web.test_client(), body)
+    assert response.status_code == 202
+    assert response.get_json() == {'accepted': 2, 'skipped': 1,
+                                   'duplicate': 1, 'failed': []}
+    web.webhook_pool.join()
+    calls = [c for c in web.github.calls if c[1] == 'user2/repo']
+    assert calls == [('create', 'user2/repo', 'bug', 'ff0000'),
+                     ('update', 'user2/repo', 'bug', '00ff00', 'bug')]
+
+
+def test_batch_reports_failed_events(web, monkeypatch):
+    enqueue = web.enqueue_label_webhook
+
+    def failing_enqueue(data, timeout=0):
+        if data['label']['name'] == 'broken':
+            raise RuntimeError('disk full')
+        return enqueue(data, timeout)
+
+    monkeypatch.setattr(web, 'enqueue_label_webhook', failing_enqueue)
+    body = batch(
+        {'event': 'label', 'delivery': 'd2',
+         'payload': json.loads(label_payload('created', 'user/repo',
+                                             'broken'))},
+        json.loads(label_payload('created', 'user/repo', 'bug')),
+    )
+    response = post_batch(web.test_client(), body)
+    assert response.status_code == 202
+    assert response.get_json() == {
+        'accepted': 1, 'skipped': 0, 'duplicate': 0,
+        'failed': [{'index': 0, 'delivery': 'd2', 'error': 'disk full'}]
+    }
+    assert 'd2' not in web.delivery_log  # can be replayed again
+    web.webhook_pool.join()
+    assert ('create', 'user2/repo', 'bug', 'ff0000') in web.github.calls
+
+
+@pytest.mark.parametrize('body, signed, status', [
+    (b'{"action": "created"}\n', True, 400),
+    (b'not json\n', True, 400),
+    (b'', False, 401),
+])
+def test_batch_accept_refused(web, body, signed, status):
+    client = web.test_client()
+    if signed:
+        response = post_batch(client, body)
+    else:
+        response = client.post('/batch', data=body)
+    assert response.status_code == status
+    assert web.github.calls == []
+
+
+def test_label_events_of_repository_are_ordered(web):
+    github = web.github
+
+    def slow_create(repo, name, color, **kwargs):
+        time.sleep(0.05)
+        github.calls.append(('create', repo, name, color))
+
+    github.create_label = slow_create
+    client = web.test_client()
+    post(client, label_payload('created', 'user/repo', 'bug'))
+    post(client, label_payload('edited', 'user/repo', 'bug', '00ff00',
+                               {'color': {'from': 'ff0000'}}))
+    post(client, label_payload('deleted', 'user/repo', 'bug', '00ff00'))
+    web.webhook_pool.join()
+    for target in ('user/repo3', 'user2/repo'):
+        assert [c[0] for c in github.calls if c[1] == target] == [
+            'create', 'update', 'delete'
+        ]
+
+
+@pytest.mark.parametrize('changes', [
+    {'color': {'from': 'FF0000'}},
+    {'description': {'from': 'Old description'}},
+])
+def test_noop_edit_is_not_propagated(web, changes):
+    client = web.test_client()
+    post(client, label_payload('edited', 'user/repo', 'bug', 'ff0000',
+                               changes))
+    web.webhook_pool.join()
+    assert web.github.calls == []